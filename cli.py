@@ -0,0 +1,351 @@
+"""Консольний режим DownYS: запускає завдання без GTK (cron, systemd, headless-сервери).
+
+Приклади:
+    downys youtube "https://youtu.be/..." -o ~/Videos --set download_mode=music
+    downys ffmpeg in.mkv out.mp4 --task convert_simple
+    downys ffmpeg-batch ~/Recordings --task convert_simple -o ~/Converted
+    downys ffmpeg-merge trip.mp4 GX010001.MP4 GX020001.MP4 GX030001.MP4
+    downys httrack https://example.com -o ~/Mirrors --set max_depth=2
+    downys archive ~/Mirrors/example.com ~/example.tar.gz
+    downys jobs jobs.jsonl --json
+    downys sync "https://www.youtube.com/@channel" -o ~/Videos --every 60
+"""
+import argparse
+import importlib
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import sys
+import threading
+import uuid
+
+from scripts.progress_reporter import describe_progress
+from scripts.task_channel import TaskChannel, TaskControl, CONTROL_STOP
+from scripts.task_scheduler import TaskScheduler
+from scripts.task_supervisor import TaskSupervisor, MSG_USAGE, format_usage
+
+logger = logging.getLogger("downys.cli")
+
+# Тип завдання -> (модуль, функція, позиційні аргументи, зовнішня залежність).
+# Модулі імпортуються лише для потрібного типу, щоб, наприклад, конвертація не тягнула yt_dlp.
+JOB_TYPES = {
+    "youtube": ("scripts.youtube", "download_youtube_media", (), None),
+    "ffmpeg": ("scripts.ffmpeg_tasks", "run_ffmpeg_task", ("input_path", "output_path"), "ffmpeg"),
+    "ffmpeg-batch": ("scripts.ffmpeg_tasks", "run_ffmpeg_batch", ("source",), "ffmpeg"),
+    "ffmpeg-merge": ("scripts.ffmpeg_merge", "run_ffmpeg_merge", ("output_path",), "ffmpeg"),
+    "httrack": ("scripts.httrack_tasks", "run_httrack_web_threaded", ("url", "output_dir"), "httrack"),
+    "archive": ("scripts.httrack_tasks", "archive_directory_threaded", ("directory", "archive_path"), None),
+}
+
+
+class JobError(ValueError):
+    pass
+
+
+def resolve_job(job):
+    """Перетворює опис завдання (dict з ключем "task") на (функція, args, kwargs)."""
+    job = {key: value for key, value in job.items() if key not in ("id", "name", "priority")}
+    job_type = job.pop("task", None)
+    if job_type not in JOB_TYPES:
+        raise JobError(f"Невідомий тип завдання: {job_type!r}. Доступні: {', '.join(JOB_TYPES)}")
+    module_name, func_name, positional, dependency = JOB_TYPES[job_type]
+
+    if dependency and not shutil.which(dependency):
+        raise JobError(f"Відсутня залежність: {dependency}. Встановіть її та додайте до PATH.")
+    missing = [name for name in positional if not job.get(name)]
+    if missing:
+        raise JobError(f"Завдання '{job_type}' потребує полів: {', '.join(missing)}")
+    if job_type == "ffmpeg-merge" and len(job.get("inputs") or []) < 2:
+        raise JobError("Завдання 'ffmpeg-merge' потребує щонайменше двох файлів у полі inputs")
+    if job_type == "youtube" and not (job.get("url") and job.get("output_dir")):
+        raise JobError("Завдання 'youtube' потребує полів: url, output_dir")
+
+    args = tuple(job.pop(name) for name in positional)
+    if job_type == "ffmpeg" and "task_options" not in job:
+        # Параметри конкретного завдання FFmpeg (bitrate, width, ...) передаються в task_options.
+        job = {"task_type": job.pop("task_type", None), "progress_interval": job.pop("progress_interval", None),
+               "task_options": job}
+    elif job_type == "ffmpeg-batch" and "task_options" not in job:
+        batch_keys = ("task_type", "progress_interval", "output_ext", "output_dir", "recursive", "threads_per_job")
+        job = {**{key: job.pop(key) for key in batch_keys if key in job}, "task_options": job}
+    if job_type == "youtube":
+        # У консолі stdout належить подіям прогресу, тому власний вивід yt-dlp вимикається.
+        job.setdefault("quiet", True)
+    if job_type == "ffmpeg" and (job.get("parallel_segments") or (job.get("task_options") or {}).get("parallel_segments")):
+        # Кодування частинами займає всі ядра і має власну групу слотів планувальника.
+        func_name = "run_ffmpeg_segmented"
+    func = getattr(importlib.import_module(module_name), func_name)
+    return func, args, job
+
+
+class EventPrinter:
+    def __init__(self, as_json=False, stream=None):
+        self.as_json = as_json
+        self.stream = stream or sys.stdout
+        self.failed = set()
+
+    def __call__(self, job_id, event):
+        if event.get("type") == "error":
+            self.failed.add(job_id)
+        if self.as_json:
+            line = json.dumps({"job": job_id, **event}, ensure_ascii=False)
+        else:
+            line = f"[{job_id}] {self._format(event)}"
+        self.stream.write(line + "\n")
+        self.stream.flush()
+
+    def _format(self, event):
+        event_type, value = event.get("type"), event.get("value")
+        if event.get("usage"):
+            usage = format_usage(event["usage"])
+            if event_type == MSG_USAGE:
+                return usage
+            return f"{self._format({key: val for key, val in event.items() if key != 'usage'})} ({usage})"
+        if event_type == "progress":
+            percent = "" if value is None else f"{value * 100:.0f}%"
+            return " ".join(part for part in (event.get("stage", ""), percent, describe_progress(event)) if part)
+        if event_type == "error" and event.get("details"):
+            return f"ПОМИЛКА: {value}\n{event['details']}"
+        if event_type == "error":
+            return f"ПОМИЛКА: {value}"
+        return str(value)
+
+
+class _PrintChannel:
+    """Канал для запуску завдання в поточному процесі: події одразу друкуються."""
+
+    def __init__(self, job_id, emit):
+        self.job_id = job_id
+        self.emit = emit
+        self.control = TaskControl()
+
+    def put(self, message):
+        self.emit(self.job_id, message)
+
+
+def _on_sigterm(stop):
+    # SIGTERM (systemd stop, kill) - акуратна зупинка після поточного файлу/фрагмента.
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop())
+    except ValueError:
+        pass  # не головний потік
+
+
+def run_inline(job_id, job, emit):
+    func, args, kwargs = resolve_job(job)
+    channel = _PrintChannel(job_id, emit)
+    _on_sigterm(lambda: channel.control.apply(CONTROL_STOP))
+    func(*args, kwargs, channel)
+
+
+def run_jobs(jobs, emit, limits=None, stop_event=None):
+    """Виконує завдання в окремих процесах з обмеженням слотів планувальника.
+
+    Головний цикл чекає на дескриптори каналів і sentinel-и процесів, тож
+    нічого не робить, поки завдання мовчать. SIGTERM зупиняє завдання і
+    встановлює `stop_event`, якщо його передано.
+    """
+    running = {}
+    supervisor = TaskSupervisor()
+
+    def launch(task):
+        channel = TaskChannel()
+        process = supervisor.spawn(task.task_id, task.func, (*task.args, task.kwargs, channel))
+        channel.close_child_ends()
+        running[task.task_id] = (process, channel)
+        emit(task.task_id, {"type": "status", "value": f"Запущено: {task.name}"})
+        return True
+
+    scheduler = TaskScheduler(launch, limits=limits)
+    for job_id, job in jobs:
+        try:
+            func, args, kwargs = resolve_job(job)
+        except JobError as e:
+            emit(job_id, {"type": "error", "value": str(e)})
+            continue
+        scheduler.submit(job_id, func, job.get("name") or f"{job.get('task')} {job_id}", args=args, kwargs=kwargs,
+                         priority=int(job.get("priority", 0)))
+
+    def stop_all():
+        if stop_event is not None:
+            stop_event.set()
+        scheduler.clear_pending()
+        for _process, channel in running.values():
+            channel.send_control(CONTROL_STOP)
+
+    _on_sigterm(stop_all)
+    finished = set()
+    try:
+        while running:
+            waitables = {}
+            for job_id, (process, channel) in running.items():
+                if not channel.eof:
+                    waitables[channel] = job_id
+                waitables[process.sentinel] = job_id
+
+            for ready in multiprocessing.connection.wait(list(waitables)):
+                job_id = waitables[ready]
+                if job_id not in running:
+                    continue
+                process, channel = running[job_id]
+                for message in channel.drain():
+                    if message.get("type") in ("done", "error", "cancelled"):
+                        finished.add(job_id)
+                    emit(job_id, message)
+                if ready is process.sentinel:
+                    process.join()
+                    if job_id not in finished and process.exitcode:
+                        emit(job_id, {"type": "error", "value": f"Завдання завершилося несподівано з кодом виходу: {process.exitcode}"})
+                    channel.close()
+                    supervisor.release(job_id)
+                    del running[job_id]
+                    scheduler.task_finished(job_id)
+    finally:
+        # Ctrl+C не доходить до груп процесів завдань, тому їх треба завершити явно.
+        supervisor.terminate_all()
+
+
+def sync_jobs(urls, output_dir, options):
+    """Завдання синхронізації для URL або, якщо їх немає, для підписок з налаштувань."""
+    if urls:
+        return [{"task": "youtube", **options, "url": url, "output_dir": output_dir, "sync": True} for url in urls]
+    from settings_manager import SettingsManager
+    from scripts.playlist_sync import subscription_jobs
+    jobs = [{"task": "youtube", **options, **job} for job in subscription_jobs(SettingsManager())]
+    if not jobs:
+        raise JobError("Немає URL і підписок (sync_subscriptions у налаштуваннях).")
+    return jobs
+
+
+def run_sync(jobs, emit, every=None):
+    """Запускає синхронізацію; з `every` (хвилини) повторює її, поки процес не зупинять."""
+    stop = threading.Event()
+    while True:
+        run_jobs([(str(index), dict(job)) for index, job in enumerate(jobs, 1)], emit, stop_event=stop)
+        if not every or stop.is_set():
+            return
+        _on_sigterm(stop.set)
+        if stop.wait(every * 60):
+            return
+
+
+def read_jobs_file(path):
+    jobs = []
+    stream = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    with stream:
+        for line_no, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise JobError(f"{path}:{line_no}: некоректний JSON: {e}")
+            jobs.append((str(job.get("id") or line_no), job))
+    return jobs
+
+
+def _parse_set_options(pairs):
+    options = {}
+    for pair in pairs or []:
+        key, sep, raw = pair.partition("=")
+        if not sep:
+            raise JobError(f"Очікується key=value, отримано: {pair}")
+        try:
+            options[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            options[key] = raw
+    return options
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="downys", description="DownYS без графічного інтерфейсу.")
+    parser.add_argument("--json", action="store_true", help="друкувати події як JSON-рядки")
+    parser.add_argument("-v", "--verbose", action="store_true", help="докладне журналювання в stderr")
+    parser.add_argument("--progress-interval", type=float, default=None, help="мінімальний інтервал між подіями прогресу, с")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("youtube", help="завантажити відео або плейлист")
+    p.add_argument("url")
+    p.add_argument("-o", "--output-dir", default=os.getcwd())
+
+    p = sub.add_parser("ffmpeg", help="обробити файл за допомогою FFmpeg")
+    p.add_argument("input_path")
+    p.add_argument("output_path")
+    p.add_argument("--task", dest="task_type", required=True, help="convert_simple, extract_audio_mp3, ...")
+
+    p = sub.add_parser("ffmpeg-batch", help="обробити всі файли папки або glob-шаблону за допомогою FFmpeg")
+    p.add_argument("source", help="папка або шаблон, напр. '~/Video/*.mkv'")
+    p.add_argument("-o", "--output-dir", default=None, help="типово - поруч із вхідними файлами")
+    p.add_argument("--task", dest="task_type", required=True, help="convert_simple, extract_audio_mp3, ...")
+
+    p = sub.add_parser("ffmpeg-merge", help="об'єднати файли (без перекодування, якщо параметри збігаються)")
+    p.add_argument("output_path")
+    p.add_argument("inputs", nargs="+", help="вхідні файли у порядку склеювання")
+
+    p = sub.add_parser("httrack", help="віддзеркалити сайт")
+    p.add_argument("url")
+    p.add_argument("-o", "--output-dir", default=os.getcwd())
+
+    p = sub.add_parser("archive", help="заархівувати директорію")
+    p.add_argument("directory")
+    p.add_argument("archive_path")
+
+    for name in ("youtube", "ffmpeg", "ffmpeg-batch", "ffmpeg-merge", "httrack", "archive"):
+        sub.choices[name].add_argument("--set", action="append", metavar="KEY=VALUE",
+                                       help="додатковий параметр завдання (значення як JSON або рядок)")
+
+    p = sub.add_parser("sync", help="синхронізувати канали і плейлисти: завантажити лише нові записи")
+    p.add_argument("urls", nargs="*", help="URL (типово - підписки з налаштувань)")
+    p.add_argument("-o", "--output-dir", default=os.getcwd())
+    p.add_argument("--every", type=float, metavar="MINUTES", help="повторювати синхронізацію кожні N хвилин")
+    p.add_argument("--set", action="append", metavar="KEY=VALUE", help="додатковий параметр завдань")
+
+    p = sub.add_parser("jobs", help="виконати завдання з JSONL-файлу ('-' = stdin)")
+    p.add_argument("file")
+    p.add_argument("--limit", action="append", metavar="FUNC=N", help="ліміт слотів для функції завдання")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s')
+    emit = EventPrinter(as_json=args.json)
+
+    try:
+        if args.command == "jobs":
+            jobs = read_jobs_file(args.file)
+            if args.progress_interval is not None:
+                for _job_id, job in jobs:
+                    job.setdefault("progress_interval", args.progress_interval)
+            limits = {key: int(value) for key, value in _parse_set_options(args.limit).items()}
+            run_jobs(jobs, emit, limits=limits)
+        elif args.command == "sync":
+            options = _parse_set_options(args.set)
+            if args.progress_interval is not None:
+                options["progress_interval"] = args.progress_interval
+            run_sync(sync_jobs(args.urls, args.output_dir, options), emit, every=args.every)
+        else:
+            job = {"task": args.command, **_parse_set_options(args.set)}
+            for field in ("url", "output_dir", "input_path", "output_path", "task_type", "directory", "archive_path", "source", "inputs"):
+                if getattr(args, field, None) is not None:
+                    job[field] = getattr(args, field)
+            if args.progress_interval is not None:
+                job["progress_interval"] = args.progress_interval
+            run_inline(uuid.uuid4().hex[:8], job, emit)
+    except JobError as e:
+        logger.error(str(e))
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    return 1 if emit.failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -1,12 +1,15 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GLib, Pango
 import os
 import sys
+import importlib
 import threading
 import multiprocessing
 import uuid
-from queue import Empty
 import subprocess
 import shutil
 from urllib.parse import urlparse, parse_qs
@@ -15,14 +18,17 @@ import logging
 import gettext
 
 from settings_manager import SettingsManager
-from ui.youtube_page import YouTubePage
-from ui.ffmpeg_page import FFmpegPage
-from ui.httrack_page import HTTrackPage
-from ui.about_page import AboutPage
-from scripts.bookmarks_page import BookmarksPage
-from scripts.youtube import download_youtube_media, get_youtube_info
-from scripts.ffmpeg_tasks import run_ffmpeg_task
+from scripts.youtube import download_youtube_media
+from scripts.ffmpeg_tasks import run_ffmpeg_task, run_ffmpeg_segmented, run_ffmpeg_batch
+from scripts.ffmpeg_merge import run_ffmpeg_merge
 from scripts.httrack_tasks import run_httrack_web_threaded, archive_directory_threaded
+from scripts.task_scheduler import TaskScheduler, STATE_QUEUED, STATE_RUNNING, STATE_FAILED
+from scripts.task_channel import TaskChannel, CONTROL_CANCEL, CONTROL_PAUSE, CONTROL_RESUME
+from scripts.task_supervisor import TaskSupervisor, format_usage
+from scripts.youtube_workers import YouTubeWorkerPool, MSG_JOB_FINISHED, DEFAULT_MAX_JOBS_PER_WORKER, DEFAULT_MAX_RSS_MB
+from scripts.progress_reporter import describe_progress
+from scripts.playlist_sync import subscription_jobs
+from scripts.url_classifier import classify_url
 
 try:
     gettext.install("downys", os.path.join(os.path.dirname(__file__), "locale"))
@@ -31,13 +37,27 @@ except FileNotFoundError:
 
 logger = logging.getLogger(__name__)
 
+# Скільки секунд завдання має на акуратне завершення після "Скасувати", перш ніж його буде зупинено примусово.
+CANCEL_GRACE_SECONDS = 5
+
 TASK_DEPENDENCIES = {
     run_ffmpeg_task: ("FFmpeg", "ffmpeg"),
+    run_ffmpeg_segmented: ("FFmpeg", "ffmpeg"),
+    run_ffmpeg_batch: ("FFmpeg", "ffmpeg"),
+    run_ffmpeg_merge: ("FFmpeg", "ffmpeg"),
     run_httrack_web_threaded: ("HTTrack", "httrack"),
     archive_directory_threaded: ("tar", "tar"),
     download_youtube_media: ("yt-dlp", "yt-dlp"),
 }
 
+PAGE_DEFS = [
+    ("bookmarks", _("Закладки"), "scripts.bookmarks_page", "BookmarksPage"),
+    ("youtube", "YouTube", "ui.youtube_page", "YouTubePage"),
+    ("ffmpeg", "FFmpeg", "ui.ffmpeg_page", "FFmpegPage"),
+    ("httrack", _("HTTrack/Архів"), "ui.httrack_page", "HTTrackPage"),
+    ("about", _("Про програму"), "ui.about_page", "AboutPage"),
+]
+
 class URLHandler:
     def validate_httrack_url(self, url_string):
         logger.debug(f"Validating HTTrack URL: {url_string}")
@@ -76,14 +96,20 @@ class URLHandler:
             return None
 
 class AppWindow(Gtk.Window):
-    def __init__(self):
+    def __init__(self, measure_startup=False):
         Gtk.Window.__init__(self, title="DownYS", default_width=850, default_height=800)
         self.connect("destroy", self._on_destroy)
+        self._measure_startup = measure_startup
+        self._first_draw_handler = self.connect("draw", self._on_first_draw)
 
         self.settings = SettingsManager()
         self.active_tasks = {}
-        self._queue_checker_id = None
+        self.scheduler = TaskScheduler(self._launch_task, limits=self.settings.get('task_slot_limits'),
+                                       on_state_changed=self._on_scheduler_state_changed)
+        self.supervisor = TaskSupervisor(grace=CANCEL_GRACE_SECONDS)
         self.url_handler = URLHandler()
+        self.youtube_pool = None
+        self._pool_watch_ids = {}
 
         header_bar = Gtk.HeaderBar(title="DownYS", show_close_button=True)
         self.set_titlebar(header_bar)
@@ -99,28 +125,17 @@ class AppWindow(Gtk.Window):
         content_hbox.pack_start(self.stack_sidebar, False, False, 0)
         content_hbox.pack_start(self.stack, True, True, 0)
 
+        # Сторінки створюються при першому показі у Gtk.Stack, а їхні модулі
+        # імпортуються лише тоді, щоб не сповільнювати холодний старт.
         self.pages = {}
-        page_defs = [
-            ("bookmarks", _("Закладки"), BookmarksPage),
-            ("youtube", "YouTube", YouTubePage),
-            ("ffmpeg", "FFmpeg", FFmpegPage),
-            ("httrack", _("HTTrack/Архів"), HTTrackPage),
-            ("about", _("Про програму"), AboutPage)
-        ]
-
-        for name, title, p_class in page_defs:
-            try:
-                p_instance = p_class(self, self.url_handler)
-                p_widget = p_instance.build_ui()
-                if not isinstance(p_widget, Gtk.Widget):
-                    p_widget = Gtk.Label(label=_(f"Помилка завантаження '{title}'"))
-                self.stack.add_titled(p_widget, name + "_page", title)
-                self.pages[name] = p_instance
-            except Exception as e:
-                logging.exception(_(f"ПОМИЛКА створення сторінки '{name}': {e}"))
-                error_label = Gtk.Label(label=_(f"Помилка завантаження сторінки '{title}'\nДивіться деталі в консолі."))
-                self.stack.add_titled(error_label, name + "_page", f"{title} ({_('Помилка')})")
-                self.pages[name] = None
+        self._page_defs = {}
+        for name, title, module_name, class_name in PAGE_DEFS:
+            placeholder = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+            placeholder.show()
+            self.stack.add_titled(placeholder, name + "_page", title)
+            self._page_defs[name] = (title, module_name, class_name, placeholder)
+        self.stack.connect("notify::visible-child-name", self._on_visible_page_changed)
+        self._ensure_page(self.stack.get_visible_child_name()[:-len("_page")])
         
         self._build_task_management_ui(main_vbox)
 
@@ -133,17 +148,56 @@ class AppWindow(Gtk.Window):
 
         self.show_all()
 
+        self._sync_task_ids = {}
+        self._schedule_subscription_sync()
+
+    def _on_first_draw(self, widget, cr):
+        self.disconnect(self._first_draw_handler)
+        elapsed_ms = (time.perf_counter() - _STARTUP_T0) * 1000
+        logging.info(f"Time to first window: {elapsed_ms:.0f} ms")
+        if self._measure_startup:
+            print(f"startup_ms={elapsed_ms:.0f}")
+            GLib.idle_add(self.destroy)
+        return False
+
+    def _on_visible_page_changed(self, stack, pspec):
+        child_name = stack.get_visible_child_name()
+        if child_name and child_name.endswith("_page"):
+            self._ensure_page(child_name[:-len("_page")])
+
+    def _ensure_page(self, name):
+        if name in self.pages or name not in self._page_defs:
+            return self.pages.get(name)
+
+        title, module_name, class_name, placeholder = self._page_defs[name]
+        try:
+            p_class = getattr(importlib.import_module(module_name), class_name)
+            p_instance = p_class(self, self.url_handler)
+            p_widget = p_instance.build_ui()
+            if not isinstance(p_widget, Gtk.Widget):
+                p_widget = Gtk.Label(label=_(f"Помилка завантаження '{title}'"))
+            placeholder.pack_start(p_widget, True, True, 0)
+            self.pages[name] = p_instance
+        except Exception as e:
+            logging.exception(_(f"ПОМИЛКА створення сторінки '{name}': {e}"))
+            error_label = Gtk.Label(label=_(f"Помилка завантаження сторінки '{title}'\nДивіться деталі в консолі."))
+            placeholder.pack_start(error_label, True, True, 0)
+            self.stack.child_set_property(placeholder, "title", f"{title} ({_('Помилка')})")
+            self.pages[name] = None
+        placeholder.show_all()
+        return self.pages[name]
+
     def _build_task_management_ui(self, parent_box):
         # Set transition_duration to 0 and initially hide the revealer
         self.task_revealer = Gtk.Revealer(transition_type=Gtk.RevealerTransitionType.SLIDE_DOWN, transition_duration=0)
         self.task_revealer.set_reveal_child(False) 
         parent_box.pack_end(self.task_revealer, False, False, 0)
         
-        task_frame = Gtk.Frame(label=_("Активні завдання"), margin=5)
-        self.task_revealer.add(task_frame)
+        self.task_frame = Gtk.Frame(label=_("Активні завдання"), margin=5)
+        self.task_revealer.add(self.task_frame)
         
         scrolled_window = Gtk.ScrolledWindow(shadow_type=Gtk.ShadowType.IN, min_content_height=100)
-        task_frame.add(scrolled_window)
+        self.task_frame.add(scrolled_window)
         
         self.task_listbox = Gtk.ListBox()
         scrolled_window.add(self.task_listbox)
@@ -157,30 +211,123 @@ class AppWindow(Gtk.Window):
         
         label = Gtk.Label(label=task_name, xalign=0, ellipsize=Pango.EllipsizeMode.END)
         hbox.pack_start(label, True, True, 0)
+
+        row.state_label = Gtk.Label(label=_("У черзі"), xalign=1)
+        hbox.pack_start(row.state_label, False, False, 0)
         
         cancel_button = Gtk.Button.new_from_icon_name("window-close-symbolic", Gtk.IconSize.BUTTON)
         cancel_button.set_tooltip_text(_("Скасувати завдання"))
         cancel_button.connect("clicked", self._on_cancel_task_clicked, task_id)
         hbox.pack_end(cancel_button, False, False, 0)
+
+        row.pause_button = Gtk.Button.new_from_icon_name("media-playback-pause-symbolic", Gtk.IconSize.BUTTON)
+        row.pause_button.set_tooltip_text(_("Призупинити / продовжити"))
+        row.pause_button.set_sensitive(False)
+        row.pause_button.connect("clicked", self._on_pause_task_clicked, task_id)
+        hbox.pack_end(row.pause_button, False, False, 0)
         
         self.task_listbox.add(row)
         row.show_all()
         # Remove this line to keep the revealer hidden by default
         # self.task_revealer.set_reveal_child(True) 
+        self._update_task_summary()
 
-    def _remove_task_from_ui(self, task_id):
+    def _find_task_row(self, task_id):
         for row in self.task_listbox.get_children():
             if hasattr(row, 'task_id') and row.task_id == task_id:
-                self.task_listbox.remove(row)
-                break
+                return row
+        return None
+
+    def _on_scheduler_state_changed(self, task):
+        if task.state == STATE_FAILED:
+            if task.task_id not in self.active_tasks:
+                return
+            # Планувальник уже прибрав завдання; рядок і діалог помилки - поза його циклом запуску.
+            GLib.idle_add(self._on_task_error, task.task_id, task.error)
+        else:
+            self._set_task_row_state(task.task_id, task.state)
+
+    def _set_task_row_state(self, task_id, state):
+        if task_id in self.active_tasks:
+            self.active_tasks[task_id]['state'] = state
+        row = self._find_task_row(task_id)
+        if row:
+            row.state_label.set_text(_("Виконується") if state == STATE_RUNNING else _("У черзі"))
+            row.pause_button.set_sensitive(state == STATE_RUNNING)
+        self._update_task_summary()
+
+    def _update_task_summary(self):
+        running, pending = self.scheduler.running_count(), self.scheduler.pending_count()
+        self.task_frame.set_label(_(f"Активні завдання (виконується: {running}, у черзі: {pending})"))
+        # Панель показується лише тоді, коли є завдання, що чекають на вільний слот.
+        if pending:
+            self.task_revealer.set_reveal_child(True)
+
+    def _remove_task_from_ui(self, task_id):
+        row = self._find_task_row(task_id)
+        if row:
+            self.task_listbox.remove(row)
         if len(self.active_tasks) == 0:
             self.task_revealer.set_reveal_child(False)
+        self._update_task_summary()
 
     def _on_cancel_task_clicked(self, widget, task_id):
         task_info = self.active_tasks.get(task_id)
-        if task_info and task_info.get('process'):
-            logger.info(f"Cancelling task {task_id}...")
-            task_info['process'].terminate()
+        if not task_info:
+            return
+        if task_info.get('state') == STATE_QUEUED and self.scheduler.cancel(task_id):
+            logger.info(f"Removing queued task {task_id}.")
+            self._remove_task(task_id)
+            return
+
+        logger.info(f"Cancelling task {task_id}...")
+        task_info['cancelling'] = True
+        if self.send_task_control(task_id, CONTROL_CANCEL) == "dequeued":
+            self._remove_task(task_id)
+        elif task_info.get('process'):
+            GLib.timeout_add_seconds(CANCEL_GRACE_SECONDS, self._force_terminate_task, task_id, task_info['process'])
+        elif task_info.get('pool'):
+            GLib.timeout_add_seconds(CANCEL_GRACE_SECONDS, self._force_terminate_pool_task, task_id)
+
+    def _force_terminate_task(self, task_id, process):
+        if process.is_alive():
+            logger.warning(f"Task {task_id} did not stop within {CANCEL_GRACE_SECONDS}s, terminating its process tree.")
+            self.supervisor.terminate(task_id)
+        return False
+
+    def _force_terminate_pool_task(self, task_id):
+        task_info = self.active_tasks.get(task_id)
+        if task_info and task_info.get('pool') and task_info['pool'].terminate_task(task_id, grace=CANCEL_GRACE_SECONDS):
+            logger.warning(f"Task {task_id} did not stop within {CANCEL_GRACE_SECONDS}s, terminating its yt-dlp worker.")
+        return False
+
+    def _on_pause_task_clicked(self, widget, task_id):
+        task_info = self.active_tasks.get(task_id)
+        if not task_info:
+            return
+        paused = not task_info.get('paused', False)
+        if not self.send_task_control(task_id, CONTROL_PAUSE if paused else CONTROL_RESUME):
+            return
+        task_info['paused'] = paused
+        row = self._find_task_row(task_id)
+        if row:
+            row.state_label.set_text(_("Призупинено") if paused else _("Виконується"))
+            icon = "media-playback-start-symbolic" if paused else "media-playback-pause-symbolic"
+            row.pause_button.set_image(Gtk.Image.new_from_icon_name(icon, Gtk.IconSize.BUTTON))
+
+    def send_task_control(self, task_id, command):
+        """Надсилає команду керування (CONTROL_*) запущеному завданню.
+
+        Повертає False, якщо завдання не виконується або команду не вдалося доставити.
+        """
+        task_info = self.active_tasks.get(task_id)
+        if not task_info or task_info.get('state') != STATE_RUNNING:
+            return False
+        if task_info.get('pool'):
+            return task_info['pool'].control(task_id, command)
+        if task_info.get('queue'):
+            return task_info['queue'].send_control(command)
+        return False
             
     def _check_dependency(self, name, command):
         if not shutil.which(command):
@@ -190,7 +337,14 @@ class AppWindow(Gtk.Window):
         logger.debug(f"Dependency '{name}' found.")
         return True
 
-    def start_task(self, task_func, task_name, args=(), kwargs=None, success_callback=None):
+    def start_task(self, task_func, task_name, args=(), kwargs=None, success_callback=None, priority=0,
+                   message_callback=None, finished_callback=None, error_dialog=True):
+        """Ставить завдання в чергу планувальника. Повертає task_id або None.
+
+        `message_callback(task_id, message)` отримує кожну подію завдання,
+        `finished_callback(task_id)` викликається після прибирання завдання з будь-якої причини.
+        З `error_dialog=False` помилка лише пишеться в журнал і рядок стану (для пакетних завдань).
+        """
         if not kwargs: kwargs = {}
 
         dependency_info = TASK_DEPENDENCIES.get(task_func)
@@ -200,71 +354,228 @@ class AppWindow(Gtk.Window):
                 return
 
         task_id = str(uuid.uuid4())
-        comm_queue = multiprocessing.Queue()
-        
-        process = multiprocessing.Process(target=task_func, args=(*args, kwargs, comm_queue), daemon=True)
-        
         self.active_tasks[task_id] = {
-            'process': process,
+            'process': None,
             'name': task_name,
-            'queue': comm_queue,
-            'success_callback': success_callback
+            'queue': None,
+            'watch_ids': [],
+            'success_callback': success_callback,
+            'message_callback': message_callback,
+            'finished_callback': finished_callback,
+            'error_dialog': error_dialog,
+            'state': STATE_QUEUED
         }
-        
-        process.start()
         self._add_task_to_ui(task_id, task_name)
-        
-        if not self._queue_checker_id:
-            self._queue_checker_id = GLib.timeout_add(150, self._check_queues)
+        self.scheduler.submit(task_id, task_func, task_name, args=args, kwargs=kwargs, priority=priority)
+        return task_id
+
+    def _schedule_subscription_sync(self):
+        interval = self.settings.get('sync_interval_minutes', 0)
+        if interval and interval > 0:
+            GLib.timeout_add_seconds(max(60, int(interval * 60)), self.run_subscription_sync)
+
+    def run_subscription_sync(self):
+        """Запускає фонову синхронізацію підписок (sync_subscriptions). Як таймер GLib повертає True для повтору."""
+        for job in subscription_jobs(self.settings):
+            url = job['url']
+            if url in self._sync_task_ids:
+                continue  # попередня синхронізація цієї підписки ще триває
+            task_id = self.start_task(download_youtube_media, _(f"Синхронізація: {url}"), kwargs=job, priority=-1, error_dialog=False,
+                                      finished_callback=lambda task_id, url=url: self._sync_task_ids.pop(url, None))
+            if task_id:
+                self._sync_task_ids[url] = task_id
+        return True
 
-    def _check_queues(self):
-        if not self.active_tasks:
-            self._queue_checker_id = None
+    def _launch_task(self, task):
+        task_info = self.active_tasks.get(task.task_id)
+        if task_info is None:
             return False
 
-        for task_id, task_info in list(self.active_tasks.items()):
-            if not task_info['process'].is_alive():
-                logger.warning(f"Process for task {task_id} ('{task_info['name']}') is no longer alive. Cleaning up.")
-                try:
-                    message = task_info['queue'].get_nowait()
-                    self._handle_queue_message(task_id, message)
-                except Empty:
-                    if task_info['process'].exitcode is not None and task_info['process'].exitcode != 0:
-                        self._on_task_error(task_id, _(f"Завдання завершилося несподівано з кодом виходу: {task_info['process'].exitcode}"))
-                    else:
-                        self._remove_task(task_id)
+        if task.func is download_youtube_media and self.settings.get('youtube_worker_pool', True):
+            task_info['pool'] = self.get_youtube_pool()
+            task_info['pool'].submit(task.task_id, task.kwargs)
+            logger.info(f"Task {task.task_id} ('{task.name}') dispatched to yt-dlp worker pool.")
+            return True
+
+        comm_queue = TaskChannel()
+        # Завдання працює у власній групі процесів, щоб скасування зачіпало і ffmpeg/httrack.
+        process = self.supervisor.spawn(task.task_id, task.func, (*task.args, task.kwargs, comm_queue))
+        task_info['process'] = process
+        task_info['queue'] = comm_queue
+        comm_queue.close_child_ends()
+        logger.info(f"Task {task.task_id} ('{task.name}') started.")
+
+        # Повідомлення і завершення процесу обробляються лише тоді, коли на
+        # відповідному дескрипторі з'являються дані, без періодичного опитування.
+        watch_conditions = GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR
+        task_info['watch_ids'] = [
+            GLib.io_add_watch(comm_queue.fileno(), GLib.PRIORITY_DEFAULT, watch_conditions, self._on_task_channel_ready, task.task_id),
+            GLib.io_add_watch(process.sentinel, GLib.PRIORITY_DEFAULT, watch_conditions, self._on_task_process_exit, task.task_id),
+        ]
+        return True
+
+    def get_youtube_pool(self):
+        """Повертає пул воркерів yt-dlp, створюючи і прогріваючи його за потреби."""
+        if self.youtube_pool is None:
+            self.youtube_pool = YouTubeWorkerPool(
+                size=self.scheduler.limit_for(download_youtube_media.__name__),
+                max_jobs=self.settings.get('youtube_worker_max_jobs', DEFAULT_MAX_JOBS_PER_WORKER),
+                max_rss_mb=self.settings.get('youtube_worker_max_rss_mb', DEFAULT_MAX_RSS_MB),
+                on_worker_started=self._on_pool_worker_started,
+                on_worker_stopped=self._on_pool_worker_stopped,
+            )
+            self.youtube_pool.start()
+        return self.youtube_pool
+
+    def prewarm_youtube_workers(self):
+        if self.settings.get('youtube_worker_pool', True):
+            self.get_youtube_pool()
+        return False
+
+    def _on_pool_worker_started(self, worker):
+        watch_conditions = GLib.IOCondition.IN | GLib.IOCondition.HUP | GLib.IOCondition.ERR
+        self._pool_watch_ids[worker.worker_id] = [
+            GLib.io_add_watch(worker.fileno(), GLib.PRIORITY_DEFAULT, watch_conditions, self._on_pool_worker_ready, worker),
+            GLib.io_add_watch(worker.sentinel, GLib.PRIORITY_DEFAULT, watch_conditions, self._on_pool_worker_exit, worker),
+        ]
+
+    def _on_pool_worker_stopped(self, worker):
+        for watch_id in self._pool_watch_ids.pop(worker.worker_id, []):
+            if watch_id:
+                GLib.source_remove(watch_id)
 
+    def _dispatch_pool_events(self, worker):
+        for task_id, message in self.youtube_pool.drain(worker):
+            if task_id not in self.active_tasks:
                 continue
+            if message.get("type") == MSG_JOB_FINISHED:
+                # Завдання могло завершитися без "done"/"error" (наприклад, після скасування).
+                self._remove_task(task_id)
+            else:
+                self._handle_queue_message(task_id, message)
+
+    def _on_pool_worker_ready(self, fd, condition, worker):
+        self._dispatch_pool_events(worker)
+        if condition & (GLib.IOCondition.HUP | GLib.IOCondition.ERR):
+            self._pool_watch_ids.get(worker.worker_id, [None, None])[0] = None
+            return False
+        return True
 
-            try:
-                while True:
-                    message = task_info['queue'].get_nowait()
-                    self._handle_queue_message(task_id, message)
-            except Empty:
-                pass
-        
+    def _on_pool_worker_exit(self, fd, condition, worker):
+        self._dispatch_pool_events(worker)
+        watch_ids = self._pool_watch_ids.get(worker.worker_id)
+        if watch_ids:
+            watch_ids[1] = None
+        orphan_task_id = self.youtube_pool.worker_exited(worker)
+        if orphan_task_id in self.active_tasks and self.active_tasks[orphan_task_id].get('cancelling'):
+            # Воркер завершено примусово після скасування завдання.
+            self._update_status(_(f"Скасовано: {self.active_tasks[orphan_task_id]['name']}"))
+            self._update_progress(0)
+            self._remove_task(orphan_task_id)
+        elif orphan_task_id in self.active_tasks:
+            self._on_task_error(orphan_task_id, _(f"Процес yt-dlp завершився несподівано з кодом виходу: {worker.process.exitcode}"))
+        return False
+
+    def _dispatch_task_messages(self, task_id):
+        task_info = self.active_tasks.get(task_id)
+        if not task_info:
+            return
+        for message in task_info['queue'].drain():
+            self._handle_queue_message(task_id, message)
+            if task_id not in self.active_tasks:
+                break
+
+    def _on_task_channel_ready(self, fd, condition, task_id):
+        self._dispatch_task_messages(task_id)
+        task_info = self.active_tasks.get(task_id)
+        if not task_info or task_info['queue'].eof:
+            # Після EOF решту роботи виконує обробник завершення процесу.
+            if task_info: task_info['watch_ids'][0] = None
+            return False
         return True
 
+    def _on_task_process_exit(self, fd, condition, task_id):
+        self._dispatch_task_messages(task_id)
+        task_info = self.active_tasks.get(task_id)
+        if not task_info:
+            return False
+
+        task_info['watch_ids'][1] = None
+        process = task_info['process']
+        process.join(timeout=0)
+        logger.warning(f"Process for task {task_id} ('{task_info['name']}') is no longer alive. Cleaning up.")
+        if task_info.get('cancelling'):
+            self._update_status(_(f"Скасовано: {task_info['name']}"))
+            self._update_progress(0)
+            self._remove_task(task_id)
+        elif process.exitcode is not None and process.exitcode != 0:
+            self._on_task_error(task_id, _(f"Завдання завершилося несподівано з кодом виходу: {process.exitcode}"))
+        else:
+            self._remove_task(task_id)
+        return False
+
+    def _detach_task_watches(self, task_id):
+        task_info = self.active_tasks.get(task_id)
+        if not task_info:
+            return
+        for watch_id in task_info.get('watch_ids', []):
+            if watch_id:
+                GLib.source_remove(watch_id)
+        task_info['watch_ids'] = []
+
     def _handle_queue_message(self, task_id, message):
         msg_type = message.get("type")
         value = message.get("value")
+        message_callback = self.active_tasks.get(task_id, {}).get('message_callback')
+        if message_callback:
+            try:
+                message_callback(task_id, message)
+            except Exception as e:
+                logger.error(f"Error in message_callback for task {task_id}: {e}")
+        if message.get("usage"):
+            task_name = self.active_tasks.get(task_id, {}).get('name', task_id)
+            logger.info(f"Task {task_id} ('{task_name}') resource usage: {format_usage(message['usage'])}.")
 
         if msg_type == "status":
             self._update_status(value)
         elif msg_type == "progress":
-            self._update_progress(value)
+            details = describe_progress(message)
+            if value is None:
+                self.progress_bar.pulse()
+                self.progress_bar.set_text(details)
+            else:
+                self._update_progress(value, details)
         elif msg_type == "done":
             self._on_task_complete(task_id, value)
+        elif msg_type == "cancelled":
+            self._update_status(value)
+            self._update_progress(0)
+            self._remove_task(task_id)
+        elif msg_type == "error" and self.active_tasks.get(task_id, {}).get('cancelling'):
+            self._update_status(_(f"Скасовано: {self.active_tasks[task_id]['name']}"))
+            self._remove_task(task_id)
         elif msg_type == "error":
-            self._on_task_error(task_id, value)
+            details = message.get("details")
+            self._on_task_error(task_id, f"{value}\n\n{details}" if details else value)
 
     def _remove_task(self, task_id):
         if task_id in self.active_tasks:
+            self._detach_task_watches(task_id)
             task_info = self.active_tasks.pop(task_id)
-            task_info['queue'].close()
+            if task_info['queue'] is not None:
+                task_info['queue'].close()
+            if task_info['process'] is not None:
+                self.supervisor.release(task_id)
+            if task_info.get('finished_callback'):
+                try:
+                    task_info['finished_callback'](task_id)
+                except Exception as e:
+                    logger.error(f"Error in finished_callback for task {task_id}: {e}")
+        self.scheduler.task_finished(task_id)
         self._remove_task_from_ui(task_id)
     
     def _on_task_complete(self, task_id, final_message):
+        self._detach_task_watches(task_id)
         task_info = self.active_tasks.get(task_id, {})
         
         self._update_status(final_message)
@@ -279,9 +590,15 @@ class AppWindow(Gtk.Window):
         self._remove_task(task_id)
 
     def _on_task_error(self, task_id, error_message):
+        self._detach_task_watches(task_id)
         task_info = self.active_tasks.get(task_id, {})
         task_name = task_info.get('name', _('невідоме завдання'))
-        
+
+        if not task_info.get('error_dialog', True):
+            logger.error(f"Task {task_id} ('{task_name}') failed: {error_message}")
+            self._update_status(_(f"Помилка: {task_name}"))
+            self._remove_task(task_id)
+            return
         self.show_detailed_error_dialog(_(f"Помилка виконання завдання: {task_name}"), str(error_message))
         self._update_status(_(f"Помилка: {task_name}"))
         self._update_progress(0)
@@ -289,44 +606,38 @@ class AppWindow(Gtk.Window):
         self._remove_task(task_id)
 
     def _on_destroy(self, *args):
-        for task_id, task_info in self.active_tasks.items():
-            if task_info.get('process') and task_info['process'].is_alive():
-                logger.info(f"Terminating active task {task_id} on exit.")
-                task_info['process'].terminate()
+        self.scheduler.clear_pending()
+        if self.youtube_pool:
+            self.youtube_pool.shutdown()
+        if self.active_tasks:
+            logger.info(f"Terminating {len(self.active_tasks)} active task(s) on exit.")
+        self.supervisor.terminate_all(grace=2)
         Gtk.main_quit()
     
     def analyze_and_go_to_page(self, url):
-        self._update_status(_("Аналіз URL..."))
-        
-        def analysis_thread():
-            page_target = "httrack"
-            try:
-                info = get_youtube_info(url)
-                if info and info.get('_type') in ('video', 'playlist', 'multi_video'):
-                    page_target = "youtube"
-            except Exception as e:
-                logger.warning(f"URL analysis failed for '{url}', defaulting to httrack. Error: {e}")
-            
-            GLib.idle_add(self.go_to_page_with_url, page_target, url)
-            GLib.idle_add(self._update_status, _("Готово."))
+        """Відкриває сторінку YouTube або HTTrack для URL за локальною класифікацією, без мережевих запитів.
 
-        thread = threading.Thread(target=analysis_thread, daemon=True)
-        thread.start()
+        Метадані отримує вже сама сторінка, коли вони справді потрібні.
+        """
+        page_target, reason = classify_url(url)
+        logger.info(f"URL '{url}' classified as {page_target} ({reason}).")
+        self.go_to_page_with_url(page_target, url)
 
     def go_to_page_with_url(self, page_name, url):
         target_widget = self.stack.get_child_by_name(page_name + "_page")
         if target_widget:
             self.stack.set_visible_child(target_widget)
-            page_instance = self.pages.get(page_name)
+            page_instance = self._ensure_page(page_name)
             if page_instance and hasattr(page_instance, 'url_entry'):
                 url_entry = getattr(page_instance, 'url_entry', None)
                 if isinstance(url_entry, Gtk.Entry):
                     url_entry.set_text(url)
 
-    def _update_progress(self, fraction):
+    def _update_progress(self, fraction, details=""):
         fraction = max(0.0, min(1.0, float(fraction)))
         self.progress_bar.set_fraction(fraction)
-        self.progress_bar.set_text(f"{int(fraction*100)}%" if fraction > 0 or fraction == 1.0 else "")
+        text = f"{int(fraction*100)}%" if fraction > 0 or fraction == 1.0 else ""
+        self.progress_bar.set_text(f"{text} · {details}" if text and details else text)
 
     def _update_status(self, message):
         self.status_label.set_text(str(message))
@@ -399,9 +710,12 @@ if __name__ == "__main__":
 
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s', handlers=[logging.StreamHandler(sys.stdout), logging.FileHandler(log_file_path, encoding='utf-8')])
 
+    # --measure-startup (або DOWNYS_MEASURE_STARTUP=1): вивести час до першого кадру вікна і завершитися.
+    measure_startup = "--measure-startup" in sys.argv[1:] or bool(os.environ.get("DOWNYS_MEASURE_STARTUP"))
+
     logging.info(_("\nЗапуск DownYS..."))
     try:
-        app = AppWindow()
+        app = AppWindow(measure_startup=measure_startup)
         Gtk.main()
     except Exception as e:
         logging.exception(_(f"\n!!! Критична помилка: {e} !!!"))
@@ -66,7 +66,8 @@ class BookmarksPage:
         
         for key, name in BOOKMARK_CATEGORIES.items():
             scrolled_window = Gtk.ScrolledWindow(shadow_type=Gtk.ShadowType.IN, hexpand=True, vexpand=True)
-            listbox = Gtk.ListBox(selection_mode=Gtk.SelectionMode.SINGLE)
+            # Ctrl/Shift+клік виділяє кілька закладок для пакетного завантаження.
+            listbox = Gtk.ListBox(selection_mode=Gtk.SelectionMode.MULTIPLE)
             listbox.connect("row-activated", self._on_bookmark_activated)
             
             self.listboxes[key] = listbox # Зберігаємо віджет списку
@@ -83,6 +84,10 @@ class BookmarksPage:
         btn_remove = Gtk.Button(label="Видалити Вибране")
         btn_remove.connect("clicked", self._on_remove_clicked)
         hbox_buttons.pack_start(btn_remove, False, False, 0)
+        btn_batch = Gtk.Button(label="Завантажити Вибрані (YouTube)")
+        btn_batch.set_tooltip_text("Додати вибрані закладки в пакетне завантаження на сторінці YouTube.\nКілька закладок - Ctrl/Shift+клік.")
+        btn_batch.connect("clicked", self._on_batch_download_clicked)
+        hbox_buttons.pack_end(btn_batch, False, False, 0)
         self.page_widget.pack_start(hbox_buttons, False, False, 5)
 
         # ... (Код форми для додавання/редагування залишається без змін)
@@ -203,8 +208,8 @@ class BookmarksPage:
         active_listbox = self._get_current_listbox()
         if not active_listbox: return
         
-        selected_row = active_listbox.get_selected_row()
-        if not selected_row or not hasattr(selected_row, 'bookmark_index'): self.app.show_warning_dialog("Будь ласка, виберіть закладку для редагування."); return
+        selected_row = self._get_first_selected_row(active_listbox)
+        if not selected_row: self.app.show_warning_dialog("Будь ласка, виберіть закладку для редагування."); return
         
         index = selected_row.bookmark_index
         if 0 <= index < len(self.bookmarks): self._set_edit_mode(self.bookmarks[index], index)
@@ -214,8 +219,8 @@ class BookmarksPage:
         active_listbox = self._get_current_listbox()
         if not active_listbox: return
         
-        selected_row = active_listbox.get_selected_row()
-        if not selected_row or not hasattr(selected_row, 'bookmark_index'): self.app.show_warning_dialog("Будь ласка, виберіть закладку для видалення."); return
+        selected_row = self._get_first_selected_row(active_listbox)
+        if not selected_row: self.app.show_warning_dialog("Будь ласка, виберіть закладку для видалення."); return
         
         index_to_remove = selected_row.bookmark_index
         if 0 <= index_to_remove < len(self.bookmarks):
@@ -223,6 +228,28 @@ class BookmarksPage:
             self.save_bookmarks(); self.populate_listbox(); self._set_add_mode()
         else: logger.error(f"Invalid bookmark index {index_to_remove} for removal.")
     
+    def _get_first_selected_row(self, listbox):
+        rows = [row for row in listbox.get_selected_rows() if hasattr(row, 'bookmark_index')]
+        return rows[0] if rows else None
+
+    def get_selected_bookmark_urls(self):
+        """URL усіх виділених закладок активної вкладки, у порядку списку."""
+        active_listbox = self._get_current_listbox()
+        if not active_listbox: return []
+        rows = sorted((row for row in active_listbox.get_selected_rows() if hasattr(row, 'bookmark_index')), key=lambda row: row.get_index())
+        return [self.bookmarks[row.bookmark_index].get('url') for row in rows
+                if 0 <= row.bookmark_index < len(self.bookmarks) and self.bookmarks[row.bookmark_index].get('url')]
+
+    def _on_batch_download_clicked(self, widget):
+        urls = self.get_selected_bookmark_urls()
+        if not urls: self.app.show_warning_dialog("Будь ласка, виберіть одну або кілька закладок."); return
+        youtube_page = self.app._ensure_page("youtube")
+        if youtube_page is None: return
+        accepted = youtube_page.add_batch_urls(urls)
+        if accepted is None: return
+        self.app.stack.set_visible_child_name("youtube_page")
+        self.app._update_status(f"До пакета додано {accepted} з {len(urls)} закладок.")
+
     # Інші методи залишаються без змін, оскільки вони не залежать від конкретного віджета списку
     def _on_cancel_edit_clicked(self, widget): self._set_add_mode()
     def _on_bookmark_activated(self, listbox, row):
@@ -234,6 +261,7 @@ class BookmarksPage:
             if not url: return
             page_target = category if category in ["youtube", "httrack"] else None
             if page_target: self.app.go_to_page_with_url(page_target, url)
+            elif url.startswith(("http://", "https://")): self.app.analyze_and_go_to_page(url)  # локальна класифікація, без мережі
             else: self.app.show_info_dialog("Інформація", f"Це закладка загального призначення.\nURL: {url}")
     def get_page_widget(self): return self.page_widget
     def _update_path_label(self):
@@ -0,0 +1,265 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FILENAME = "downloads.sqlite3"
+LEGACY_ARCHIVE_FILENAME = ".yt-dlp-archive.txt"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    extractor TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    path TEXT,
+    format TEXT,
+    filesize INTEGER,
+    downloaded_at TEXT,
+    PRIMARY KEY (extractor, video_id)
+);
+CREATE TABLE IF NOT EXISTS legacy_imports (
+    path TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS failed_downloads (
+    extractor TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    source TEXT,
+    error_class TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 1,
+    last_attempt TEXT,
+    PRIMARY KEY (extractor, video_id)
+);
+CREATE INDEX IF NOT EXISTS failed_downloads_source ON failed_downloads (source);
+"""
+
+
+def _split_archive_id(archive_id):
+    # Формат yt-dlp: "<extractor у нижньому регістрі> <id>".
+    extractor, _sep, video_id = archive_id.partition(" ")
+    return extractor.lower(), video_id
+
+
+class DownloadArchive:
+    """Спільний для всіх тек і режимів архів завантажень у SQLite.
+
+    Об'єкт поводиться як множина рядків "extractor id" (`in`, `add`), тож його
+    можна передати yt-dlp як `download_archive` замість шляху до текстового
+    файлу: перевірка - це індексований запит, а не читання всього файлу в пам'ять.
+    `record(info)` зберігає шлях, формат, розмір і дату завантаження.
+    Невдалі завантаження зберігаються окремо (`record_failure`) з класом помилки
+    і кількістю спроб; успішне завантаження прибирає запис про помилку.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        # WAL дозволяє GUI, воркерам yt-dlp і CLI одночасно читати і писати.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def __repr__(self):
+        return f"DownloadArchive({self.path!r})"
+
+    def __contains__(self, archive_id):
+        return self.has(*_split_archive_id(archive_id))
+
+    def has(self, extractor, video_id):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM downloads WHERE extractor = ? AND video_id = ?",
+                                     (extractor.lower(), video_id)).fetchone()
+        return row is not None
+
+    def add(self, archive_id):
+        extractor, video_id = _split_archive_id(archive_id)
+        if not video_id:
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR IGNORE INTO downloads (extractor, video_id, downloaded_at) VALUES (?, ?, ?)",
+                               (extractor, video_id, _now()))
+            self._conn.execute("DELETE FROM failed_downloads WHERE extractor = ? AND video_id = ?", (extractor, video_id))
+
+    def record(self, info):
+        extractor = (info.get('extractor_key') or info.get('ie_key') or '').lower()
+        if not extractor or not info.get('id'):
+            return
+        path = info.get('filepath') or info.get('_filename')
+        try:
+            filesize = os.path.getsize(path) if path else None
+        except OSError:
+            filesize = info.get('filesize') or info.get('filesize_approx')
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO downloads (extractor, video_id, title, path, format, filesize, downloaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (extractor, info['id'], info.get('title'), path, info.get('format_id') or info.get('format'), filesize, _now()))
+            self._conn.execute("DELETE FROM failed_downloads WHERE extractor = ? AND video_id = ?", (extractor, info['id']))
+
+    def get(self, extractor, video_id):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM downloads WHERE extractor = ? AND video_id = ?",
+                                        (extractor.lower(), video_id))
+            row = cursor.fetchone()
+            return dict(zip([col[0] for col in cursor.description], row)) if row else None
+
+    def record_failure(self, extractor, video_id, url, title, source, error_class, error):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO failed_downloads (extractor, video_id, url, title, source, error_class, error, attempts, last_attempt) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?) ON CONFLICT(extractor, video_id) DO UPDATE SET "
+                "url = excluded.url, title = excluded.title, source = COALESCE(excluded.source, source), "
+                "error_class = excluded.error_class, error = excluded.error, attempts = attempts + 1, "
+                "last_attempt = excluded.last_attempt",
+                (extractor.lower(), video_id, url, title, source, error_class, error, _now()))
+
+    def clear_failure(self, extractor, video_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM failed_downloads WHERE extractor = ? AND video_id = ?", (extractor.lower(), video_id))
+
+    def failures(self, source=None):
+        """Невдалі завантаження (dict-и) для джерела (нормалізований URL плейлиста) або всі."""
+        query, params = "SELECT * FROM failed_downloads", ()
+        if source is not None:
+            query, params = query + " WHERE source = ?", (source,)
+        with self._lock:
+            cursor = self._conn.execute(query + " ORDER BY last_attempt", params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def import_legacy(self, txt_path):
+        """Імпортує текстовий архів yt-dlp. Повторно читаються лише рядки, дописані після минулого імпорту."""
+        try:
+            size = os.path.getsize(txt_path)
+        except OSError:
+            return 0
+        key = os.path.abspath(txt_path)
+        with self._lock:
+            row = self._conn.execute("SELECT offset FROM legacy_imports WHERE path = ?", (key,)).fetchone()
+        offset = row[0] if row and row[0] <= size else 0
+        if offset == size:
+            return 0
+
+        with open(txt_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        complete, _sep, _partial = data.rpartition(b"\n")
+        rows = []
+        for line in complete.decode("utf-8", errors="replace").splitlines():
+            extractor, video_id = _split_archive_id(line.strip())
+            if extractor and video_id:
+                rows.append((extractor, video_id, None))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO downloads (extractor, video_id, downloaded_at) VALUES (?, ?, ?)", rows)
+            self._conn.execute("INSERT OR REPLACE INTO legacy_imports (path, offset) VALUES (?, ?)",
+                               (key, offset + len(complete) + (1 if _sep else 0)))
+            self._conn.execute("COMMIT")
+        if rows:
+            logger.info(f"Imported {len(rows)} entries from legacy archive {txt_path}.")
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def archive_id(info):
+    """Ідентифікатор запису у форматі yt-dlp ("<extractor у нижньому регістрі> <id>") або None."""
+    extractor = (info.get('extractor_key') or info.get('ie_key') or '').lower()
+    return f"{extractor} {info['id']}" if extractor and info.get('id') else None
+
+
+class TextArchive:
+    """Текстовий архів yt-dlp у теці завантаження - запасний варіант, коли SQLite-архів недоступний."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, encoding="utf-8", errors="replace") as f:
+                self._ids = {line.strip() for line in f if line.strip()}
+        except FileNotFoundError:
+            self._ids = set()
+
+    def __repr__(self):
+        return f"TextArchive({self.path!r})"
+
+    def __contains__(self, archive_id):
+        return archive_id in self._ids
+
+    def add(self, archive_id):
+        with self._lock:
+            if archive_id in self._ids:
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(archive_id + "\n")
+            self._ids.add(archive_id)
+
+    def record(self, info):
+        entry_id = archive_id(info)
+        if entry_id:
+            self.add(entry_id)
+
+
+class ReadOnlyArchive:
+    """`download_archive` для yt-dlp, який лише перевіряє записи, але не додає їх.
+
+    Потрібен, коли постобробку виконує окремий етап: yt-dlp вважає файл готовим,
+    щойно етап поставив його в чергу, тож запис в архів робить сам етап після
+    успішної обробки.
+    """
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def __repr__(self):
+        return f"ReadOnlyArchive({self.archive!r})"
+
+    def __contains__(self, archive_id):
+        return archive_id in self.archive
+
+    def add(self, archive_id):
+        pass
+
+
+def attach_archive_recorder(ydl, archive):
+    """Додає до YoutubeDL постпроцесор, що записує готовий файл в архів (після переміщення у фінальну теку)."""
+    from yt_dlp.postprocessor.common import PostProcessor
+
+    class DownloadArchiveRecorderPP(PostProcessor):
+        def run(self, info):
+            try:
+                archive.record(info)
+            except sqlite3.Error as e:
+                self.report_warning(f"Не вдалося записати {info.get('id')} в архів завантажень: {e}")
+            return [], info
+
+    ydl.add_post_processor(DownloadArchiveRecorderPP(ydl), when='after_move')
+    return ydl
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_download_archive(path=None):
+    """Архів для поточного процесу (з'єднання SQLite не можна ділити між процесами після fork)."""
+    if path is None:
+        from settings_manager import get_config_dir
+        path = os.path.join(str(get_config_dir()), ARCHIVE_FILENAME)
+    key = (os.getpid(), str(path))
+    with _archives_lock:
+        if key not in _archives:
+            _archives[key] = DownloadArchive(path)
+        return _archives[key]
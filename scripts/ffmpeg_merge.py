@@ -0,0 +1,257 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.progress_reporter import ProgressReporter, STAGE_ENCODE
+from scripts.task_channel import get_task_control
+from scripts.ffmpeg_tasks import batch_workers, run_ffmpeg_process
+from scripts.media_probe import get_media_probe, media_duration, first_stream, DEFAULT_PROBE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Кодувальники для нормалізації невідповідних файлів під кодек решти.
+VIDEO_ENCODERS = {"h264": "libx264", "hevc": "libx265", "vp9": "libvpx-vp9", "vp8": "libvpx", "av1": "libaom-av1",
+                  "mpeg4": "mpeg4", "mjpeg": "mjpeg"}
+AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "opus": "libopus", "vorbis": "libvorbis", "ac3": "ac3",
+                  "flac": "flac", "pcm_s16le": "pcm_s16le"}
+# Назви профілів H.264 у ffprobe -> значення -profile:v для libx264.
+_X264_PROFILES = {"Baseline": "baseline", "Constrained Baseline": "baseline", "Main": "main", "High": "high",
+                  "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"}
+# Контейнери з довільною шкалою часу доріжки: нормалізовані частини мають отримати шкалу еталону.
+_TIMESCALE_CONTAINERS = (".mp4", ".m4v", ".mov")
+_INTERLACED_FIELD_ORDERS = ("tt", "bb", "tb", "bt")
+# Склеювання з -c copy у десятки разів швидше за кодування: його вага в загальному прогресі мала.
+_CONCAT_WEIGHT = 0.05
+
+
+def stream_signature(media):
+    """Параметри потоків, які мають збігатися, щоб файли можна було склеїти без перекодування.
+
+    Крім кодека і розміру, concat-демультиплексор з `-c copy` чутливий до шкали часу
+    (time_base), рівня кодека і порядку полів: різні значення дають зламані мітки
+    часу або потік, який декодер не відтворить після межі файлів.
+    """
+    video, audio = first_stream(media, 'video'), first_stream(media, 'audio')
+    video_sig = (video.get('codec_name'), video.get('profile'), video.get('level'), video.get('width'),
+                 video.get('height'), video.get('pix_fmt'), video.get('r_frame_rate'), video.get('time_base'),
+                 video.get('field_order')) if video else None
+    audio_sig = (audio.get('codec_name'), audio.get('sample_rate'), audio.get('channels')) if audio else None
+    return video_sig, audio_sig
+
+
+class MergePlan:
+    """Результат аналізу входів: еталонні параметри і файли, які треба нормалізувати."""
+
+    def __init__(self, inputs, media):
+        self.inputs = list(inputs)
+        self.media = list(media)
+        self.durations = [media_duration(info) for info in self.media]
+        self.unreadable = [path for path, info in zip(self.inputs, self.media) if not info]
+        signatures = [stream_signature(info) for info in self.media]
+        # Еталон - найпоширеніші параметри, а не параметри першого файлу: один "чужий" файл
+        # на початку списку не повинен змушувати перекодовувати всі інші.
+        counts = Counter(signature for signature, info in zip(signatures, self.media) if info)
+        self.reference = max(signatures, key=lambda signature: counts[signature]) if counts else (None, None)
+        self.reference_index = signatures.index(self.reference) if counts else None
+        self.mismatched = [index for index, signature in enumerate(signatures)
+                           if self.media[index] and signature != self.reference]
+        # Аудіофайл серед відео нормалізувати нема з чого: картинку з нього не отримати.
+        self.missing_video = [path for path, info in zip(self.inputs, self.media)
+                              if info and self.reference[0] and not first_stream(info, 'video')]
+
+    @property
+    def total_duration(self):
+        return sum(self.durations)
+
+    @property
+    def stream_copy_only(self):
+        return not self.mismatched
+
+    @property
+    def part_extension(self):
+        """Контейнер нормалізованих частин - той самий, що в еталонного файлу."""
+        if self.reference_index is None:
+            return ".mkv"
+        return os.path.splitext(self.inputs[self.reference_index])[1].lower() or ".mkv"
+
+
+def plan_merge(inputs, probe=None):
+    """Перевіряє всі входи (паралельно, з кешем MediaProbe) і повертає MergePlan."""
+    probe = probe or get_media_probe()
+    with ThreadPoolExecutor(max_workers=DEFAULT_PROBE_WORKERS, thread_name_prefix="merge-probe") as executor:
+        media = list(executor.map(probe.probe, inputs))
+    return MergePlan(inputs, media)
+
+
+def normalize_args(plan, index):
+    """Параметри ffmpeg, що приводять вхід `index` до еталонних параметрів плану."""
+    reference_media = plan.media[plan.reference_index]
+    video, audio = first_stream(reference_media, 'video'), first_stream(reference_media, 'audio')
+    source_audio = first_stream(plan.media[index], 'audio')
+    if video and not first_stream(plan.media[index], 'video'):
+        raise ValueError(f"Файл без відео не можна об'єднати з відеофайлами: {plan.inputs[index]}")
+    args = ['-i', plan.inputs[index]]
+    if audio and not source_audio:
+        # Файл без звуку отримує тишу, інакше склеєний потік аудіо розірветься.
+        layout = audio.get('channel_layout') or ('stereo' if audio.get('channels') == 2 else 'mono')
+        args += ['-f', 'lavfi', '-i', f"anullsrc=r={audio.get('sample_rate')}:cl={layout}", '-shortest']
+    if video:
+        encoder = VIDEO_ENCODERS.get(video.get('codec_name'))
+        if not encoder:
+            raise ValueError(f"Немає кодувальника для нормалізації відео {video.get('codec_name')}.")
+        width, height = video.get('width'), video.get('height')
+        filters = [f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                   f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", "setsar=1"]
+        if video.get('r_frame_rate') and video['r_frame_rate'] != '0/0':
+            filters.append(f"fps={video['r_frame_rate']}")
+        args += ['-map', '0:v:0', '-vf', ",".join(filters), '-c:v', encoder]
+        if video.get('pix_fmt'):
+            args += ['-pix_fmt', video['pix_fmt']]
+        if video.get('codec_name') == 'h264':
+            profile = _X264_PROFILES.get(video.get('profile'))
+            if profile:
+                args += ['-profile:v', profile]
+            # ffprobe повертає рівень H.264 помноженим на 10 (41 -> 4.1).
+            if isinstance(video.get('level'), int) and video['level'] > 0:
+                args += ['-level:v', f"{video['level'] / 10:g}"]
+        if video.get('field_order') in _INTERLACED_FIELD_ORDERS:
+            args += ['-flags', '+ildct+ilme', '-field_order', video['field_order']]
+        time_base = str(video.get('time_base') or '')
+        if plan.part_extension in _TIMESCALE_CONTAINERS and time_base.startswith('1/'):
+            args += ['-video_track_timescale', time_base[2:]]
+    if audio:
+        encoder = AUDIO_ENCODERS.get(audio.get('codec_name'))
+        if not encoder:
+            raise ValueError(f"Немає кодувальника для нормалізації аудіо {audio.get('codec_name')}.")
+        args += ['-map', '1:a:0' if not source_audio else '0:a:0', '-c:a', encoder,
+                 '-ar', str(audio.get('sample_rate')), '-ac', str(audio.get('channels'))]
+    else:
+        args.append('-an')
+    return args
+
+
+def _concat_list_line(path):
+    # Синтаксис списку concat-демультиплексора: шлях в одинарних лапках, лапки всередині - '\''.
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n"
+
+
+class _MergeProgress:
+    """Прогрес об'єднання за сумарною тривалістю: нормалізація плюс склеювання з меншою вагою."""
+
+    def __init__(self, reporter, normalize_seconds, total_seconds):
+        self.reporter = reporter
+        self.normalize_seconds = normalize_seconds
+        self.total_seconds = total_seconds or 1.0
+        self.work = normalize_seconds + _CONCAT_WEIGHT * self.total_seconds
+        self._normalized = {}
+        self._lock = threading.Lock()
+
+    def normalizing(self, index, seconds):
+        with self._lock:
+            self._normalized[index] = seconds
+            done = sum(self._normalized.values())
+        self.reporter.progress(done / self.work, stage=STAGE_ENCODE)
+
+    def concatenating(self, seconds, speed=None):
+        done = self.normalize_seconds + _CONCAT_WEIGHT * min(seconds, self.total_seconds)
+        eta = (self.total_seconds - seconds) / speed if speed else None
+        self.reporter.progress(done / self.work, stage=STAGE_ENCODE, speed=speed, eta=eta)
+
+
+def run_ffmpeg_merge(output_path, kwargs, comm_queue):
+    """Об'єднує `kwargs['inputs']` (у заданому порядку) в `output_path`.
+
+    Файли з однаковими параметрами потоків склеюються concat-демультиплексором з
+    `-c copy`; перекодовуються (до найпоширеніших параметрів, у контейнер еталонного
+    файлу з його шкалою часу) лише ті, що відрізняються.
+    Прогрес рахується від сумарної тривалості входів.
+    """
+    inputs = list(kwargs.get('inputs') or [])
+    reporter = ProgressReporter(comm_queue, kwargs.get('progress_interval'))
+    control = get_task_control(comm_queue)
+    work_dir = None
+
+    try:
+        if len(inputs) < 2:
+            raise ValueError("Для об'єднання потрібно щонайменше два файли.")
+        missing = [path for path in inputs if not os.path.isfile(path)]
+        if missing:
+            raise FileNotFoundError(f"Вхідні файли не знайдено: {', '.join(missing)}")
+        if os.path.abspath(output_path) in {os.path.abspath(path) for path in inputs}:
+            raise ValueError("Вихідний файл не може бути одним із вхідних.")
+
+        reporter.status(f"Аналіз {len(inputs)} файлів...", force=True)
+        plan = plan_merge(inputs)
+        if plan.unreadable:
+            raise ValueError(f"Не вдалося прочитати медіафайли: {', '.join(plan.unreadable)}")
+        if plan.missing_video:
+            raise ValueError(f"Файли без відео не можна об'єднати з відеофайлами: {', '.join(plan.missing_video)}")
+        normalize_seconds = sum(plan.durations[index] for index in plan.mismatched)
+        progress = _MergeProgress(reporter, normalize_seconds, plan.total_duration)
+        logger.info(f"Merge {len(inputs)} files into {output_path}: {len(plan.mismatched)} need normalization.")
+
+        out_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(out_dir, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix=".downys-merge-", dir=out_dir)
+        parts = list(inputs)
+
+        if plan.mismatched:
+            reporter.status(f"Нормалізація {len(plan.mismatched)} з {len(inputs)} файлів (решта копіюється без перекодування)...",
+                            force=True)
+            workers, threads = batch_workers("convert_simple")
+            failures = []
+
+            def normalize(index):
+                control.wait_while_paused()
+                if control.should_stop:
+                    return
+                part_path = os.path.join(work_dir, f"part{index:04d}{plan.part_extension}")
+                command = ['ffmpeg', '-hide_banner', '-y', *normalize_args(plan, index), '-threads', str(threads),
+                           '-progress', 'pipe:1', '-nostats', part_path]
+                returncode, stderr_output = run_ffmpeg_process(
+                    command, control, lambda seconds, _speed, _size: progress.normalizing(index, seconds))
+                if returncode == 0:
+                    parts[index] = part_path
+                elif not control.should_stop:
+                    failures.append(f"{os.path.basename(inputs[index])} (код {returncode}):\n{stderr_output}")
+
+            with ThreadPoolExecutor(max_workers=min(workers, len(plan.mismatched)), thread_name_prefix="ffmpeg-merge") as executor:
+                list(executor.map(normalize, plan.mismatched))
+            if failures and not control.should_stop:
+                raise RuntimeError("Помилка нормалізації FFmpeg: " + "\n".join(failures))
+        else:
+            reporter.status(f"Склеювання {len(inputs)} файлів без перекодування...", force=True)
+
+        if not control.should_stop:
+            list_path = os.path.join(work_dir, "inputs.txt")
+            with open(list_path, 'w', encoding='utf-8') as f:
+                f.writelines(_concat_list_line(path) for path in parts)
+            command = ['ffmpeg', '-hide_banner', '-y', '-f', 'concat', '-safe', '0', '-i', list_path,
+                       '-map', '0:v:0?', '-map', '0:a:0?', '-c', 'copy', '-progress', 'pipe:1', '-nostats', output_path]
+            returncode, stderr_output = run_ffmpeg_process(
+                command, control, lambda seconds, speed, _size: progress.concatenating(seconds, speed))
+
+        if control.should_stop:
+            if os.path.isfile(output_path):
+                os.remove(output_path)
+            reporter.cancelled("Об'єднання скасовано.")
+            return
+        if returncode != 0:
+            raise RuntimeError(f"Помилка об'єднання FFmpeg (код {returncode}):\n{stderr_output}")
+
+        reporter.progress(1.0, stage=STAGE_ENCODE)
+        copied = len(inputs) - len(plan.mismatched)
+        reporter.done(f"Об'єднано {len(inputs)} файлів: {copied} без перекодування, {len(plan.mismatched)} нормалізовано.")
+
+    except Exception as e:
+        import traceback
+        error_msg = f"Неочікувана помилка під час об'єднання FFmpeg: {e}\n{traceback.format_exc()}"
+        logger.critical(error_msg)
+        reporter.error(error_msg)
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
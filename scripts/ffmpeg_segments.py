@@ -0,0 +1,153 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.progress_reporter import STAGE_ENCODE
+from scripts.ffmpeg_tasks import (SEGMENTABLE_TASKS, batch_workers, get_media_duration, run_ffmpeg_process,
+                                  split_codec_args)
+from scripts.media_probe import media_duration, first_stream
+
+logger = logging.getLogger(__name__)
+
+# Коротші частини не окупають запуск окремого ffmpeg і втрату якості на межах GOP.
+MIN_SEGMENT_SECONDS = 120
+# Частин удвічі більше, ніж процесів: повільні частини не лишають ядра без роботи під кінець.
+SEGMENTS_PER_WORKER = 2
+
+# Частки загального прогресу: розрізання і склеювання - копіювання потоків, вони швидкі.
+_SPLIT_SHARE = 0.05
+_CONCAT_SHARE = 0.05
+
+
+def plan_segment_count(duration_sec, workers, requested=None):
+    """Кількість частин для паралельного кодування або 0, якщо файл закороткий."""
+    count = int(requested) if requested else workers * SEGMENTS_PER_WORKER
+    count = min(count, int(duration_sec // MIN_SEGMENT_SECONDS))
+    return count if count >= 2 else 0
+
+
+class _SegmentProgress:
+    """Прогрес частин, зважений за тривалістю: загальний і по кожній частині."""
+
+    def __init__(self, reporter, durations):
+        self.reporter = reporter
+        self.durations = durations
+        self.total = sum(durations) or 1.0
+        self.done_seconds = [0.0] * len(durations)
+        self.finished = 0
+        self._lock = threading.Lock()
+
+    def update(self, index, seconds, speed=None):
+        with self._lock:
+            self.done_seconds[index] = min(seconds, self.durations[index])
+            self._report(speed)
+
+    def finish(self, index):
+        with self._lock:
+            self.done_seconds[index] = self.durations[index]
+            self.finished += 1
+            self._report()
+        self.reporter.status(f"Кодування частинами: {self.finished}/{len(self.durations)} готово", force=True)
+
+    def _report(self, speed=None):
+        fraction = sum(self.done_seconds) / self.total
+        segments = [round(done / duration, 2) if duration else 1.0
+                    for done, duration in zip(self.done_seconds, self.durations)]
+        self.reporter.progress(_SPLIT_SHARE + fraction * (1 - _SPLIT_SHARE - _CONCAT_SHARE), stage=STAGE_ENCODE,
+                               items_done=self.finished, items_total=len(self.durations), speed=speed,
+                               segments=segments)
+
+
+def encode_segmented(input_path, output_path, task_type, options, media, reporter, control, segments=None,
+                     copy_audio=False):
+    """Кодує файл частинами паралельно і склеює їх без перекодування.
+
+    Відео розрізається копіюванням потоку на ключових кадрах (muxer segment),
+    частини кодуються окремими процесами ffmpeg з тими самими параметрами,
+    аудіо кодується один раз цілим, а результат збирається concat-демультиплексором
+    з `-c copy`. З `copy_audio` аудіо не кодується, а копіюється (вже має цільовий
+    кодек). `media` - опис вхідного файлу від MediaProbe. Повертає False,
+    якщо файл закороткий для поділу (тоді кодувати треба звичайним способом)
+    або якщо завдання зупинено.
+    """
+    if task_type not in SEGMENTABLE_TASKS:
+        raise ValueError(f"Завдання {task_type} не кодує відео частинами.")
+    duration_sec = media_duration(media)
+    workers, threads = batch_workers(task_type)
+    count = plan_segment_count(duration_sec, workers, segments)
+    if not count:
+        return False
+    video_args, audio_args = split_codec_args(task_type, options)
+    if copy_audio:
+        audio_args = ['-c:a', 'copy']
+
+    work_dir = tempfile.mkdtemp(prefix=".downys-segments-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        reporter.status(f"Розрізання на {count} частин за ключовими кадрами...", force=True)
+        split_command = ['ffmpeg', '-hide_banner', '-y', '-i', input_path, '-map', '0:v:0', '-c', 'copy', '-an',
+                         '-f', 'segment', '-segment_time', f"{duration_sec / count:.3f}", '-reset_timestamps', '1',
+                         os.path.join(work_dir, 'src%04d.mkv')]
+        returncode, stderr_output = run_ffmpeg_process(split_command, control)
+        if control.should_stop:
+            return False
+        if returncode != 0:
+            raise RuntimeError(f"Помилка розрізання FFmpeg (код {returncode}):\n{stderr_output}")
+
+        sources = sorted(name for name in os.listdir(work_dir) if name.startswith('src'))
+        durations = [get_media_duration(os.path.join(work_dir, name), use_cache=False) for name in sources]
+        progress = _SegmentProgress(reporter, durations)
+        with_audio = first_stream(media, 'audio') is not None
+        logger.info(f"Segmented encode of {input_path}: {len(sources)} segments, {workers} processes x {threads} threads.")
+        reporter.status(f"Кодування {len(sources)} частин: {workers} процесів × {threads} потоків", force=True)
+        failures = []
+
+        def encode(index):
+            control.wait_while_paused()
+            if control.should_stop:
+                return
+            source = os.path.join(work_dir, sources[index])
+            command = ['ffmpeg', '-hide_banner', '-y', '-i', source, *video_args, '-an', '-threads', str(threads),
+                       '-progress', 'pipe:1', '-nostats', os.path.join(work_dir, f'enc{index:04d}.mkv')]
+            returncode, stderr_output = run_ffmpeg_process(
+                command, control, lambda seconds, speed, _size: progress.update(index, seconds, speed))
+            if returncode != 0 and not control.should_stop:
+                failures.append(f"частина {index + 1} (код {returncode}):\n{stderr_output}")
+            elif returncode == 0:
+                progress.finish(index)
+
+        def encode_audio():
+            command = ['ffmpeg', '-hide_banner', '-y', '-i', input_path, '-map', '0:a:0', '-vn', *audio_args,
+                       os.path.join(work_dir, 'audio.mka')]
+            returncode, stderr_output = run_ffmpeg_process(command, control)
+            if returncode != 0 and not control.should_stop:
+                failures.append(f"аудіо (код {returncode}):\n{stderr_output}")
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffmpeg-segment") as executor:
+            pending = [executor.submit(encode_audio)] if with_audio else []
+            pending += [executor.submit(encode, index) for index in range(len(sources))]
+            for future in pending:
+                future.result()
+        if control.should_stop:
+            return False
+        if failures:
+            raise RuntimeError("Помилка кодування частин FFmpeg: " + "\n".join(failures))
+
+        reporter.status("Склеювання частин...", force=True)
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"file 'enc{index:04d}.mkv'\n" for index in range(len(sources)))
+        concat_command = ['ffmpeg', '-hide_banner', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if with_audio:
+            concat_command += ['-i', os.path.join(work_dir, 'audio.mka'), '-map', '0:v:0', '-map', '1:a:0']
+        concat_command += ['-c', 'copy', output_path]
+        returncode, stderr_output = run_ffmpeg_process(concat_command, control)
+        if control.should_stop:
+            return False
+        if returncode != 0:
+            raise RuntimeError(f"Помилка склеювання FFmpeg (код {returncode}):\n{stderr_output}")
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -2,34 +2,176 @@ import subprocess
 import shlex
 import os
 import re
+import glob
+import itertools
+import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.progress_reporter import ProgressReporter, STAGE_ENCODE
+from scripts.task_channel import get_task_control, control_subprocess
+from scripts.media_probe import get_media_probe, media_duration, first_stream, is_media_file
 
 logger = logging.getLogger(__name__)
 
-def get_media_duration(file_path):
+# Скільки потоків ffmpeg бере собі на одне завдання: libx264 добре масштабується
+# приблизно до 4 потоків на файл, аудіокодеки однопотокові.
+FFMPEG_TASK_THREADS = {
+    "convert_simple": 4,
+    "convert_format": 2,
+    "extract_audio_aac": 1,
+    "extract_audio_mp3": 1,
+    "compress_bitrate": 4,
+    "adjust_resolution": 4,
+}
+# Типове розширення результату, якщо пакет не задає output_ext.
+TASK_OUTPUT_EXT = {
+    "convert_simple": ".mp4",
+    "convert_format": ".avi",
+    "extract_audio_aac": ".aac",
+    "extract_audio_mp3": ".mp3",
+    "compress_bitrate": ".mp4",
+    "adjust_resolution": ".mp4",
+}
+BATCH_OUTPUT_SUFFIX = "_converted"
+# Цільові кодеки завдань, для яких придатні потоки копіюються без перекодування (-c copy).
+STREAM_COPY_TARGETS = {
+    "convert_simple": {"video": "h264", "audio": "aac"},
+    "extract_audio_aac": {"audio": "aac"},
+}
+# Завдання, які можна кодувати частинами паралельно (див. scripts/ffmpeg_segments.py).
+SEGMENTABLE_TASKS = ("convert_simple", "compress_bitrate", "adjust_resolution")
+
+_PROGRESS_PATTERN = re.compile(r"^(out_time_ms|speed|total_size)=\s*([\d.]+)")
+
+
+def get_media_duration(file_path, use_cache=True):
+    return media_duration(get_media_probe().probe(file_path, use_cache=use_cache))
+
+
+def plan_stream_copy(task_type, media):
+    """Параметри ffmpeg, що копіюють потоки, які вже мають цільовий кодек, і кодують решту.
+
+    Повертає (параметри, опис шляху для статусу, скопійовані типи потоків - {"video", "audio"})
+    або None, якщо завдання не має швидкого шляху чи жоден потік не підходить для копіювання.
+    """
+    targets = STREAM_COPY_TARGETS.get(task_type)
+    if not targets or not media:
+        return None
+    video = first_stream(media, 'video') if 'video' in targets else None
+    audio = first_stream(media, 'audio')
+    if not ((video and video.get('codec_name') == targets['video']) or (audio and audio.get('codec_name') == targets['audio'])):
+        return None
+
+    args, parts, copied = [], [], set()
+    if 'video' in targets:
+        if video is None:
+            return None
+        args += ['-map', f"0:{video['index']}"]
+        if video.get('codec_name') == targets['video']:
+            args += ['-c:v', 'copy']; parts.append(f"відео: копіювання ({video['codec_name']})"); copied.add('video')
+        else:
+            args += ['-c:v', 'libx264']; parts.append(f"відео: {video.get('codec_name')} → h264")
+    else:
+        args.append('-vn')
+    if audio is not None:
+        args += ['-map', f"0:{audio['index']}"]
+        if audio.get('codec_name') == targets['audio']:
+            args += ['-c:a', 'copy']; parts.append(f"аудіо: копіювання ({audio['codec_name']})"); copied.add('audio')
+        else:
+            args += ['-c:a', 'aac']; parts.append(f"аудіо: {audio.get('codec_name')} → aac")
+    elif 'video' not in targets:
+        return None
+    return [*args, '-y'], ", ".join(parts), frozenset(copied)
+
+
+def task_codec_args(task_type, options, media, output_path):
+    """(параметри кодування, опис шляху або None, скопійовані типи потоків): швидкий шлях з копіюванням,
+    якщо він можливий.
+
+    `media` - опис вхідного файлу від MediaProbe.
+    """
+    if task_type in STREAM_COPY_TARGETS:
+        plan = plan_stream_copy(task_type, media)
+        if plan:
+            return plan
+    return build_task_args(task_type, options, output_path), None, frozenset()
+
+
+def split_codec_args(task_type, options):
+    """(параметри відео, параметри аудіо) для завдань, що кодують відео через libx264."""
+    options = options or {}
+    if task_type == "convert_simple":
+        return ['-c:v', 'libx264'], ['-c:a', 'aac']
+    if task_type == "compress_bitrate":
+        bitrate = options.get('bitrate')
+        if not bitrate: raise ValueError("Бітрейт ('bitrate') не вказано для стиснення.")
+        return ['-c:v', 'libx264', '-b:v', str(bitrate), '-preset', 'medium'], ['-c:a', 'aac', '-b:a', '128k']
+    if task_type == "adjust_resolution":
+        width = options.get('width')
+        height = options.get('height')
+        if not width or not height: raise ValueError("Ширина ('width') або висота ('height') не вказані.")
+        return ['-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease', '-c:v', 'libx264', '-preset', 'medium'], ['-c:a', 'aac']
+    raise ValueError(f"Завдання {task_type} не кодує відео частинами.")
+
+
+def build_task_args(task_type, options, output_path):
+    """Параметри кодування ffmpeg для завдання (усе між входом і виходом)."""
+    options = options or {}
+    if task_type in SEGMENTABLE_TASKS:
+        video_args, audio_args = split_codec_args(task_type, options)
+        return [*video_args, *audio_args, '-y']
+    if task_type == "convert_format" and output_path.lower().endswith(".avi"):
+        return ['-c:v', 'mpeg4', '-qscale:v', '4', '-c:a', 'libmp3lame', '-qscale:a', '4', '-y']
+    if task_type == "extract_audio_aac":
+        return ['-vn', '-c:a', 'aac', '-y']
+    if task_type == "extract_audio_mp3":
+        bitrate = options.get('audio_bitrate', '192k')
+        return ['-vn', '-c:a', 'libmp3lame', '-ab', str(bitrate), '-y']
+    raise ValueError(f"Невідомий тип завдання FFmpeg: {task_type}")
+
+
+def run_ffmpeg_process(command, control, on_progress=None):
+    """Запускає ffmpeg з `-progress pipe:1` і передає `on_progress(секунди, speed, total_size)`.
+
+    Процес прив'язаний до керування завданням (пауза, скасування). Повертає (код виходу, stderr).
+    """
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, encoding='utf-8', errors='replace', bufsize=1)
+    detach_control = control_subprocess(control, process)
+    # stderr читається окремим потоком: інакше заповнений pipe зупиняє ffmpeg.
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_thread.start()
+    speed, total_size = None, None
     try:
-        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return float(result.stdout.strip())
-    except (subprocess.CalledProcessError, ValueError, FileNotFoundError) as e:
-        logger.warning(f"Could not get duration for {file_path}: {e}")
-        return 0
+        for line in iter(process.stdout.readline, ''):
+            match = _PROGRESS_PATTERN.match(line)
+            if not match:
+                continue
+            key, value = match.groups()
+            if key == "speed":
+                speed = float(value)
+            elif key == "total_size":
+                total_size = int(value)
+            elif on_progress:
+                # out_time_ms у ffmpeg насправді в мікросекундах.
+                on_progress(int(value) / 1000000, speed, total_size)
+        process.wait()
+        stderr_thread.join()
+    finally:
+        detach_control()
+    return process.returncode, "".join(stderr_chunks)
+
 
 def run_ffmpeg_task(input_path, output_path, kwargs, comm_queue):
     task_type = kwargs.get('task_type')
     task_options = kwargs.get('task_options', {})
 
-    def send_status(message):
-        comm_queue.put({"type": "status", "value": message})
-
-    def send_progress(fraction):
-        comm_queue.put({"type": "progress", "value": fraction})
-
-    def send_done(message):
-        comm_queue.put({"type": "done", "value": message})
-
-    def send_error(message):
-        comm_queue.put({"type": "error", "value": message})
+    reporter = ProgressReporter(comm_queue, kwargs.get('progress_interval'))
+    send_status, send_done, send_error = reporter.status, reporter.done, reporter.error
+    control = get_task_control(comm_queue)
 
     try:
         send_status(f"Запуск FFmpeg: {task_type}...")
@@ -37,60 +179,60 @@ def run_ffmpeg_task(input_path, output_path, kwargs, comm_queue):
         if not os.path.isfile(input_path):
             raise FileNotFoundError(f"Вхідний файл не знайдено: {input_path}")
         
-        duration_sec = get_media_duration(input_path)
+        media = get_media_probe().probe(input_path)
+        duration_sec = media_duration(media)
+        codec_args, copy_path, copied = task_codec_args(task_type, task_options, media, output_path)
+        if copy_path:
+            logger.info(f"Stream copy fast path for {input_path}: {copy_path}")
+            send_status(f"Швидкий шлях: {copy_path}")
 
-        command = ['ffmpeg', '-hide_banner', '-i', input_path]
-        
-        options = task_options or {}
-        if task_type == "convert_simple":
-            command.extend(['-c:v', 'libx264', '-c:a', 'aac', '-y'])
-        elif task_type == "convert_format" and output_path.lower().endswith(".avi"):
-             command.extend(['-c:v', 'mpeg4', '-qscale:v', '4', '-c:a', 'libmp3lame', '-qscale:a', '4', '-y'])
-        elif task_type == "extract_audio_aac":
-            command.extend(['-vn', '-c:a', 'aac', '-y'])
-        elif task_type == "extract_audio_mp3":
-            bitrate = options.get('audio_bitrate', '192k')
-            command.extend(['-vn', '-c:a', 'libmp3lame', '-ab', str(bitrate), '-y'])
-        elif task_type == "compress_bitrate":
-            bitrate = options.get('bitrate')
-            if not bitrate: raise ValueError("Бітрейт ('bitrate') не вказано для стиснення.")
-            command.extend(['-c:v', 'libx264', '-b:v', str(bitrate), '-preset', 'medium', '-c:a', 'aac', '-b:a', '128k', '-y'])
-        elif task_type == "adjust_resolution":
-            width = options.get('width')
-            height = options.get('height')
-            if not width or not height: raise ValueError("Ширина ('width') або висота ('height') не вказані.")
-            command.extend(['-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease', '-c:v', 'libx264', '-preset', 'medium', '-c:a', 'aac', '-y'])
-        else:
-            raise ValueError(f"Невідомий тип завдання FFmpeg: {task_type}")
+        # Паралельне кодування частинами: True (кількість частин за ядрами) або число частин.
+        parallel_segments = kwargs.get('parallel_segments', (task_options or {}).get('parallel_segments'))
+        # Копійоване відео кодувати нічого; якщо копіюється лише аудіо, частинами кодується відео.
+        if parallel_segments and 'video' not in copied and task_type in SEGMENTABLE_TASKS and duration_sec > 0:
+            from scripts.ffmpeg_segments import encode_segmented
+            requested = None if parallel_segments is True else int(parallel_segments)
+            if encode_segmented(input_path, output_path, task_type, task_options, media, reporter, control, requested,
+                                copy_audio='audio' in copied):
+                reporter.progress(1.0, stage=STAGE_ENCODE)
+                send_done("FFmpeg завдання виконано (кодування частинами).")
+                return
+            if control.should_stop:
+                if os.path.isfile(output_path):
+                    os.remove(output_path)
+                reporter.cancelled("FFmpeg завдання скасовано.")
+                return
+            logger.info(f"{input_path} is too short for segmented encoding, using a single pass.")
 
+        command = ['ffmpeg', '-hide_banner', '-i', input_path]
+        command.extend(codec_args)
         command.extend(['-progress', 'pipe:1', '-nostats'])
         command.append(output_path)
         
         logger.info(f"Executing FFmpeg command: {' '.join(command)}")
-        send_status("Обробка FFmpeg...")
-        send_progress(0.05)
+        send_status("Копіювання потоків FFmpeg..." if copy_path else "Обробка FFmpeg...")
+        reporter.progress(0.05, stage=STAGE_ENCODE, force=True)
 
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
-                                   text=True, encoding='utf-8', errors='replace', bufsize=1)
-        
-        progress_pattern = re.compile(r"out_time_ms=(\d+)")
-        
-        for line in iter(process.stdout.readline, ''):
+        def on_progress(current_sec, speed, total_size):
             if duration_sec > 0:
-                match = progress_pattern.search(line)
-                if match:
-                    current_ms = int(match.group(1))
-                    progress = min(1.0, (current_ms / 1000000) / duration_sec)
-                    send_progress(progress)
-        
-        stderr_output = process.stderr.read()
-        process.wait()
+                eta = (duration_sec - current_sec) / speed if speed else None
+                reporter.progress(min(1.0, current_sec / duration_sec), stage=STAGE_ENCODE,
+                                  bytes_done=total_size, speed=speed, eta=eta)
+
+        returncode, stderr_output = run_ffmpeg_process(command, control, on_progress)
+
+        if control.should_stop:
+            # Обірваний вихідний файл непридатний, тож його краще прибрати.
+            if os.path.isfile(output_path):
+                os.remove(output_path)
+            reporter.cancelled("FFmpeg завдання скасовано.")
+            return
         
-        if process.returncode != 0:
-            error_msg = f"Помилка виконання FFmpeg (код {process.returncode}):\n{stderr_output}"
+        if returncode != 0:
+            error_msg = f"Помилка виконання FFmpeg (код {returncode}):\n{stderr_output}"
             raise RuntimeError(error_msg)
 
-        send_progress(1.0)
+        reporter.progress(1.0, stage=STAGE_ENCODE)
         send_done("FFmpeg завдання виконано.")
 
     except Exception as e:
@@ -98,3 +240,189 @@ def run_ffmpeg_task(input_path, output_path, kwargs, comm_queue):
         error_msg = f"Неочікувана помилка під час виконання FFmpeg: {e}\n{traceback.format_exc()}"
         logger.critical(error_msg)
         send_error(error_msg)
+
+
+def run_ffmpeg_segmented(input_path, output_path, kwargs, comm_queue):
+    """run_ffmpeg_task з кодуванням частинами.
+
+    Окрема функція - окрема група слотів планувальника: кодування частинами саме
+    займає всі ядра, тож такі завдання не повинні ділити слоти run_ffmpeg_task.
+    """
+    segments = kwargs.get('parallel_segments') or (kwargs.get('task_options') or {}).get('parallel_segments') or True
+    run_ffmpeg_task(input_path, output_path, {**kwargs, 'parallel_segments': segments}, comm_queue)
+
+
+def batch_workers(task_type, threads_per_job=None):
+    """(кількість процесів ffmpeg, потоків на процес): разом вони займають усі ядра, але не більше."""
+    cpu_count = os.cpu_count() or 2
+    threads = max(1, min(cpu_count, int(threads_per_job or FFMPEG_TASK_THREADS.get(task_type, 2))))
+    return max(1, cpu_count // threads), threads
+
+
+def _free_output_path(target_dir, base, source_ext, suffix, output_ext, taken):
+    candidates = [base, f"{base}-{source_ext.lstrip('.').lower() or 'file'}"]
+    for name in itertools.chain(candidates, (f"{candidates[1]}-{number}" for number in itertools.count(2))):
+        path = os.path.join(target_dir, f"{name}{suffix}{output_ext}")
+        if os.path.abspath(path) not in taken:
+            return path
+
+
+def plan_batch(source, output_ext, output_dir=None, suffix=BATCH_OUTPUT_SUFFIX, recursive=False):
+    """Вхідні файли з директорії або glob-шаблону і їхні вихідні шляхи.
+
+    Повертає (jobs, skipped) - списки пар (вхід, вихід). Вихідний файл, новіший за вхідний,
+    вважається актуальним і пропускається. Результати попередніх запусків (з `suffix`) не беруться як вхід.
+    Якщо кілька входів дають однакову назву (a.mp4 і a.mkv -> a.mp4), наступні отримують
+    у назві своє розширення, а за потреби і номер (a-mkv_converted.mp4, a-mkv-2_converted.mp4).
+    """
+    source = os.path.expanduser(source)
+    if os.path.isdir(source):
+        pattern = os.path.join(glob.escape(source), "**", "*") if recursive else os.path.join(glob.escape(source), "*")
+        inputs = [path for path in glob.glob(pattern, recursive=recursive)
+                  if is_media_file(path)]
+    else:
+        inputs = glob.glob(source, recursive=True)
+    inputs = sorted(path for path in inputs if os.path.isfile(path))
+    if not inputs:
+        raise FileNotFoundError(f"Не знайдено вхідних файлів: {source}")
+
+    jobs, skipped = [], []
+    # Вихідні шляхи не можуть збігатися ні між собою, ні з будь-яким вхідним файлом.
+    taken = {os.path.abspath(path) for path in inputs}
+    for input_path in inputs:
+        base, source_ext = os.path.splitext(os.path.basename(input_path))
+        if suffix and base.endswith(suffix):
+            continue
+        target_dir = os.path.expanduser(output_dir) if output_dir else os.path.dirname(input_path)
+        output_path = _free_output_path(target_dir, base, source_ext, suffix, output_ext, taken)
+        taken.add(os.path.abspath(output_path))
+        if os.path.isfile(output_path) and os.path.getmtime(output_path) >= os.path.getmtime(input_path):
+            skipped.append((input_path, output_path))
+        else:
+            jobs.append((input_path, output_path))
+    return jobs, skipped
+
+
+def _partial_path(output_path):
+    # Розширення лишається останнім, щоб ffmpeg визначив формат; недописаний файл
+    # не виглядає актуальним для наступного запуску.
+    base, ext = os.path.splitext(output_path)
+    return f"{base}.part{ext}"
+
+
+class _BatchProgress:
+    """Сумарний прогрес пакета: завершені файли плюс частки файлів, що обробляються."""
+
+    def __init__(self, reporter, total):
+        self.reporter = reporter
+        self.total = total
+        self.done = 0
+        self.started = time.monotonic()
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, fraction):
+        with self._lock:
+            self._running[key] = fraction
+            self._report()
+
+    def finish(self, key):
+        with self._lock:
+            self._running.pop(key, None)
+            self.done += 1
+            self._report()
+
+    def _report(self):
+        fraction = (self.done + sum(self._running.values())) / self.total
+        elapsed = time.monotonic() - self.started
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0.01 else None
+        self.reporter.progress(fraction, stage=STAGE_ENCODE, items_done=self.done, items_total=self.total,
+                               eta=eta, active=len(self._running))
+
+
+def run_ffmpeg_batch(source, kwargs, comm_queue):
+    """Пакетна обробка директорії або glob-шаблону одним завданням FFmpeg.
+
+    Файли обробляються пулом процесів ffmpeg, розмір якого - ядра, поділені на
+    потоки одного процесу (`-threads`), тож машина завантажена повністю без
+    перевантаження. kwargs: task_type, task_options, output_ext, output_dir,
+    recursive, threads_per_job.
+    """
+    task_type = kwargs.get('task_type')
+    task_options = kwargs.get('task_options', {})
+    reporter = ProgressReporter(comm_queue, kwargs.get('progress_interval'))
+    control = get_task_control(comm_queue)
+
+    try:
+        output_ext = kwargs.get('output_ext') or TASK_OUTPUT_EXT.get(task_type, ".mp4")
+        # Перевірка параметрів до запуску пулу; розширення потрібне, бо від нього залежать кодеки (convert_format).
+        build_task_args(task_type, task_options, "x" + output_ext)
+        jobs, skipped = plan_batch(source, output_ext, kwargs.get('output_dir'), recursive=kwargs.get('recursive', False))
+        if not jobs:
+            reporter.done(f"Усі файли ({len(skipped)}) вже оброблені.")
+            return
+        for output_dir in {os.path.dirname(output_path) for _input, output_path in jobs}:
+            os.makedirs(output_dir, exist_ok=True)
+
+        workers, threads = batch_workers(task_type, kwargs.get('threads_per_job'))
+        workers = min(workers, len(jobs))
+        logger.info(f"FFmpeg batch {task_type}: {len(jobs)} files, {len(skipped)} up to date, "
+                    f"{workers} processes x {threads} threads.")
+        reporter.status(f"FFmpeg: {len(jobs)} файлів ({len(skipped)} вже актуальні), {workers} процесів × {threads} потоків",
+                        force=True)
+        progress = _BatchProgress(reporter, len(jobs))
+        completed, failures, copied = [], [], []
+
+        def process(job):
+            input_path, output_path = job
+            control.wait_while_paused()
+            if control.should_stop:
+                return
+            media = get_media_probe().probe(input_path)
+            duration_sec = media_duration(media)
+            partial_path = _partial_path(output_path)
+            codec_args, copy_path, _copied = task_codec_args(task_type, task_options, media, output_path)
+            if copy_path:
+                logger.info(f"Stream copy fast path for {input_path}: {copy_path}")
+                copied.append(input_path)
+            command = ['ffmpeg', '-hide_banner', '-i', input_path, *codec_args,
+                       '-threads', str(threads), '-progress', 'pipe:1', '-nostats', partial_path]
+
+            def on_progress(current_sec, speed, total_size):
+                if duration_sec > 0:
+                    progress.update(input_path, min(1.0, current_sec / duration_sec))
+
+            try:
+                returncode, stderr_output = run_ffmpeg_process(command, control, on_progress)
+                if returncode == 0 and not control.should_stop:
+                    os.replace(partial_path, output_path)
+                    completed.append(input_path)
+                elif not control.should_stop:
+                    last_line = (stderr_output.strip().splitlines() or [""])[-1]
+                    failures.append((input_path, f"код {returncode}: {last_line}"))
+            except Exception as e:
+                failures.append((input_path, str(e)))
+            finally:
+                if os.path.isfile(partial_path):
+                    os.remove(partial_path)
+                progress.finish(input_path)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ffmpeg-batch") as executor:
+            list(executor.map(process, jobs))
+
+        if control.should_stop:
+            reporter.cancelled(f"Пакетну обробку зупинено: {len(completed)} з {len(jobs)} файлів готові.")
+            return
+        reporter.progress(1.0, stage=STAGE_ENCODE, items_done=len(jobs), items_total=len(jobs))
+        if failures:
+            details = "\n".join(f"{os.path.basename(path)}: {error}" for path, error in failures)
+            reporter.error(f"FFmpeg: {len(failures)} з {len(jobs)} файлів не оброблено.", details)
+            return
+        reporter.done(f"FFmpeg: оброблено {len(jobs)} файлів ({len(copied)} без перекодування), "
+                      f"пропущено {len(skipped)} актуальних.")
+
+    except Exception as e:
+        import traceback
+        error_msg = f"Неочікувана помилка під час пакетної обробки FFmpeg: {e}\n{traceback.format_exc()}"
+        logger.critical(error_msg)
+        reporter.error(error_msg)
@@ -0,0 +1,159 @@
+import datetime
+import json
+import logging
+import os
+import threading
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+TUNING_FILENAME = "fragment_tuning.json"
+MIN_FRAGMENTS = 1
+MAX_FRAGMENTS = 16
+# Коротші завантаження дають надто шумний вимір пропускної здатності.
+MIN_SAMPLE_BYTES = 4 * 1024 * 1024
+MIN_SAMPLE_SECONDS = 2.0
+# Значення вважається "не гіршим" за найкраще, якщо дає щонайменше 95% його швидкості:
+# так обирається точка перегину, а не максимум ціною зайвих з'єднань.
+KNEE_RATIO = 0.95
+
+
+def tuning_key(info):
+    """Ключ "extractor@host" для збереженого значення; host - домен сервера фрагментів."""
+    formats = info.get('requested_formats') or [info]
+    url = next((f.get('fragment_base_url') or f.get('url') for f in formats if f.get('fragment_base_url') or f.get('url')), None)
+    host = (urlparse(url).hostname or "") if url else ""
+    host = ".".join(host.split(".")[-2:]) or urlparse(info.get('webpage_url') or "").hostname or "unknown"
+    return f"{(info.get('extractor_key') or 'generic').lower()}@{host}"
+
+
+class TuningStore:
+    """Найкращі значення concurrent_fragment_downloads, збережені в JSON у теці налаштувань."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read fragment tuning data {self.path}: {e}")
+            return {}
+
+    def get(self, key):
+        entry = self._load().get(key)
+        return int(entry["best"]) if entry and entry.get("best") else None
+
+    def put(self, key, best, throughput):
+        with self._lock:
+            data = self._load()
+            data[key] = {"best": int(best), "throughput": round(throughput), "updated": datetime.date.today().isoformat()}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to save fragment tuning data {self.path}: {e}")
+
+
+class FragmentTuner:
+    """Підбирає кількість паралельних фрагментів yt-dlp за виміряною пропускною здатністю.
+
+    yt-dlp читає concurrent_fragment_downloads на початку завантаження кожного
+    файлу (формату), тож значення змінюється між файлами: після кожного
+    фрагментованого файлу вимірюється швидкість, і наступний файл пробує
+    сусіднє значення (більше, потім менше), доки найкраще не перестане змінюватися.
+    """
+
+    def __init__(self, store, initial, min_value=MIN_FRAGMENTS, max_value=MAX_FRAGMENTS):
+        self.store = store
+        self.min_value = min_value
+        self.max_value = max_value
+        self.current = self._clamp(initial)
+        self.key = None
+        self.results = {}  # concurrency -> throughput, байт/с
+        self._params = None
+        self._sample = None
+        self._lock = threading.Lock()
+
+    def _clamp(self, value):
+        return max(self.min_value, min(self.max_value, int(value or self.min_value)))
+
+    def prepare(self, info, params):
+        """Викликається перед завантаженням кожного відео (постпроцесор before_dl)."""
+        with self._lock:
+            self._params = params
+            key = tuning_key(info)
+            if key != self.key:
+                self.key, self.results = key, {}
+                stored = self.store.get(key) if self.store else None
+                if stored:
+                    self.current = self._clamp(stored)
+                    logger.info(f"Fragment concurrency for {key}: {self.current} (saved).")
+            params['concurrent_fragment_downloads'] = self.current
+
+    def observe(self, d):
+        """Викликається з progress_hook для кожної події yt-dlp."""
+        with self._lock:
+            filename = d.get('filename')
+            if d['status'] == 'downloading':
+                if self._sample is None or self._sample['filename'] != filename:
+                    self._sample = {'filename': filename, 'fragmented': False}
+                if d.get('fragment_index') is not None:
+                    self._sample['fragmented'] = True
+            elif d['status'] == 'finished' and self._sample and self._sample['filename'] == filename:
+                sample, self._sample = self._sample, None
+                size = d.get('total_bytes') or d.get('downloaded_bytes') or 0
+                elapsed = d.get('elapsed') or 0
+                if sample['fragmented'] and size >= MIN_SAMPLE_BYTES and elapsed >= MIN_SAMPLE_SECONDS:
+                    self._record(size / elapsed)
+
+    def _record(self, throughput):
+        previous = self.results.get(self.current)
+        # Повторні виміри згладжуються: швидкість сервера коливається між файлами.
+        self.results[self.current] = throughput if previous is None else 0.5 * previous + 0.5 * throughput
+        best = self.best()
+        next_value = self._next_candidate(best)
+        logger.info(f"Fragment concurrency {self.current}: {throughput / 1024 / 1024:.1f} MiB/s; best {best}, next {next_value}.")
+        if self.store and self.key:
+            self.store.put(self.key, best, self.results[best])
+        self.current = next_value
+        if self._params is not None:
+            self._params['concurrent_fragment_downloads'] = next_value
+
+    def best(self):
+        if not self.results:
+            return self.current
+        top = max(self.results.values())
+        return min(value for value, throughput in self.results.items() if throughput >= KNEE_RATIO * top)
+
+    def _next_candidate(self, best):
+        up = self._clamp(best + max(1, best // 2))
+        down = self._clamp(best - max(1, best // 3))
+        for candidate in (up, down):
+            if candidate not in self.results:
+                return candidate
+        return best  # обидва сусіди гірші - значення знайдено
+
+
+def attach_fragment_tuner(ydl, tuner):
+    """Додає постпроцесор before_dl, який виставляє значення тюнера перед завантаженням відео."""
+    from yt_dlp.postprocessor.common import PostProcessor
+
+    class FragmentTunerPP(PostProcessor):
+        def run(self, info):
+            tuner.prepare(info, self._downloader.params)
+            return [], info
+
+    ydl.add_post_processor(FragmentTunerPP(ydl), when='before_dl')
+    return ydl
+
+
+def get_tuning_store():
+    from settings_manager import get_config_dir
+    return TuningStore(os.path.join(str(get_config_dir()), TUNING_FILENAME))
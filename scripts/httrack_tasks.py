@@ -7,18 +7,17 @@ import logging
 import traceback
 from urllib.parse import urlparse
 
+from scripts.progress_reporter import ProgressReporter
+from scripts.task_channel import get_task_control, control_subprocess
+
 logger = logging.getLogger(__name__)
 
 def run_httrack_web_threaded(url, output_dir, kwargs, comm_queue):
-    def send(type_, message, details=""):
-        data = {"type": type_, "value": message}
-        if details:
-            data["details"] = details
-        comm_queue.put(data)
+    reporter = ProgressReporter(comm_queue, kwargs.get('progress_interval'))
+    send_done, send_error = reporter.done, reporter.error
 
-    def send_status(msg): send("status", msg)
-    def send_done(msg): send("done", msg)
-    def send_error(msg, details=""): send("error", msg, details)
+    def send_status(msg): reporter.status(msg, force=True)
+    control = get_task_control(comm_queue)
 
     try:
         if not url:
@@ -108,12 +107,13 @@ def run_httrack_web_threaded(url, output_dir, kwargs, comm_queue):
             text=True, encoding='utf-8', errors='replace',
             bufsize=1, startupinfo=si
         )
+        detach_control = control_subprocess(control, process)
 
+        # Рядки виводу HTTrack об'єднуються репортером, щоб великий мірор не засипав GUI повідомленнями.
         has_output = False
         for line in iter(process.stdout.readline, ''):
             if line:
-                line_strip = line.strip()
-                send_status(f"HTTrack: {line_strip}")
+                reporter.status(f"HTTrack: {line.strip()}")
                 has_output = True
 
         process.wait(timeout=300)
@@ -121,8 +121,13 @@ def run_httrack_web_threaded(url, output_dir, kwargs, comm_queue):
 
         if stdout_rem:
             for line in stdout_rem.strip().splitlines():
-                send_status(f"HTTrack: {line.strip()}")
+                reporter.status(f"HTTrack: {line.strip()}")
                 has_output = True
+        reporter.flush()
+        detach_control()
+
+        if control.should_stop:
+            return reporter.cancelled(f"HTTrack зупинено. Дзеркало в {project_dir} можна продовжити режимом оновлення.")
 
         if process.returncode != 0:
             error_details = stderr_rem.strip()
@@ -148,6 +153,7 @@ def run_httrack_web_threaded(url, output_dir, kwargs, comm_queue):
 
         if archive_after and mirror_mode == 'create':
             send_status("Архівація завантаженого сайту...")
+            reporter.flush()
             archive_directory_threaded(project_dir, archive_path, {'source_already_validated': True}, comm_queue)
         else:
             # Повідомлення про завершення все ще використовує `project_dir`, що правильно
@@ -163,15 +169,8 @@ def run_httrack_web_threaded(url, output_dir, kwargs, comm_queue):
 
 
 def archive_directory_threaded(directory_to_archive, archive_path, kwargs, comm_queue):
-    def send(type_, message, details=""):
-        data = {"type": type_, "value": message}
-        if details:
-            data["details"] = details
-        comm_queue.put(data)
-
-    def send_status(msg): send("status", msg)
-    def send_done(msg): send("done", msg)
-    def send_error(msg, details=""): send("error", msg, details)
+    reporter = ProgressReporter(comm_queue, kwargs.get('progress_interval'))
+    send_status, send_done, send_error = reporter.status, reporter.done, reporter.error
 
     try:
         if not kwargs.get('source_already_validated'):
@@ -180,7 +179,10 @@ def archive_directory_threaded(directory_to_archive, archive_path, kwargs, comm_
             if not archive_path:
                 return send_error("Не вказано шлях для архіву.")
 
-        ext = os.path.splitext(archive_path)[1].lower()
+        # splitext бачить лише останнє розширення (".gz" для ".tar.gz"), тож подвійні перевіряються окремо.
+        lower_path = archive_path.lower()
+        ext = next((double for double in ('.tar.gz', '.tar.bz2') if lower_path.endswith(double)),
+                   os.path.splitext(lower_path)[1])
         if ext in ['.tar.gz', '.tgz']:
             archive_format = 'gztar'
         elif ext in ['.tar.bz2', '.tbz2']:
@@ -200,9 +202,7 @@ def archive_directory_threaded(directory_to_archive, archive_path, kwargs, comm_
             os.makedirs(archive_dir, exist_ok=True)
             send_status(f"Створено директорію для архіву: {archive_dir}")
 
-        base_name = os.path.splitext(archive_path)[0]
-        if base_name.endswith('.tar'):
-            base_name = os.path.splitext(base_name)[0]
+        base_name = archive_path[:-len(ext)]
 
         send_status(f"Архівування '{os.path.basename(directory_to_archive)}' у '{archive_path}'...")
         final_archive_path = shutil.make_archive(
@@ -211,6 +211,9 @@ def archive_directory_threaded(directory_to_archive, archive_path, kwargs, comm_
             root_dir=os.path.dirname(os.path.abspath(directory_to_archive)),
             base_dir=os.path.basename(directory_to_archive)
         )
+        if os.path.abspath(final_archive_path) != os.path.abspath(archive_path):
+            # make_archive завжди дописує ".tar.gz"/".tar.bz2", навіть якщо просили ".tgz"/".tbz2".
+            final_archive_path = shutil.move(final_archive_path, archive_path)
 
         send_done(f"Архів створено: {os.path.basename(final_archive_path)}")
 
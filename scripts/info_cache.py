@@ -0,0 +1,251 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIDEO_TTL = 30 * 60      # посилання на формати (googlevideo) живуть кілька годин, беремо із запасом
+DEFAULT_PLAYLIST_TTL = 10 * 60   # склад плейлиста змінюється частіше
+DEFAULT_MEMORY_ENTRIES = 64
+DEFAULT_DISK_ENTRIES = 500
+
+_YOUTUBE_HOSTS = {
+    "youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com",
+    "youtu.be", "www.youtu.be", "youtube-nocookie.com", "www.youtube-nocookie.com",
+}
+_YOUTUBE_ID_RE = re.compile(r"^[0-9A-Za-z_-]{11}$")
+_YOUTUBE_PATH_PREFIXES = ("/shorts/", "/embed/", "/live/", "/v/")
+_TRACKING_PARAMS = {"si", "feature", "pp", "fbclid", "gclid", "ab_channel"}
+
+
+def _youtube_video_id(parsed, query):
+    if parsed.hostname in ("youtu.be", "www.youtu.be"):
+        candidate = parsed.path.strip("/").split("/")[0]
+    elif parsed.path == "/watch":
+        candidate = query.get("v", "")
+    else:
+        candidate = next((parsed.path[len(prefix):].split("/")[0] for prefix in _YOUTUBE_PATH_PREFIXES
+                          if parsed.path.startswith(prefix)), "")
+    return candidate if _YOUTUBE_ID_RE.match(candidate) else None
+
+
+def normalize_url(url):
+    """Ключ кешу для URL: "youtube:<id>" для окремих відео YouTube, інакше URL без трекінгових параметрів."""
+    url = url.strip()
+    parsed = urlparse(url if "://" in url else "https://" + url)
+    host = (parsed.hostname or "").lower()
+    params = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+              if k not in _TRACKING_PARAMS and not k.startswith("utm_")]
+    if host in _YOUTUBE_HOSTS and "list" not in dict(params):
+        video_id = _youtube_video_id(parsed._replace(netloc=host), dict(params))
+        if video_id:
+            return f"youtube:{video_id}"
+    scheme = "https" if parsed.scheme in ("http", "https") else parsed.scheme.lower()
+    path = parsed.path.rstrip("/") or "/"
+    return "url:" + urlunparse((scheme, host, path, "", urlencode(sorted(params)), ""))
+
+
+def info_key(info):
+    """Ключ кешу за ідентифікатором екстрактора, наприклад "youtube:dQw4w9WgXcQ"."""
+    if not info or not info.get("id") or not info.get("extractor_key"):
+        return None
+    return f"{info['extractor_key'].lower()}:{info['id']}"
+
+
+def is_playlist_info(info):
+    return info.get("_type", "video") in ("playlist", "multi_video")
+
+
+class InfoCache:
+    """Кеш результатів вилучення інформації yt-dlp: LRU у пам'яті плюс JSON-файли на диску.
+
+    Записи доступні за нормалізованим URL і за ідентифікатором відео, мають
+    окремий TTL для відео і плейлистів. Одночасні запити одного URL через
+    `get_or_extract` виконують лише одне вилучення. Повернені словники
+    спільні для всіх викликачів, тож їх не слід змінювати.
+    """
+
+    def __init__(self, cache_dir=None, video_ttl=DEFAULT_VIDEO_TTL, playlist_ttl=DEFAULT_PLAYLIST_TTL,
+                 max_memory_entries=DEFAULT_MEMORY_ENTRIES, max_disk_entries=DEFAULT_DISK_ENTRIES):
+        self.cache_dir = os.path.join(cache_dir, "info") if cache_dir else None
+        self.video_ttl = float(video_ttl)
+        self.playlist_ttl = float(playlist_ttl)
+        self.max_memory_entries = max(1, int(max_memory_entries))
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self._memory = OrderedDict()  # key -> (expires_at, info)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pruned = False
+
+    def get(self, url):
+        return self._lookup(normalize_url(url))
+
+    def put(self, url, info):
+        ttl = self.playlist_ttl if is_playlist_info(info) else self.video_ttl
+        if ttl <= 0:
+            return
+        expires = time.time() + ttl
+        url_key, id_key = normalize_url(url), info_key(info)
+        primary = id_key or url_key
+        keys = {url_key, primary}
+        if info.get("webpage_url"):
+            keys.add(normalize_url(info["webpage_url"]))
+
+        with self._lock:
+            for key in keys:
+                self._memory[key] = (expires, info)
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+        self._write_disk(primary, {"key": primary, "expires": expires, "info": info})
+        for key in keys - {primary}:
+            self._write_disk(key, {"key": key, "expires": expires, "alias": primary})
+
+    def invalidate(self, url):
+        key = normalize_url(url)
+        with self._lock:
+            self._memory.pop(key, None)
+        path = self._disk_path(key)
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # інший процес уже видалив запис
+
+    def get_or_extract(self, url, extract):
+        """Повертає інформацію з кешу або викликає `extract(url)`, об'єднуючи одночасні запити."""
+        key = normalize_url(url)
+        info = self._lookup(key)
+        if info is not None:
+            logger.debug(f"Info cache hit for {key}.")
+            return info
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            logger.debug(f"Waiting for in-flight extraction of {key}.")
+            return future.result()
+
+        try:
+            info = extract(url)
+            if info is not None:
+                self.put(url, info)
+            future.set_result(info)
+            return info
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+        record = self._read_disk(key)
+        if record and "alias" in record:
+            record = self._read_disk(record["alias"])
+        if not record or record.get("expires", 0) <= now:
+            return None
+        with self._lock:
+            self._memory[key] = (record["expires"], record["info"])
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+        return record["info"]
+
+    def _disk_path(self, key):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        if not path:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            return record if record.get("key") == key else None
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug(f"Ignoring unreadable info cache entry {path}: {e}")
+            return None
+
+    def _write_disk(self, key, record):
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if not self._pruned:
+                self._pruned = True
+                self.prune()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Failed to write info cache entry for {key}: {e}")
+
+    def prune(self):
+        """Видаляє з диска прострочені записи і найстаріші понад `max_disk_entries`."""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                # Найдовший TTL - верхня межа віку будь-якого живого запису.
+                if now - mtime > max(self.video_ttl, self.playlist_ttl):
+                    os.remove(entry.path)
+                else:
+                    entries.append((mtime, entry.path))
+            except FileNotFoundError:
+                continue  # інший процес уже видалив запис
+        entries.sort()
+        for _mtime, path in entries[:max(0, len(entries) - self.max_disk_entries)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_info_cache():
+    """Спільний для процесу кеш; TTL беруться з налаштувань (info_cache_video_ttl, info_cache_playlist_ttl)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            from settings_manager import SettingsManager, get_cache_dir
+            settings = SettingsManager()
+            _cache = InfoCache(
+                cache_dir=str(get_cache_dir()),
+                video_ttl=settings.get('info_cache_video_ttl', DEFAULT_VIDEO_TTL),
+                playlist_ttl=settings.get('info_cache_playlist_ttl', DEFAULT_PLAYLIST_TTL),
+            )
+        return _cache
@@ -0,0 +1,234 @@
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MEDIA_PROBE_FILENAME = "media_probe.sqlite3"
+DEFAULT_PROBE_WORKERS = 4
+DEFAULT_MEMORY_ENTRIES = 256
+MAX_DISK_ENTRIES = 20000
+# Файли, для яких має сенс запускати ffprobe (пакетна обробка, перегляд папок).
+MEDIA_FILE_EXTENSIONS = (".mp4", ".m4v", ".mkv", ".webm", ".mov", ".avi", ".flv", ".wmv", ".mpg", ".mpeg", ".ts",
+                         ".mts", ".m2ts", ".3gp", ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac", ".wav", ".wma")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media_probes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    probed_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_probes_probed_at ON media_probes (probed_at);
+"""
+
+
+def is_media_file(path):
+    return path.lower().endswith(MEDIA_FILE_EXTENSIONS)
+
+
+def run_ffprobe(path):
+    """Повний опис файлу (format і streams) одним викликом ffprobe або None."""
+    try:
+        cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path]
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        data = json.loads(result.stdout)
+        if not isinstance(data, dict):
+            raise ValueError(f"unexpected ffprobe output: {result.stdout[:100]!r}")
+        return {"format": data.get("format") or {}, "streams": data.get("streams") or []}
+    except (subprocess.CalledProcessError, ValueError, FileNotFoundError) as e:
+        logger.warning(f"Could not probe {path}: {e}")
+        return None
+
+
+def media_duration(data):
+    try:
+        return float((data or {}).get("format", {}).get("duration") or 0)
+    except ValueError:
+        return 0
+
+
+def media_streams(data):
+    return (data or {}).get("streams") or []
+
+
+def first_stream(data, codec_type):
+    """Перший потік заданого типу; обкладинки (attached_pic) не вважаються відео."""
+    for stream in media_streams(data):
+        if stream.get("codec_type") == codec_type and not (stream.get("disposition") or {}).get("attached_pic"):
+            return stream
+    return None
+
+
+def _frame_rate(stream):
+    try:
+        num, den = (stream.get("avg_frame_rate") or "0/0").split("/")
+        return float(num) / float(den) if float(den) else None
+    except ValueError:
+        return None
+
+
+def summarize(data):
+    """Основні факти про файл для GUI і завдань: тривалість, кодеки, роздільна здатність, бітрейт."""
+    if not data:
+        return {}
+    fmt = data.get("format", {})
+    video, audio = first_stream(data, "video"), first_stream(data, "audio")
+    summary = {"duration": media_duration(data), "container": fmt.get("format_name"),
+               "bit_rate": int(fmt["bit_rate"]) if str(fmt.get("bit_rate", "")).isdigit() else None}
+    if video:
+        summary.update(video_codec=video.get("codec_name"), width=video.get("width"), height=video.get("height"),
+                       fps=_frame_rate(video))
+    if audio:
+        summary.update(audio_codec=audio.get("codec_name"), channels=audio.get("channels"),
+                       sample_rate=int(audio["sample_rate"]) if str(audio.get("sample_rate", "")).isdigit() else None)
+    return summary
+
+
+def format_media_facts(data):
+    """Короткий рядок: "1:02:03 · h264 1920×1080 30fps · aac 2ch · 4.5 Мбіт/с"."""
+    summary = summarize(data)
+    if not summary:
+        return ""
+    parts = []
+    duration = int(summary.get("duration") or 0)
+    if duration:
+        h, m, s = duration // 3600, (duration % 3600) // 60, duration % 60
+        parts.append(f"{h:d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}")
+    if summary.get("video_codec"):
+        video = summary["video_codec"]
+        if summary.get("width") and summary.get("height"):
+            video += f" {summary['width']}×{summary['height']}"
+        if summary.get("fps"):
+            video += f" {summary['fps']:.3g}fps"
+        parts.append(video)
+    if summary.get("audio_codec"):
+        parts.append(summary["audio_codec"] + (f" {summary['channels']}ch" if summary.get("channels") else ""))
+    if summary.get("bit_rate"):
+        parts.append(f"{summary['bit_rate'] / 1_000_000:.1f} Мбіт/с")
+    return " · ".join(parts)
+
+
+class MediaProbe:
+    """Результати ffprobe з кешем на диску (SQLite), спільним для завдань і GUI.
+
+    Ключ запису - шлях до файлу разом із розміром і mtime: змінений файл
+    перевіряється заново. `probe_many` перевіряє файли паралельно у фоновому
+    пулі; закешовані результати повертаються одразу, без запуску ffprobe.
+    """
+
+    def __init__(self, path, workers=DEFAULT_PROBE_WORKERS, max_memory_entries=DEFAULT_MEMORY_ENTRIES):
+        self.path = str(path)
+        self.max_memory_entries = max(1, int(max_memory_entries))
+        self._memory = OrderedDict()  # (path, size, mtime_ns) -> data
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-probe")
+        self._inserts = 0
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _file_key(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+    def cached(self, path):
+        """Закешований опис файлу без запуску ffprobe або None."""
+        try:
+            key = self._file_key(path)
+        except OSError:
+            return None
+        return self._lookup(key)
+
+    def probe(self, path, use_cache=True):
+        """Опис файлу (dict з "format" і "streams") з кешу або від ffprobe; None, якщо файл не медіа."""
+        try:
+            key = self._file_key(path)
+        except OSError:
+            return None
+        if use_cache:
+            data = self._lookup(key)
+            if data is not None:
+                return data
+        data = run_ffprobe(path)
+        if data is not None and use_cache:
+            self._store(key, data)
+        return data
+
+    def probe_many(self, paths, callback):
+        """Викликає `callback(path, data_or_None)` для кожного файлу; для ще не перевірених - з потоку пулу."""
+        for path in paths:
+            data = self.cached(path)
+            if data is not None:
+                callback(path, data)
+            else:
+                self._executor.submit(self._probe_for_callback, path, callback)
+
+    def _probe_for_callback(self, path, callback):
+        data = None
+        try:
+            data = self.probe(path)
+        except Exception as e:
+            logger.warning(f"Media probe of {path} failed: {e}")
+        callback(path, data)
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            row = self._conn.execute("SELECT data FROM media_probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                                     key).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            self._remember(key, data)
+            return data
+
+    def _store(self, key, data):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._remember(key, data)
+            self._conn.execute(
+                "INSERT INTO media_probes (path, size, mtime_ns, probed_at, data) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "probed_at = excluded.probed_at, data = excluded.data",
+                (*key, now, json.dumps(data, separators=(",", ":"))))
+            self._inserts += 1
+            if self._inserts % 500 == 0:
+                self._conn.execute("DELETE FROM media_probes WHERE path NOT IN "
+                                   "(SELECT path FROM media_probes ORDER BY probed_at DESC LIMIT ?)", (MAX_DISK_ENTRIES,))
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._conn.close()
+
+
+_probes = {}
+_probes_lock = threading.Lock()
+
+
+def get_media_probe(path=None):
+    if path is None:
+        from settings_manager import get_cache_dir
+        path = os.path.join(str(get_cache_dir()), MEDIA_PROBE_FILENAME)
+    key = (os.getpid(), str(path))
+    with _probes_lock:
+        if key not in _probes:
+            _probes[key] = MediaProbe(path)
+        return _probes[key]
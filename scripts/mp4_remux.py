@@ -0,0 +1,74 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Кодеки, які MP4 приймає без перекодування (те саме, що yt-dlp вважає сумісним з mp4).
+MP4_VIDEO_CODECS = ("avc1", "h264", "hev1", "hvc1", "h265", "hevc", "av01")
+MP4_AUDIO_CODECS = ("mp4a", "aac", "mp3", "ac-3", "ec-3", "alac")
+# Орієнтовна швидкість libx264 (preset medium) відносно реального часу за висотою кадру.
+_ENCODE_SPEED_BY_HEIGHT = ((480, 4.0), (720, 2.0), (1080, 1.0), (1440, 0.45), (2160, 0.2))
+
+ACTION_NONE, ACTION_REMUX, ACTION_TRANSCODE = "none", "remux", "transcode"
+
+
+def mp4_format_sort(prefer_h264=True):
+    """Поля format_sort, з якими yt-dlp обирає пару потоків, що зливається в MP4 без перекодування."""
+    return (["vcodec:h264"] if prefer_h264 else []) + ["acodec:aac", "ext:mp4:m4a"]
+
+
+def _codec_ok(codec, allowed):
+    return codec in (None, "none") or codec.lower().startswith(allowed)
+
+
+def plan_mp4(info):
+    """Повертає (дія, пояснення) для приведення завантаженого файлу до MP4."""
+    vcodec, acodec, ext = info.get("vcodec"), info.get("acodec"), (info.get("ext") or "").lower()
+    video_ok, audio_ok = _codec_ok(vcodec, MP4_VIDEO_CODECS), _codec_ok(acodec, MP4_AUDIO_CODECS)
+    codecs = f"{vcodec or '?'}+{acodec or '?'}"
+    if video_ok and audio_ok:
+        if ext == "mp4":
+            return ACTION_NONE, f"вже MP4 ({codecs})"
+        return ACTION_REMUX, f"потоки {codecs} сумісні з MP4, лише перепакування {ext} -> mp4"
+    incompatible = [c for c, ok in ((vcodec, video_ok), (acodec, audio_ok)) if not ok]
+    return ACTION_TRANSCODE, f"{', '.join(incompatible)} не підтримується в MP4, потрібне перекодування"
+
+
+def estimate_transcode_seconds(info):
+    """Груба оцінка часу перекодування в H.264 або None, якщо тривалість невідома."""
+    duration = info.get("duration")
+    if not duration:
+        return None
+    height = info.get("height") or 1080
+    speed = next((speed for max_height, speed in _ENCODE_SPEED_BY_HEIGHT if height <= max_height),
+                 _ENCODE_SPEED_BY_HEIGHT[-1][1])
+    if info.get("vcodec") in (None, "none"):
+        speed = 50.0  # лише аудіо
+    return duration / speed
+
+
+def mp4_postprocessor(downloader, reporter=None):
+    """Постпроцесор yt-dlp для режиму force_mp4: нічого, перепакування або перекодування.
+
+    Рішення і оцінка часу перекодування пишуться в журнал завдання до початку роботи ffmpeg.
+    """
+    from yt_dlp.postprocessor import FFmpegVideoConvertorPP, FFmpegVideoRemuxerPP
+    from yt_dlp.postprocessor.common import PostProcessor
+    from scripts.progress_reporter import format_eta
+
+    class Mp4CompatPP(PostProcessor):
+        def run(self, info):
+            action, reason = plan_mp4(info)
+            title = info.get("title") or info.get("filepath")
+            if action == ACTION_TRANSCODE:
+                estimate = estimate_transcode_seconds(info)
+                reason += f" (орієнтовно {format_eta(estimate)})" if estimate else ""
+            message = f"MP4 для '{title}': {reason}."
+            logger.info(message)
+            if reporter:
+                reporter.status(message, force=True)
+            if action == ACTION_NONE:
+                return [], info
+            pp_class = FFmpegVideoRemuxerPP if action == ACTION_REMUX else FFmpegVideoConvertorPP
+            return pp_class(self._downloader, preferedformat="mp4").run(info)
+
+    return Mp4CompatPP(downloader)
@@ -0,0 +1,71 @@
+PAGE_SIZE = 100
+# Поля заголовка плейлиста, потрібні GUI; записи зберігаються окремо як PlaylistEntry.
+_HEADER_FIELDS = ("_type", "id", "title", "uploader", "channel", "playlist_count", "webpage_url", "extractor_key")
+_UNAVAILABLE_TITLES = ("[Private video]", "[Deleted video]", "[Unavailable video]")
+
+
+class PlaylistEntry:
+    """Компактний запис плейлиста замість повного словника yt-dlp."""
+
+    __slots__ = ("index", "id", "title", "duration", "availability")
+
+    def __init__(self, index, id, title, duration=None, availability=None):
+        self.index = index
+        self.id = id
+        self.title = title
+        self.duration = duration
+        self.availability = availability
+
+    @classmethod
+    def from_info(cls, index, entry):
+        title = entry.get("title") or entry.get("id") or ""
+        availability = entry.get("availability") or ("unavailable" if title in _UNAVAILABLE_TITLES else None)
+        if entry.get("live_status") in ("is_live", "is_upcoming"):
+            availability = entry["live_status"]
+        duration = entry.get("duration")
+        return cls(index, entry.get("id"), title, int(duration) if duration else None, availability)
+
+    def __repr__(self):
+        return f"PlaylistEntry({self.index}, {self.id!r}, {self.title!r})"
+
+
+def compact_playlist_info(info):
+    """Заголовок плейлиста без записів."""
+    return {key: info[key] for key in _HEADER_FIELDS if info.get(key) is not None}
+
+
+def resolve_lazy_playlist(ydl, url):
+    """extract_info з process=False, з переходом за посиланнями типу 'url'.
+
+    `ydl` має бути створений з extract_flat='in_playlist': тоді записи
+    плейлиста - генератор, і наступна сторінка завантажується лише тоді,
+    коли до неї доходить ітерація.
+    """
+    info = ydl.extract_info(url, download=False, process=False)
+    while info and info.get('_type') in ('url', 'url_transparent'):
+        info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key'))
+    return info
+
+
+def iter_entry_pages(info, page_size=PAGE_SIZE):
+    """Ітерує записи плейлиста сторінками [PlaylistEntry], не зберігаючи словники yt-dlp."""
+    page = []
+    for index, entry in enumerate(info.get("entries") or [], 1):
+        if entry:
+            page.append(PlaylistEntry.from_info(index, entry))
+        if len(page) >= page_size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def format_playlist_items(indices):
+    """Номери записів у формат playlist_items yt-dlp: [1, 2, 3, 7] -> "1-3,7"."""
+    ranges = []
+    for index in sorted(set(indices)):
+        if ranges and index == ranges[-1][1] + 1:
+            ranges[-1][1] = index
+        else:
+            ranges.append([index, index])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
@@ -0,0 +1,174 @@
+import datetime
+import logging
+import os
+import re
+import sqlite3
+import threading
+from urllib.parse import urlparse, parse_qs
+
+from scripts.info_cache import normalize_url
+from scripts.playlist_entries import resolve_lazy_playlist
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_FILENAME = "playlist_sync.sqlite3"
+# Кілька відомих записів поспіль, а не один: закріплене чи перевпорядковане
+# відео не зупиняє перегляд передчасно.
+STOP_AFTER_KNOWN = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_playlists (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    newest_id TEXT,
+    last_sync TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_entries (
+    playlist_key TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    title TEXT,
+    first_seen TEXT,
+    PRIMARY KEY (playlist_key, video_id)
+);
+"""
+
+_CHANNEL_PATH_RE = re.compile(r"^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)/?$")
+_CHANNEL_TAB_RE = re.compile(r"^/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)/(videos|shorts|streams)/?$")
+
+
+def sync_url(url):
+    """URL для синхронізації: для каналу YouTube без вкладки - вкладка "Відео" (новіші спершу)."""
+    parsed = urlparse(url if "://" in url else "https://" + url)
+    if (parsed.hostname or "").endswith("youtube.com") and _CHANNEL_PATH_RE.match(parsed.path):
+        return parsed._replace(path=parsed.path.rstrip("/") + "/videos").geturl()
+    return url
+
+
+def is_newest_first(url):
+    """Чи впорядкований список від нових до старих (вкладки каналу, плейлист завантажень UU...)."""
+    parsed = urlparse(url if "://" in url else "https://" + url)
+    if not (parsed.hostname or "").endswith("youtube.com"):
+        return False
+    if _CHANNEL_TAB_RE.match(parsed.path):
+        return True
+    return parse_qs(parsed.query).get("list", [""])[0].startswith("UU")
+
+
+class SyncPlan:
+    """Результат перегляду плейлиста: нові записи для завантаження і вже відомі."""
+
+    def __init__(self, key, url, title):
+        self.key = key
+        self.url = url
+        self.title = title
+        self.delta = []  # (позиція, url, назва, id, extractor) у порядку плейлиста
+        self.archived = []  # (id, назва): нові для стану, але вже є в архіві завантажень
+        self.newest_id = None  # перший запис списку
+        self.scanned = 0
+        self.stopped_early = False
+
+
+class SyncState:
+    """Стан синхронізації плейлистів у SQLite: відомі записи кожного плейлиста."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def known_ids(self, key):
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT video_id FROM sync_entries WHERE playlist_key = ?", (key,))}
+
+    def get(self, key):
+        with self._lock:
+            cursor = self._conn.execute("SELECT * FROM sync_playlists WHERE key = ?", (key,))
+            row = cursor.fetchone()
+            return dict(zip([col[0] for col in cursor.description], row)) if row else None
+
+    def commit(self, plan, entries):
+        """Позначає `entries` [(id, назва)] відомими і оновлює дату синхронізації плейлиста."""
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR IGNORE INTO sync_entries (playlist_key, video_id, title, first_seen) VALUES (?, ?, ?, ?)",
+                                   [(plan.key, video_id, title, now) for video_id, title in entries])
+            self._conn.execute(
+                "INSERT INTO sync_playlists (key, url, title, newest_id, last_sync) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET url = excluded.url, title = excluded.title, "
+                "newest_id = COALESCE(excluded.newest_id, newest_id), last_sync = excluded.last_sync",
+                (plan.key, plan.url, plan.title, plan.newest_id, now))
+            self._conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def plan_sync(ydl, url, state, archive=None, stop_after_known=STOP_AFTER_KNOWN):
+    """Переглядає плейлист, поки не зустріне відомі записи, і повертає SyncPlan.
+
+    Записи читаються ліниво (див. resolve_lazy_playlist). Для списків "від нових до старих" перегляд
+    зупиняється на `stop_after_known` відомих записах поспіль; інші плейлисти
+    переглядаються повністю, але завантажуються лише нові записи.
+    """
+    url = sync_url(url)
+    key = normalize_url(url)
+    known = state.known_ids(key)
+    newest_first = is_newest_first(url)
+    info = resolve_lazy_playlist(ydl, url)
+    if not info:
+        raise ValueError(f"Не вдалося отримати плейлист {url}")
+
+    plan = SyncPlan(key, url, info.get('title') or url)
+    streak = 0
+    for position, entry in enumerate(info.get('entries') or [], 1):
+        plan.scanned = position
+        if not entry or not entry.get('id'):
+            continue
+        plan.newest_id = plan.newest_id or entry['id']
+        if entry['id'] in known:
+            streak += 1
+            if newest_first and streak >= stop_after_known:
+                plan.stopped_early = True
+                break
+            continue
+        streak = 0
+        title = entry.get('title') or entry['id']
+        extractor = (entry.get('ie_key') or info.get('extractor_key') or '').lower()
+        if archive is not None and archive.has(extractor, entry['id']):
+            plan.archived.append((entry['id'], title))
+            continue
+        entry_url = entry.get('url') or entry.get('webpage_url')
+        if entry_url:
+            plan.delta.append((position, entry_url, title, entry['id'], extractor))
+    logger.info(f"Синхронізація {key}: переглянуто {plan.scanned}, нових {len(plan.delta)}, в архіві {len(plan.archived)}"
+                + (", зупинено на відомих записах." if plan.stopped_early else "."))
+    return plan
+
+
+_states = {}
+_states_lock = threading.Lock()
+
+
+def get_sync_state(path=None):
+    if path is None:
+        from settings_manager import get_config_dir
+        path = os.path.join(str(get_config_dir()), SYNC_STATE_FILENAME)
+    key = (os.getpid(), str(path))
+    with _states_lock:
+        if key not in _states:
+            _states[key] = SyncState(path)
+        return _states[key]
+
+
+def subscription_jobs(settings):
+    """Завдання синхронізації для підписок з налаштувань (`sync_subscriptions`: список dict з url, output_dir, ...)."""
+    jobs = []
+    for subscription in settings.get('sync_subscriptions') or []:
+        if subscription.get('url') and subscription.get('output_dir'):
+            jobs.append({'download_mode': 'default', **subscription, 'sync': True})
+    return jobs
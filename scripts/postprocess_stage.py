@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.progress_reporter import STAGE_POSTPROCESS
+
+logger = logging.getLogger(__name__)
+
+
+def default_postprocess_workers():
+    # Кожен постпроцесор - окремий процес ffmpeg; половина ядер лишає запас для завантажень і GUI.
+    return max(1, (os.cpu_count() or 2) // 2)
+
+
+class PostprocessStage:
+    """Другий етап конвеєра yt-dlp: важкі постпроцесори виконуються у власному пулі.
+
+    `attach(ydl)` додає постпроцесор after_move, який лише ставить готовий файл
+    у чергу і одразу повертає керування, тож yt-dlp починає завантажувати
+    наступний запис, поки ffmpeg обробляє попередній. Постпроцесори задаються
+    так само, як `postprocessors` у параметрах YoutubeDL ({'key': ..., ...}); замість
+    назви в 'key' можна передати фабрику `factory(downloader, **args)`. Вони
+    виконуються по черзі для кожного файлу; кожен потік пулу має власний YoutubeDL
+    етапу, бо YoutubeDL не розрахований на одночасні виклики з кількох потоків.
+    """
+
+    def __init__(self, yt_dlp, ydl_params, pp_specs, workers=None, reporter=None, on_finished=None):
+        self.yt_dlp = yt_dlp
+        self.pp_specs = [dict(spec) for spec in pp_specs]
+        self.reporter = reporter
+        self.on_finished = on_finished
+        self.failures = []  # (title, error)
+        self.processed = 0
+        self._params = {key: value for key, value in ydl_params.items() if key not in ('progress_hooks', 'postprocessors')}
+        self._local = threading.local()
+        self._ydls = []
+        self._executor = ThreadPoolExecutor(max_workers=workers or default_postprocess_workers(), thread_name_prefix="ytdlp-pp")
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def attach(self, ydl):
+        from yt_dlp.postprocessor.common import PostProcessor
+        stage = self
+
+        class DeferredPostprocessPP(PostProcessor):
+            def run(self, info):
+                stage.submit(info)
+                return [], info
+
+        ydl.add_post_processor(DeferredPostprocessPP(ydl), when='after_move')
+        return ydl
+
+    def submit(self, info):
+        future = self._executor.submit(self._process, dict(info))
+        with self._lock:
+            self._futures.append(future)
+
+    @property
+    def pending(self):
+        with self._lock:
+            return sum(1 for future in self._futures if not future.done())
+
+    def _thread_ydl(self):
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self._local.ydl = self.yt_dlp.YoutubeDL(self._params)
+            with self._lock:
+                self._ydls.append(ydl)
+        return ydl
+
+    def _process(self, info):
+        title = info.get('title') or os.path.basename(info.get('filepath') or '')
+        if self.reporter:
+            self.reporter.status(f"Обробка: {title}", force=True)
+        try:
+            ydl = self._thread_ydl()
+            for spec in self.pp_specs:
+                args = dict(spec)
+                key = args.pop('key')
+                factory = key if callable(key) else self.yt_dlp.postprocessor.get_postprocessor(key)
+                pp = factory(ydl, **args)
+                info = ydl.run_pp(pp, info)
+            if self.on_finished:
+                self.on_finished(info)
+            with self._lock:
+                self.processed += 1
+        except Exception as e:
+            logger.warning(f"Постобробка '{title}' не вдалася: {e}")
+            with self._lock:
+                self.failures.append((title, f"{type(e).__name__}: {str(e).replace('ERROR: ', '')}"))
+
+    def wait(self):
+        """Чекає на обробку всіх поставлених у чергу файлів. Повертає список помилок."""
+        with self._lock:
+            futures = list(self._futures)
+        if self.reporter and any(not future.done() for future in futures):
+            self.reporter.status(f"Очікування постобробки ({sum(1 for f in futures if not f.done())} файлів)...",
+                                 force=True)
+        for future in futures:
+            future.result()
+        if self.reporter and futures:
+            self.reporter.progress(1.0, stage=STAGE_POSTPROCESS, items_done=self.processed, items_total=len(futures))
+        return list(self.failures)
+
+    def close(self, wait=True):
+        """Завершує етап. З wait=False файли в черзі відкидаються, але вже запущені
+        постпроцесори доробляються: закрити YoutubeDL під працюючим ffmpeg не можна."""
+        if wait:
+            self.wait()
+        self._executor.shutdown(wait=True, cancel_futures=not wait)
+        with self._lock:
+            ydls, self._ydls = self._ydls, []
+        for ydl in ydls:
+            ydl.close()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+DEFAULT_MIN_INTERVAL = 0.25
+
+STAGE_DOWNLOAD = "download"
+STAGE_POSTPROCESS = "postprocess"
+STAGE_ENCODE = "encode"
+STAGE_MIRROR = "mirror"
+STAGE_ARCHIVE = "archive"
+
+
+class ProgressReporter:
+    """Надсилає події завдання у канал (`put`) і обмежує їх частоту на стороні джерела.
+
+    Події - це компактні словники з ключем "type" ("status", "progress", "done",
+    "cancelled", "error"). Проміжні "status"/"progress" не частіше ніж раз на `min_interval`
+    секунд для кожного типу; придушена подія не губиться, а замінюється новішою
+    і надсилається при наступній нагоді або під час `flush()`. Методи можна
+    викликати з кількох потоків одного завдання.
+    """
+
+    def __init__(self, comm_queue, min_interval=DEFAULT_MIN_INTERVAL):
+        self.comm_queue = comm_queue
+        self.min_interval = float(min_interval if min_interval is not None else DEFAULT_MIN_INTERVAL)
+        self._last_emit = {}
+        self._pending = {}
+        self._lock = threading.RLock()
+
+    def status(self, message, force=False):
+        self._emit({"type": "status", "value": str(message)}, force)
+
+    def progress(self, fraction=None, stage=None, bytes_done=None, bytes_total=None, speed=None, eta=None,
+                 items_done=None, items_total=None, force=False, **extra):
+        event = {"type": "progress", "value": None if fraction is None else max(0.0, min(1.0, float(fraction)))}
+        fields = {"stage": stage, "bytes_done": bytes_done, "bytes_total": bytes_total, "speed": speed, "eta": eta,
+                  "items_done": items_done, "items_total": items_total, **extra}
+        event.update({key: value for key, value in fields.items() if value is not None})
+        self._emit(event, force or fraction == 1.0)
+
+    def done(self, message):
+        self._finish({"type": "done", "value": str(message)})
+
+    def cancelled(self, message):
+        self._finish({"type": "cancelled", "value": str(message)})
+
+    def error(self, message, details=""):
+        event = {"type": "error", "value": str(message)}
+        if details:
+            event["details"] = str(details)
+        self._finish(event)
+
+    def flush(self):
+        with self._lock:
+            for event_type in list(self._pending):
+                self._send(self._pending.pop(event_type))
+
+    def _finish(self, event):
+        with self._lock:
+            self.flush()
+            self.comm_queue.put(event)
+
+    def _emit(self, event, force):
+        with self._lock:
+            self._emit_locked(event, force)
+
+    def _emit_locked(self, event, force):
+        now = time.monotonic()
+        event_type = event["type"]
+        if force or now - self._last_emit.get(event_type, 0.0) >= self.min_interval:
+            self._pending.pop(event_type, None)
+            self._send(event, now)
+        else:
+            self._pending[event_type] = event
+
+        for pending_type, pending_event in list(self._pending.items()):
+            if now - self._last_emit.get(pending_type, 0.0) >= self.min_interval:
+                del self._pending[pending_type]
+                self._send(pending_event, now)
+
+    def _send(self, event, now=None):
+        self._last_emit[event["type"]] = now if now is not None else time.monotonic()
+        self.comm_queue.put(event)
+
+
+def format_rate(bytes_per_sec):
+    if not bytes_per_sec:
+        return ""
+    for unit in ("B/s", "KiB/s", "MiB/s", "GiB/s"):
+        if bytes_per_sec < 1024 or unit == "GiB/s":
+            return f"{bytes_per_sec:.1f} {unit}"
+        bytes_per_sec /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    h, m, s = seconds // 3600, (seconds % 3600) // 60, seconds % 60
+    return f"{h:d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+
+def describe_progress(event):
+    """Короткий текст для рядка стану з полів події "progress"."""
+    parts = []
+    if event.get("items_total"):
+        parts.append(f"{event.get('items_done', 0)}/{event['items_total']}")
+    if event.get("speed"):
+        speed = event["speed"]
+        parts.append(f"{speed:.2f}x" if event.get("stage") == STAGE_ENCODE else format_rate(speed))
+    if event.get("eta") is not None:
+        parts.append(f"ETA {format_eta(event['eta'])}")
+    if event.get("fragments"):
+        parts.append(f"{event['fragments']} фрагм.")
+    return " · ".join(parts)
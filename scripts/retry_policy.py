@@ -0,0 +1,50 @@
+import random
+import re
+
+# Класи помилок завантаження. Тимчасові повторюються автоматично, решта - лише на вимогу:
+# невідома помилка найчастіше постійна, і автоматичний повтор лише відкладає звіт про неї.
+ERROR_RATE_LIMITED = "rate_limited"
+ERROR_NETWORK = "network"
+ERROR_UNAVAILABLE = "unavailable"
+ERROR_GEO = "geo_blocked"
+ERROR_AUTH = "auth_required"
+ERROR_POSTPROCESS = "postprocess"
+ERROR_OTHER = "other"
+
+RETRYABLE_ERRORS = {ERROR_RATE_LIMITED, ERROR_NETWORK}
+
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_DELAY = 10.0
+MAX_RETRY_DELAY = 600.0
+
+# Порядок важливий: перше збігання визначає клас.
+_ERROR_PATTERNS = (
+    (ERROR_RATE_LIMITED, re.compile(r"HTTP Error 429|Too Many Requests|rate.?limit", re.IGNORECASE)),
+    (ERROR_GEO, re.compile(r"not available (in|from) your (country|location)|geo.?restrict", re.IGNORECASE)),
+    (ERROR_AUTH, re.compile(r"Sign in to confirm|members.only|login required|age.restricted|cookies", re.IGNORECASE)),
+    (ERROR_UNAVAILABLE, re.compile(r"Video unavailable|Private video|has been removed|copyright|"
+                                   r"This video is not available|HTTP Error 404|does not exist", re.IGNORECASE)),
+    (ERROR_POSTPROCESS, re.compile(r"Postprocessing|ffmpeg|ffprobe", re.IGNORECASE)),
+    (ERROR_NETWORK, re.compile(r"timed? ?out|Connection (reset|refused|aborted)|Temporary failure|"
+                               r"HTTP Error 5\d\d|IncompleteRead|Unable to download|Got error|"
+                               r"Name or service not known|Network is unreachable|SSL", re.IGNORECASE)),
+)
+
+
+def classify_error(message):
+    """Клас помилки yt-dlp за текстом повідомлення."""
+    for error_class, pattern in _ERROR_PATTERNS:
+        if pattern.search(message or ""):
+            return error_class
+    return ERROR_OTHER
+
+
+def is_retryable(error_class):
+    return error_class in RETRYABLE_ERRORS
+
+
+def backoff_delay(attempt, base=DEFAULT_RETRY_BASE_DELAY, cap=MAX_RETRY_DELAY):
+    """Затримка перед спробою `attempt` (з нуля): експоненційна, з випадковим розкидом ±50%,
+    щоб повтори кількох завдань не приходили на сервер одночасно."""
+    delay = min(cap, base * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
@@ -0,0 +1,175 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTROL_CANCEL = "cancel"    # перервати якнайшвидше
+CONTROL_STOP = "stop"        # акуратно зупинитися після поточного фрагмента/файлу
+CONTROL_PAUSE = "pause"
+CONTROL_RESUME = "resume"
+CONTROL_COMMANDS = (CONTROL_CANCEL, CONTROL_STOP, CONTROL_PAUSE, CONTROL_RESUME)
+
+
+class TaskControl:
+    """Стан керування завданням усередині процесу завдання.
+
+    Команди надходять з GUI/CLI через `apply()`; завдання перевіряє
+    `cancelled`/`stop_requested`/`paused` або підписується через `add_listener`.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.stop_requested = False
+        self._running = threading.Event()
+        self._running.set()
+        self._stopping = threading.Event()
+        self._listeners = []
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    @property
+    def should_stop(self):
+        return self.cancelled or self.stop_requested
+
+    def apply(self, command):
+        if command == CONTROL_CANCEL:
+            self.cancelled = True
+            self._running.set()
+            self._stopping.set()
+        elif command == CONTROL_STOP:
+            self.stop_requested = True
+            self._running.set()
+            self._stopping.set()
+        elif command == CONTROL_PAUSE:
+            self._running.clear()
+        elif command == CONTROL_RESUME:
+            self._running.set()
+        else:
+            logger.warning(f"Unknown task control command: {command!r}")
+            return
+        for listener in list(self._listeners):
+            try:
+                listener(command)
+            except Exception as e:
+                logger.error(f"Task control listener failed on '{command}': {e}")
+
+    def wait_while_paused(self, timeout=None):
+        return self._running.wait(timeout)
+
+    def sleep(self, seconds):
+        """Чекає `seconds`, але повертається одразу після скасування чи зупинки. True - якщо дочекалися."""
+        return not self._stopping.wait(seconds)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+
+def get_task_control(comm_queue):
+    """Повертає TaskControl каналу або порожній (для каналів без керування)."""
+    control = getattr(comm_queue, "control", None)
+    return control if isinstance(control, TaskControl) else TaskControl()
+
+
+def control_subprocess(control, process):
+    """Прив'язує керування завданням до зовнішнього процесу (ffmpeg, httrack).
+
+    Пауза/продовження - SIGSTOP/SIGCONT, скасування і зупинка - terminate().
+    Повертає функцію, яка від'єднує слухача.
+    """
+    def on_command(command):
+        if process.poll() is not None:
+            return
+        if command == CONTROL_PAUSE and hasattr(signal, "SIGSTOP"):
+            os.kill(process.pid, signal.SIGSTOP)
+        elif command == CONTROL_RESUME and hasattr(signal, "SIGCONT"):
+            os.kill(process.pid, signal.SIGCONT)
+        elif command in (CONTROL_CANCEL, CONTROL_STOP):
+            if hasattr(signal, "SIGCONT"):
+                os.kill(process.pid, signal.SIGCONT)
+            process.terminate()
+
+    control.add_listener(on_command)
+    if control.should_stop:
+        on_command(CONTROL_CANCEL)
+    elif control.paused:
+        on_command(CONTROL_PAUSE)
+    return lambda: control.remove_listener(on_command)
+
+
+class TaskChannel:
+    """Канал між GUI і процесом завдання на основі окремих pipe.
+
+    Має метод `put`, як і multiprocessing.Queue, тож функції завдань працюють
+    з ним без змін. Читаючий кінець має `fileno()`, тому GUI може стежити за
+    ним через GLib замість періодичного опитування. Зворотний pipe передає
+    команди керування (`send_control`), які в процесі завдання доступні як
+    `channel.control`.
+    """
+
+    def __init__(self):
+        self._reader, self._writer = multiprocessing.Pipe(duplex=False)
+        self._control_reader, self._control_writer = multiprocessing.Pipe(duplex=False)
+        self._control = None
+        self.eof = False
+
+    def put(self, message):
+        self._writer.send(message)
+
+    def fileno(self):
+        return self._reader.fileno()
+
+    def close_child_ends(self):
+        """Закриває в батьківському процесі кінці, що належать процесу завдання, щоб
+        завершення дочірнього процесу давало EOF на читаючому кінці."""
+        self._writer.close()
+        self._control_reader.close()
+
+    def send_control(self, command):
+        try:
+            self._control_writer.send(command)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    @property
+    def control(self):
+        # Створюється ліниво вже в процесі завдання, разом з потоком читання команд.
+        if self._control is None:
+            self._control = TaskControl()
+            threading.Thread(target=self._read_control, daemon=True).start()
+        return self._control
+
+    def _read_control(self):
+        while True:
+            try:
+                command = self._control_reader.recv()
+            except (EOFError, OSError):
+                return
+            self._control.apply(command)
+
+    def drain(self):
+        messages = []
+        if self.eof:
+            return messages
+        try:
+            while self._reader.poll():
+                messages.append(self._reader.recv())
+        except (EOFError, OSError):
+            self.eof = True
+        return messages
+
+    def close(self):
+        self.eof = True
+        self._reader.close()
+        for conn in (self._writer, self._control_reader, self._control_writer):
+            if not conn.closed:
+                conn.close()
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+# Запуск не вдався: завдання вже прибрано з планувальника, причина - у task.error.
+STATE_FAILED = "failed"
+
+_CPU_COUNT = os.cpu_count() or 2
+
+# Ліміти одночасних слотів за ім'ям функції завдання. FFmpeg сам використовує
+# кілька потоків, тому половина ядер дає кращу сумарну пропускну здатність,
+# ніж по процесу на кожне ядро.
+DEFAULT_SLOT_LIMITS = {
+    "run_ffmpeg_task": max(1, _CPU_COUNT // 2),
+    # Пакет і кодування частинами самі розподіляють ядра між своїми процесами ffmpeg.
+    "run_ffmpeg_batch": 1,
+    "run_ffmpeg_segmented": 1,
+    "download_youtube_media": 3,
+    "run_httrack_web_threaded": 2,
+    "archive_directory_threaded": 1,
+}
+DEFAULT_SLOT_LIMIT = 2
+
+
+class ScheduledTask:
+    def __init__(self, task_id, func, name, args=(), kwargs=None, priority=0, seq=0):
+        self.task_id = task_id
+        self.func = func
+        self.name = name
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        self.priority = priority
+        self.seq = seq
+        self.state = STATE_QUEUED
+        self.error = None
+
+    @property
+    def group(self):
+        return getattr(self.func, "__name__", str(self.func))
+
+    def sort_key(self):
+        # Вищий пріоритет іде першим, у межах пріоритету - FIFO.
+        return (-self.priority, self.seq)
+
+
+class TaskScheduler:
+    """Черга завдань з обмеженням одночасних слотів для кожної функції завдання.
+
+    `launcher(task)` викликається, коли для завдання звільнився слот; він має
+    повернути True, якщо завдання справді запущено. Після завершення завдання
+    власник планувальника викликає `task_finished(task_id)`. Якщо launcher
+    кинув виняток або повернув False, завдання прибирається, а `on_state_changed`
+    отримує його зі станом STATE_FAILED.
+    """
+
+    def __init__(self, launcher, limits=None, default_limit=DEFAULT_SLOT_LIMIT, on_state_changed=None):
+        self._launcher = launcher
+        self._on_state_changed = on_state_changed
+        self._limits = dict(DEFAULT_SLOT_LIMITS)
+        if limits:
+            self._limits.update({k: int(v) for k, v in limits.items()})
+        self._default_limit = default_limit
+        self._pending = {}  # group -> heap[(sort_key, task)]
+        self._running = {}  # group -> {task_id: task}
+        self._tasks = {}
+        self._counter = itertools.count()
+
+    def limit_for(self, group):
+        return max(1, self._limits.get(group, self._default_limit))
+
+    def set_limit(self, group, limit):
+        self._limits[group] = int(limit)
+        self._dispatch()
+
+    def submit(self, task_id, func, name, args=(), kwargs=None, priority=0):
+        task = ScheduledTask(task_id, func, name, args, kwargs, priority, next(self._counter))
+        self._tasks[task_id] = task
+        heapq.heappush(self._pending.setdefault(task.group, []), (task.sort_key(), task_id, task))
+        logger.debug(f"Task {task_id} ('{name}') queued in group '{task.group}' with priority {priority}.")
+        self._dispatch()
+        return task
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def cancel(self, task_id):
+        """Прибирає завдання з черги. Повертає False, якщо воно вже виконується."""
+        task = self._tasks.get(task_id)
+        if not task or task.state != STATE_QUEUED:
+            return False
+        heap = self._pending.get(task.group, [])
+        heap[:] = [item for item in heap if item[1] != task_id]
+        heapq.heapify(heap)
+        del self._tasks[task_id]
+        return True
+
+    def task_finished(self, task_id):
+        task = self._tasks.get(task_id)
+        if not task:
+            return
+        if task.state == STATE_RUNNING:
+            self._running.get(task.group, {}).pop(task_id, None)
+            del self._tasks[task_id]
+        else:
+            self.cancel(task_id)
+        self._dispatch()
+
+    def clear_pending(self):
+        for heap in self._pending.values():
+            for _key, task_id, _task in heap:
+                self._tasks.pop(task_id, None)
+        self._pending.clear()
+
+    def running_count(self, group=None):
+        if group is not None:
+            return len(self._running.get(group, {}))
+        return sum(len(tasks) for tasks in self._running.values())
+
+    def pending_count(self, group=None):
+        if group is not None:
+            return len(self._pending.get(group, []))
+        return sum(len(heap) for heap in self._pending.values())
+
+    def _dispatch(self):
+        while True:
+            candidates = [
+                (heap[0][0], group) for group, heap in self._pending.items()
+                if heap and len(self._running.get(group, {})) < self.limit_for(group)
+            ]
+            if not candidates:
+                return
+            _key, group = min(candidates)
+            _key, task_id, task = heapq.heappop(self._pending[group])
+            task.state = STATE_RUNNING
+            self._running.setdefault(group, {})[task_id] = task
+
+            try:
+                started = self._launcher(task)
+                if not started:
+                    task.error = "Не вдалося запустити завдання."
+            except Exception as e:
+                logger.exception(f"Failed to launch task {task_id} ('{task.name}'): {e}")
+                started = False
+                task.error = f"Не вдалося запустити завдання: {e}"
+
+            if not started:
+                task.state = STATE_FAILED
+                self._running[group].pop(task_id, None)
+                self._tasks.pop(task_id, None)
+            if self._on_state_changed:
+                self._on_state_changed(task)
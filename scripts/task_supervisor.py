@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KILL_GRACE = 5.0
+
+MSG_USAGE = "usage"
+TERMINAL_MESSAGES = ("done", "error", "cancelled")
+
+_HAS_PROCESS_GROUPS = hasattr(os, "setpgrp") and hasattr(os, "killpg")
+
+
+def enter_own_process_group():
+    """Робить поточний процес лідером нової групи процесів.
+
+    ffmpeg, httrack та інші дочірні процеси успадковують групу, тож
+    `signal_process_group` зачіпає все дерево завдання.
+    """
+    if _HAS_PROCESS_GROUPS:
+        try:
+            os.setpgrp()
+        except OSError as e:
+            logger.warning(f"Failed to create process group: {e}")
+
+
+def signal_process_group(pid, sig):
+    """Надсилає сигнал усій групі процесів `pid`. Повертає False, якщо групи вже немає."""
+    try:
+        if _HAS_PROCESS_GROUPS:
+            os.killpg(pid, sig)
+        else:
+            os.kill(pid, sig)
+        return True
+    except (ProcessLookupError, PermissionError):
+        return False
+
+
+def collect_usage():
+    """CPU-час і пікова RSS поточного процесу разом із дочірніми, які вже завершилися."""
+    try:
+        import resource
+    except ImportError:
+        return {}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "cpu_user": round(own.ru_utime + children.ru_utime, 2),
+        "cpu_system": round(own.ru_stime + children.ru_stime, 2),
+        # ru_maxrss у Linux - у КБ; для дочірніх - максимум серед них, а не сума.
+        "peak_rss_mb": round(max(own.ru_maxrss, children.ru_maxrss) / 1024, 1),
+    }
+
+
+def format_usage(usage):
+    if not usage:
+        return ""
+    cpu = usage.get("cpu_user", 0) + usage.get("cpu_system", 0)
+    return f"CPU {cpu:.1f}s, RSS {usage.get('peak_rss_mb', 0):.0f} MiB"
+
+
+class _UsageChannel:
+    """Обгортка каналу в процесі завдання: додає "usage" до завершальної події."""
+
+    def __init__(self, channel):
+        self._channel = channel
+        self.finished = False
+
+    @property
+    def control(self):
+        return getattr(self._channel, "control", None)
+
+    def put(self, message):
+        if message.get("type") in TERMINAL_MESSAGES and not self.finished:
+            self.finished = True
+            message = {**message, "usage": collect_usage()}
+        self._channel.put(message)
+
+
+def _raise_exit(signum, frame):
+    raise SystemExit(128 + signum)
+
+
+def _supervised_main(target, args):
+    enter_own_process_group()
+    signal.signal(signal.SIGTERM, _raise_exit)
+    *args, channel = args
+    channel = _UsageChannel(channel)
+    try:
+        target(*args, channel)
+    finally:
+        if not channel.finished:
+            _reap_children()
+            try:
+                channel._channel.put({"type": MSG_USAGE, "usage": collect_usage()})
+            except (OSError, ValueError):
+                pass
+
+
+def _reap_children(timeout=1.0):
+    # Після SIGTERM дочірні процеси ще могли не бути зібрані, і їхній CPU-час не потрапить у RUSAGE_CHILDREN.
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            time.sleep(0.05)
+
+
+class TaskSupervisor:
+    """Запускає кожне завдання в окремій групі процесів і завершує її цілком.
+
+    Скасування надсилає SIGTERM усій групі (процес завдання, ffmpeg, httrack, ...),
+    а через `grace` секунд - SIGKILL тим, хто ще живий. Завершальна подія
+    завдання отримує поле "usage" з CPU-часом і піковою RSS дерева процесів.
+    """
+
+    def __init__(self, grace=DEFAULT_KILL_GRACE):
+        self.grace = float(grace)
+        self._processes = {}
+
+    def spawn(self, task_id, target, args, name=None):
+        """Запускає `target(*args)`; останній аргумент - канал завдання."""
+        process = multiprocessing.Process(target=_supervised_main, args=(target, tuple(args)), daemon=True, name=name)
+        process.start()
+        self._processes[task_id] = process
+        return process
+
+    def get(self, task_id):
+        return self._processes.get(task_id)
+
+    def terminate(self, task_id, grace=None):
+        """SIGTERM групі завдання і SIGKILL після пільгового інтервалу."""
+        process = self._processes.get(task_id)
+        if process is None:
+            return False
+        grace = self.grace if grace is None else grace
+        logger.info(f"Terminating process group of task {task_id} (pid {process.pid}).")
+        signal_process_group(process.pid, signal.SIGTERM)
+        if hasattr(signal, "SIGCONT"):
+            signal_process_group(process.pid, signal.SIGCONT)  # призупинені процеси не обробляють SIGTERM
+        threading.Thread(target=self._kill_after, args=(task_id, process, grace), daemon=True).start()
+        return True
+
+    def release(self, task_id):
+        """Забуває завдання і прибирає процеси, що лишилися в його групі."""
+        process = self._processes.pop(task_id, None)
+        if process is not None:
+            threading.Thread(target=self._kill_after, args=(task_id, process, self.grace), daemon=True).start()
+
+    def terminate_all(self, grace=None):
+        """Синхронно завершує всі групи (при виході з програми)."""
+        grace = self.grace if grace is None else grace
+        processes = list(self._processes.items())
+        self._processes.clear()
+        for _task_id, process in processes:
+            signal_process_group(process.pid, signal.SIGTERM)
+            if hasattr(signal, "SIGCONT"):
+                signal_process_group(process.pid, signal.SIGCONT)
+        deadline = time.monotonic() + grace
+        for task_id, process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            self._kill_group(task_id, process)
+
+    def _kill_after(self, task_id, process, grace):
+        process.join(grace)
+        self._kill_group(task_id, process)
+
+    def _kill_group(self, task_id, process):
+        # Навіть якщо процес завдання вже завершився, у групі можуть лишатися його нащадки.
+        if process.is_alive():
+            logger.warning(f"Task {task_id} did not exit within the grace period, killing its process group.")
+        if hasattr(signal, "SIGKILL"):
+            signal_process_group(process.pid, signal.SIGKILL)
+        elif process.is_alive():
+            process.terminate()
@@ -0,0 +1,109 @@
+import logging
+import os
+import re
+from collections import deque
+
+from scripts.info_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+_URL_RE = re.compile(r"(?:https?://|www\.|youtu\.be/|youtube\.com/)[^\s<>\"']+", re.IGNORECASE)
+
+
+def extract_urls(text):
+    """Знаходить URL у довільному тексті (списки, експорт закладок, вміст буфера обміну)."""
+    return [match.group(0).rstrip(".,;)]") for match in _URL_RE.finditer(text or "")]
+
+
+def canonical_url(key, url):
+    """URL для завантаження за ключем нормалізації: для відео YouTube - стандартне посилання watch?v=."""
+    if key.startswith("youtube:"):
+        return f"https://www.youtube.com/watch?v={key[len('youtube:'):]}"
+    return url if "://" in url else "https://" + url
+
+
+class UrlBatch:
+    """Черга URL для пакетного завантаження з дедуплікацією.
+
+    Кожен URL нормалізується до ключа (для відео YouTube - ідентифікатор відео),
+    повтори і записи з архіву завантажень (`archive.has(extractor, id)`, див.
+    scripts.download_archive) відкидаються без мережевих запитів. Нові URL лише
+    дописуються в кінець черги, вже оброблені не переглядаються повторно.
+    """
+
+    def __init__(self, archive=None):
+        self.archive = archive
+        self.seen = set()
+        self.pending = deque()
+        self.accepted = 0
+        self.duplicates = 0
+        self.archived = 0
+
+    def add_text(self, text):
+        return self.add_urls(extract_urls(text))
+
+    def add_urls(self, urls):
+        """Додає URL у чергу. Повертає кількість прийнятих."""
+        accepted = 0
+        for url in urls:
+            url = url.strip()
+            if not url:
+                continue
+            key = normalize_url(url)
+            if key in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(key)
+            if self._in_archive(key):
+                self.archived += 1
+                continue
+            self.pending.append(canonical_url(key, url))
+            accepted += 1
+        self.accepted += accepted
+        return accepted
+
+    def _in_archive(self, key):
+        extractor, _sep, video_id = key.partition(":")
+        return self.archive is not None and extractor != "url" and self.archive.has(extractor, video_id)
+
+    def next_url(self):
+        return self.pending.popleft() if self.pending else None
+
+    def clear_pending(self):
+        self.pending.clear()
+
+
+class AppendOnlyReader:
+    """Читає з текстового файлу лише дописані з минулого разу рядки.
+
+    Якщо файл став коротшим (перезаписаний), читання починається спочатку.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self._partial = ""
+
+    def read_new_text(self, final=False):
+        """Повертає нові повні рядки; з `final=True` - також незавершений останній рядок."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError as e:
+            logger.warning(f"Failed to stat batch file {self.path}: {e}")
+            return ""
+        if size < self.offset:
+            self.offset, self._partial = 0, ""
+        if size == self.offset:
+            return self._take_partial() if final else ""
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+        text = self._partial + data.decode("utf-8", errors="replace")
+        # Незавершений останній рядок чекає на наступне дописування.
+        text, sep, self._partial = text.rpartition("\n")
+        return text + sep + (self._take_partial() if final else "")
+
+    def _take_partial(self):
+        partial, self._partial = self._partial, ""
+        return partial
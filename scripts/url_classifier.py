@@ -0,0 +1,82 @@
+import logging
+import threading
+from functools import lru_cache
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+TARGET_MEDIA = "youtube"    # сторінка завантаження через yt-dlp
+TARGET_SITE = "httrack"     # сторінка віддзеркалення сайтів
+
+# Хости, що містять лише медіа; перевіряються до регулярних виразів екстракторів.
+# Змішані сайти (vk.com, archive.org) вирішуються шаблонами екстракторів.
+MEDIA_HOSTS = {
+    "youtube.com", "youtu.be", "youtube-nocookie.com", "music.youtube.com",
+    "vimeo.com", "player.vimeo.com", "dailymotion.com", "dai.ly", "twitch.tv", "clips.twitch.tv",
+    "soundcloud.com", "bandcamp.com", "tiktok.com", "rumble.com", "odysee.com", "bilibili.com",
+    "mixcloud.com", "vkvideo.ru", "rutube.ru", "streamable.com",
+}
+MEDIA_EXTENSIONS = (".mp4", ".m4v", ".mkv", ".webm", ".mov", ".avi", ".flv", ".mp3", ".m4a", ".aac", ".ogg",
+                    ".opus", ".flac", ".wav", ".m3u8", ".mpd")
+# Екстрактори, що приймають будь-який URL: за ними не можна судити, що це медіа.
+_CATCH_ALL_EXTRACTORS = {"generic"}
+
+
+def _host(parsed):
+    host = (parsed.hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class _ExtractorMatcher:
+    """Перевірка URL регулярними виразами `suitable()` екстракторів yt-dlp без мережевих запитів.
+
+    Класи екстракторів (у збірках yt-dlp - легкі lazy_extractors) завантажуються
+    лише при першій перевірці, до якої доходить справа: yt_dlp не імпортується
+    в GUI, поки URL розпізнаються за відомими хостами. Кожен клас компілює і
+    кешує свій _VALID_URL при першому виклику.
+    """
+
+    def __init__(self):
+        self._extractors = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._extractors is None:
+                try:
+                    from yt_dlp.extractor import gen_extractor_classes
+                    self._extractors = [ie for ie in gen_extractor_classes()
+                                        if getattr(ie, "IE_NAME", "").lower() not in _CATCH_ALL_EXTRACTORS]
+                except ImportError:
+                    logger.warning("yt-dlp is not installed; URL classification uses host rules only.")
+                    self._extractors = []
+            return self._extractors
+
+    def match(self, url):
+        """Назва першого екстрактора, що приймає URL, або None."""
+        for ie in self._load():
+            try:
+                if ie.suitable(url):
+                    return ie.ie_key()
+            except Exception:
+                continue
+        return None
+
+
+_matcher = _ExtractorMatcher()
+
+
+@lru_cache(maxsize=512)
+def classify_url(url):
+    """Повертає (сторінка, причина) для URL: TARGET_MEDIA або TARGET_SITE. Мережа не використовується."""
+    url = (url or "").strip()
+    parsed = urlparse(url if "://" in url else "https://" + url)
+    host = _host(parsed)
+    if host in MEDIA_HOSTS or any(host.endswith("." + known) for known in MEDIA_HOSTS):
+        return TARGET_MEDIA, f"host:{host}"
+    if parsed.path.lower().endswith(MEDIA_EXTENSIONS):
+        return TARGET_MEDIA, "media-file"
+    extractor = _matcher.match(parsed.geturl())
+    if extractor:
+        return TARGET_MEDIA, f"extractor:{extractor}"
+    return TARGET_SITE, "no-extractor"
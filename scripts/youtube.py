@@ -1,8 +1,22 @@
-import yt_dlp
 import os
 import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Dict, Any
-from yt_dlp.utils import download_range_func
+
+from scripts.progress_reporter import ProgressReporter, STAGE_DOWNLOAD
+from scripts.task_channel import get_task_control
+from scripts.info_cache import get_info_cache, is_playlist_info, normalize_url
+from scripts.download_archive import (get_download_archive, attach_archive_recorder, TextArchive, ReadOnlyArchive,
+                                      LEGACY_ARCHIVE_FILENAME)
+from scripts.postprocess_stage import PostprocessStage
+from scripts.mp4_remux import mp4_format_sort, mp4_postprocessor
+from scripts.playlist_sync import get_sync_state, plan_sync
+from scripts.playlist_entries import PAGE_SIZE, compact_playlist_info, resolve_lazy_playlist, iter_entry_pages
+from scripts.retry_policy import (classify_error, is_retryable, backoff_delay, DEFAULT_RETRY_ATTEMPTS,
+                                   DEFAULT_RETRY_BASE_DELAY)
+from scripts.fragment_tuner import FragmentTuner, attach_fragment_tuner, get_tuning_store
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +24,11 @@ stop_requested = False
 
 
 def stop_download():
-    """Викликається для зупинки активного завантаження."""
+    """Зупиняє активне завантаження в поточному процесі.
+
+    GUI і CLI керують завданнями через канал керування (див. scripts.task_channel);
+    ця функція лишається для коду, що викликає завантаження в тому ж процесі.
+    """
     global stop_requested
     stop_requested = True
     logger.info("Зупинка завантаження запрошена користувачем.")
@@ -45,7 +63,45 @@ def _get_default_ydl_opts() -> Dict[str, Any]:
     }
 
 
-def get_youtube_info(url: str, extra_opts: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+def get_youtube_info(url: str, extra_opts: Optional[Dict[str, Any]] = None, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+    """Повертає інформацію yt-dlp про URL (для плейлистів - пласкі записи).
+
+    Результати кешуються (див. scripts.info_cache); з `extra_opts` кеш не використовується,
+    бо вони можуть змінити результат вилучення.
+    """
+    if extra_opts or not use_cache:
+        return _extract_youtube_info(url, extra_opts)
+    return get_info_cache().get_or_extract(url, _extract_youtube_info)
+
+
+def stream_playlist(url: str, page_size: int = PAGE_SIZE):
+    """Генератор для перегляду плейлиста в GUI.
+
+    Спершу віддає компактний заголовок, далі сторінки PlaylistEntry в міру того, як
+    yt-dlp отримує їх з мережі. Наступна сторінка запитується лише тоді, коли викликач
+    бере її з генератора. Якщо URL не є плейлистом, віддає лише повну інформацію
+    відео (як get_youtube_info, разом із записом в InfoCache) або None, якщо вилучення
+    нічого не дало.
+    """
+    import yt_dlp
+    ydl_opts = _get_default_ydl_opts()
+    ydl_opts.update({'extract_flat': 'in_playlist', 'skip_download': True, 'quiet': True, 'verbose': False})
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = resolve_lazy_playlist(ydl, url)
+        if not info:
+            yield None
+            return
+        if not is_playlist_info(info):
+            # Відео вже вилучено: лишається вибір форматів, без повторного запиту до сайту.
+            info = ydl.sanitize_info(ydl.process_ie_result(info, download=False))
+            get_info_cache().put(url, info)
+            yield info
+            return
+        yield compact_playlist_info(info)
+        yield from iter_entry_pages(info, page_size)
+
+
+def _extract_youtube_info(url: str, extra_opts: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
     ydl_opts = _get_default_ydl_opts()
     ydl_opts.update({'extract_flat': 'in_playlist', 'skip_download': True})
     if extra_opts:
@@ -53,20 +109,306 @@ def get_youtube_info(url: str, extra_opts: Optional[Dict[str, Any]] = None) -> O
 
     logger.info(f"Вилучення інформації для URL: {url}")
     try:
+        import yt_dlp
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=False)
-            if logger.isEnabledFor(logging.DEBUG) and info and info.get('_type') != 'playlist':
-                full_info_opts = ydl_opts.copy()
-                full_info_opts['extract_flat'] = False
-                with yt_dlp.YoutubeDL(full_info_opts) as ydl_full:
-                    log_available_formats(ydl_full.extract_info(url, download=False))
-            return info
+            if not info:
+                return None
+            # Для окремого відео extract_flat='in_playlist' і так дає повний список форматів,
+            # тож друге вилучення лише для журналу не потрібне.
+            if logger.isEnabledFor(logging.DEBUG) and not is_playlist_info(info):
+                log_available_formats(info)
+            # Лише JSON-сумісний словник можна зберегти в дисковому кеші і передати в інший процес.
+            return ydl.sanitize_info(info)
     except Exception as e:
         logger.error(f"Помилка вилучення інформації yt-dlp: {e}", exc_info=False)
         return None
 
 
+def _archive_recorder(archive):
+    def record(info):
+        try:
+            archive.record(info)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Не вдалося записати {info.get('id')} в архів завантажень: {e}")
+    return record
+
+
+def _download_from_info(ydl, info, url):
+    """Завантажує за готовим словником інформації, як `--load-info-json` у yt-dlp.
+
+    Якщо посилання на формати вже недійсні, повторює завантаження з вилученням з нуля.
+    З ignoreerrors yt-dlp лише повідомив би про помилку (наприклад, 403 на застарілому
+    посиланні) і повернув керування без файлу, тож ця спроба виконується без нього.
+    """
+    from yt_dlp.utils import DownloadError
+    ignoreerrors = ydl.params.get('ignoreerrors')
+    ydl.params['ignoreerrors'] = False
+    try:
+        ydl.process_ie_result(ydl.sanitize_info(info), download=True)
+    except DownloadError as e:
+        ydl.params['ignoreerrors'] = ignoreerrors
+        logger.warning(f"Завантаження за кешованою інформацією не вдалося ({e}), повторне вилучення {url}.")
+        get_info_cache().invalidate(url)
+        ydl.download([info.get('webpage_url') or url])
+    finally:
+        ydl.params['ignoreerrors'] = ignoreerrors
+
+
+class _PlaylistProgress:
+    """Зведений прогрес паралельного завантаження плейлиста: одна подія з усіма активними записами."""
+
+    def __init__(self, reporter, total):
+        self.reporter = reporter
+        self.total = total
+        self.finished = 0
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def update(self, index, title, d, fragments=None):
+        with self.lock:
+            entry = self.active.setdefault(index, {'index': index, 'title': title})
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            downloaded = d.get('downloaded_bytes') or 0
+            entry.update({'fraction': min(1.0, downloaded / total) if total else None,
+                          'speed': d.get('speed') if d['status'] == 'downloading' else None})
+            if d.get('fragment_index') is not None:
+                entry['fragments'] = fragments
+            self._emit()
+
+    def entry_done(self, index):
+        with self.lock:
+            self.active.pop(index, None)
+            self.finished += 1
+            self._emit(force=True)
+
+    def _emit(self, force=False):
+        partial = sum(entry['fraction'] or 0 for entry in self.active.values())
+        speed = sum(entry['speed'] or 0 for entry in self.active.values())
+        self.reporter.progress((self.finished + partial) / self.total if self.total else None, stage=STAGE_DOWNLOAD,
+                               speed=speed or None, items_done=self.finished, items_total=self.total,
+                               entries=sorted((dict(entry) for entry in self.active.values()), key=lambda e: e['index']),
+                               force=force)
+
+
+def _entry_key(entry_url, extractor=None, video_id=None):
+    """(extractor, id) запису; без id - за нормалізованим URL ("youtube", id) або ("url", ...)."""
+    if extractor and video_id:
+        return extractor.lower(), video_id
+    kind, _sep, value = normalize_url(entry_url).partition(":")
+    return kind, value
+
+
+class _EntryDownloader:
+    """Завантаження окремих записів плейлиста по `workers` одночасно, кожен власним YoutubeDL.
+
+    Записи - кортежі (позиція, url, назва, (extractor, id)). Невдалі записи
+    зберігаються в архіві завантажень з класом помилки; тимчасові помилки
+    (мережа, 429) повторюються окремим етапом після основного проходу з
+    експоненційною затримкою і випадковим розкидом. Тюнер фрагментів лише
+    підставляє збережене значення: одночасні завантаження спотворюють вимір
+    швидкості, тож нові виміри тут не робляться.
+    """
+
+    def __init__(self, yt_dlp, ydl_opts, workers, reporter, control, make_control_check, DownloadCancelled,
+                 archive=None, tuner=None, stage=None, source=None,
+                 retry_attempts=DEFAULT_RETRY_ATTEMPTS, retry_base_delay=DEFAULT_RETRY_BASE_DELAY):
+        self.yt_dlp = yt_dlp
+        self.ydl_opts = ydl_opts
+        self.workers = workers
+        self.reporter = reporter
+        self.control = control
+        self.make_control_check = make_control_check
+        self.DownloadCancelled = DownloadCancelled
+        self.archive = archive
+        self.tuner = tuner
+        self.stage = stage
+        self.source = source
+        self.retry_attempts = retry_attempts
+        self.retry_base_delay = retry_base_delay
+        self.entry_opts = {key: value for key, value in ydl_opts.items() if key not in ('playlist_items', 'playliststart', 'playlistend')}
+        # Помилка має дійти до нас винятком, щоб її можна було класифікувати і записати.
+        self.entry_opts.update({'noplaylist': True, 'ignoreerrors': False})
+        # Інформація окремого відео з `flat_entries`: завантаження використовує її без повторного вилучення.
+        self.single_info = None
+
+    def flat_entries(self, url):
+        """Пласке вилучення плейлиста з тими самими playlist_items / playliststart / playlistend.
+
+        Повертає (назва, записи, кількість уже завантажених) або None, якщо URL не є плейлистом;
+        тоді отримана інформація відео лишається в `single_info`.
+        """
+        flat_opts = {**self.ydl_opts, 'extract_flat': 'in_playlist', 'skip_download': True, 'progress_hooks': [], 'postprocessors': []}
+        with self.yt_dlp.YoutubeDL(flat_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if not info or not is_playlist_info(info):
+                self.single_info = ydl.sanitize_info(info) if info else None
+                return None
+            entries, skipped = [], 0
+            for position, entry in enumerate(info.get('entries') or [], 1):
+                if not entry:
+                    continue
+                if self.ydl_opts.get('download_archive') and ydl.in_download_archive(entry):
+                    skipped += 1
+                    continue
+                entry_url = entry.get('url') or entry.get('webpage_url')
+                if entry_url:
+                    entries.append((entry.get('playlist_index') or position, entry_url, entry.get('title') or entry_url,
+                                    _entry_key(entry_url, entry.get('ie_key'), entry.get('id'))))
+        return info.get('title') or url, entries, skipped
+
+    def run(self, title, entries, skipped=0):
+        """Завантажує записи, повторює тимчасові помилки і повертає підсумок (dict)."""
+        summary = {'title': title, 'total': len(entries), 'skipped': skipped, 'downloaded': 0, 'done_indices': [],
+                   'failed': [], 'not_started': 0, 'cancelled': False, 'retried': 0}
+        failed = self._run_round(entries, summary)
+        for attempt in range(self.retry_attempts):
+            retry = [entry for entry, error_class, _error in failed if is_retryable(error_class)]
+            if not retry or self.control.should_stop:
+                break
+            delay = backoff_delay(attempt, self.retry_base_delay)
+            self.reporter.status(f"Повтор {len(retry)} записів з тимчасовими помилками через {delay:.0f} с "
+                                 f"(спроба {attempt + 1}/{self.retry_attempts})...", force=True)
+            if not self.control.sleep(delay):
+                break
+            summary['retried'] += len(retry)
+            failed = [item for item in failed if item[0] not in retry] + self._run_round(retry, summary)
+        summary['failed'] = sorted((entry[0], entry[2], f"[{error_class}] {error}") for entry, error_class, error in failed)
+        summary['cancelled'] = summary['cancelled'] or self.control.should_stop
+        return summary
+
+    def _run_round(self, entries, summary):
+        progress = _PlaylistProgress(self.reporter, len(entries))
+        abort = threading.Event()
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ytdlp-entry") as executor:
+            futures = {executor.submit(self._download_entry, entry, progress, abort): entry for entry in entries}
+            for future in as_completed(futures):
+                entry = futures[future]
+                outcome, error = future.result()
+                if outcome == 'downloaded':
+                    summary['downloaded'] += 1
+                    summary['done_indices'].append(entry[0])
+                elif outcome == 'failed':
+                    error_class = classify_error(error)
+                    failed.append((entry, error_class, error))
+                    self._record_failure(entry, error_class, error)
+                    logger.warning(f"Запис {entry[0]} ('{entry[2]}') не завантажено [{error_class}]: {error}")
+                elif outcome == 'not_started':
+                    summary['not_started'] += 1
+                else:
+                    summary['cancelled'] = True
+        return failed
+
+    def _download_entry(self, entry, progress, abort):
+        index, entry_url, title, _key = entry
+        if abort.is_set() or self.control.should_stop:
+            return 'not_started', None
+        check_control = self.make_control_check()
+        fragments = self.entry_opts.get('concurrent_fragment_downloads', 1)
+
+        def hook(d):
+            check_control(d)
+            progress.update(index, title, d, self.tuner.current if self.tuner else fragments)
+
+        try:
+            with self.yt_dlp.YoutubeDL({**self.entry_opts, 'progress_hooks': [hook]}) as ydl:
+                # З етапом постобробки запис в архів робить етап, коли файл справді готовий.
+                if self.archive is not None and not self.stage:
+                    attach_archive_recorder(ydl, self.archive)
+                if self.tuner:
+                    attach_fragment_tuner(ydl, self.tuner)
+                if self.stage:
+                    self.stage.attach(ydl)
+                retcode = ydl.download([entry_url])
+            return ('downloaded', None) if not retcode else ('failed', 'yt-dlp повернув код помилки')
+        except self.DownloadCancelled:
+            return 'cancelled', None
+        except Exception as e:
+            if not self.ydl_opts.get('ignoreerrors'):
+                abort.set()
+            return 'failed', f"{type(e).__name__}: {str(e).replace('ERROR: ', '')}"
+        finally:
+            progress.entry_done(index)
+
+    def _record_failure(self, entry, error_class, error):
+        if self.archive is None:
+            return
+        index, entry_url, title, (extractor, video_id) = entry
+        try:
+            self.archive.record_failure(extractor, video_id, entry_url, title, self.source, error_class, error)
+        except sqlite3.Error as e:
+            logger.warning(f"Не вдалося записати помилку запису {index} в архів: {e}")
+
+
+def _download_playlist(downloader, url):
+    """Плейлист: пласке вилучення, потім завантаження записів. None, якщо URL не є плейлистом."""
+    downloader.reporter.status("Отримання списку записів плейлиста...", force=True)
+    listing = downloader.flat_entries(url)
+    if listing is None:
+        return None
+    title, entries, skipped = listing
+    downloader.reporter.status(f"Плейлист '{title}': {len(entries)} записів, по {downloader.workers} одночасно"
+                               + (f", {skipped} уже в архіві" if skipped else "") + ".", force=True)
+    return downloader.run(title, entries, skipped)
+
+
+def _sync_playlist(downloader, url):
+    """Режим синхронізації: переглядає лише нові сторінки плейлиста і завантажує нові записи.
+
+    Відомими в стані синхронізації стають лише успішно завантажені записи і ті,
+    що вже є в архіві, тож записи з помилками буде повторено наступного разу.
+    """
+    state = get_sync_state()
+    downloader.reporter.status("Пошук нових записів...", force=True)
+    flat_opts = {**downloader.ydl_opts, 'extract_flat': 'in_playlist', 'skip_download': True, 'progress_hooks': [], 'postprocessors': []}
+    with downloader.yt_dlp.YoutubeDL(flat_opts) as ydl:
+        plan = plan_sync(ydl, url, state, downloader.archive)
+    downloader.reporter.status(f"Синхронізація '{plan.title}': нових записів {len(plan.delta)}, переглянуто {plan.scanned}"
+                               + (" (до вже відомих)" if plan.stopped_early else "") + ".", force=True)
+    summary = downloader.run(plan.title, [(position, entry_url, title, (extractor, video_id))
+                                          for position, entry_url, title, video_id, extractor in plan.delta],
+                             len(plan.archived))
+    done = set(summary['done_indices'])
+    state.commit(plan, plan.archived + [(video_id, title) for position, _url, title, video_id, _extractor in plan.delta
+                                        if position in done])
+    return summary
+
+
+def _retry_failed(downloader, url):
+    """Режим "лише невдалі": завантажує записані помилки цього джерела без перегляду плейлиста."""
+    failures = downloader.archive.failures(source=downloader.source) if downloader.archive is not None else []
+    entries = [(position, row['url'], row['title'] or row['url'], (row['extractor'], row['video_id']))
+               for position, row in enumerate(failures, 1)]
+    downloader.reporter.status(f"Повтор невдалих записів для {url}: {len(entries)}.", force=True)
+    return downloader.run(f"{url} (невдалі)", entries)
+
+
+def _finish_playlist(summary, reporter, ignore_errors):
+    message = (f"Плейлист '{summary['title']}': завантажено {summary['downloaded']} з {summary['total']}"
+               + (f", пропущено (архів) {summary['skipped']}" if summary['skipped'] else "")
+               + (f", з помилками {len(summary['failed'])}" if summary['failed'] else "")
+               + (f", повторних спроб {summary['retried']}" if summary.get('retried') else "")
+               + (f", не розпочато {summary['not_started']}" if summary['not_started'] else "")
+               + (f", помилок постобробки {len(summary['postprocess_failed'])}" if summary.get('postprocess_failed') else "") + ".")
+    details = "\n".join([f"#{index} {title}: {error}" for index, title, error in sorted(summary['failed'])]
+                        + [f"Постобробка {title}: {error}" for title, error in summary.get('postprocess_failed', [])])
+    if summary['cancelled']:
+        reporter.cancelled(message)
+    elif (summary['failed'] or summary.get('postprocess_failed')) and (not ignore_errors or not summary['downloaded']):
+        reporter.error(message, details)
+    else:
+        if details:
+            logger.warning(f"Записи з помилками:\n{details}")
+        reporter.done(message)
+
+
 def download_youtube_media(kwargs, comm_queue):
+    # yt_dlp імпортується лише тут і в get_youtube_info: це важкий модуль,
+    # а GUI та CLI не повинні платити за нього під час старту.
+    import yt_dlp
+    from yt_dlp.utils import download_range_func
+
     global stop_requested
     stop_requested = False
 
@@ -79,6 +421,7 @@ def download_youtube_media(kwargs, comm_queue):
     playlist_start = kwargs.get('playlist_start', 0)
     playlist_end = kwargs.get('playlist_end', 0)
     concurrent_fragments = kwargs.get('concurrent_fragments', 4)
+    adaptive_fragments = kwargs.get('adaptive_fragments', False)
     skip_downloaded = kwargs.get('skip_downloaded', False)
     time_start = kwargs.get('time_start')
     time_end = kwargs.get('time_end')
@@ -94,27 +437,56 @@ def download_youtube_media(kwargs, comm_queue):
     use_sponsorblock = kwargs.get('use_sponsorblock', False)
     sponsorblock_cats = kwargs.get('sponsorblock_cats', 'all')
 
-    def send_status(message): comm_queue.put({"type": "status", "value": message})
-    def send_progress(fraction): comm_queue.put({"type": "progress", "value": fraction})
-    def send_done(message): comm_queue.put({"type": "done", "value": message})
-    def send_error(message): comm_queue.put({"type": "error", "value": message})
+    reporter = ProgressReporter(comm_queue, kwargs.get('progress_interval'))
+    send_status, send_done, send_error = reporter.status, reporter.done, reporter.error
+    control = get_task_control(comm_queue)
+    DownloadCancelled = getattr(yt_dlp.utils, 'DownloadCancelled', yt_dlp.utils.DownloadError)
+    playlist_workers = max(1, int(kwargs.get('playlist_workers') or 1))
+
+    def make_control_check():
+        # Стан акуратної зупинки окремий для кожного завантаження (у паралельному режимі їх кілька).
+        graceful_stop = {'fragment_index': None}
+
+        def check_control(d: Dict[str, Any]):
+            if stop_requested or control.cancelled:
+                raise DownloadCancelled("Завантаження скасовано користувачем.")
+            if control.paused:
+                send_status("Завантаження призупинено.", force=True)
+                control.wait_while_paused()
+                if control.cancelled:
+                    raise DownloadCancelled("Завантаження скасовано користувачем.")
+                send_status("Завантаження продовжено.", force=True)
+            if control.stop_requested:
+                # Акуратна зупинка: дочекатися завершення поточного фрагмента (або файлу),
+                # щоб при наступному запуску continuedl продовжив з файлу .part.
+                fragment_index = d.get('fragment_index')
+                if graceful_stop['fragment_index'] is None and fragment_index is not None and d['status'] == 'downloading':
+                    graceful_stop['fragment_index'] = fragment_index
+                elif d['status'] != 'downloading' or fragment_index is None or fragment_index > graceful_stop['fragment_index']:
+                    raise DownloadCancelled("Завантаження зупинено. Незавершені файли буде продовжено при наступному запуску.")
 
-    _last_reported_progress = -1.0
+        return check_control
+
+    check_control = make_control_check()
+    tuner = None
+    stage = None
 
     def progress_hook(d: Dict[str, Any]):
-        global stop_requested
-        if stop_requested:
-            raise yt_dlp.utils.DownloadError("Завантаження зупинено користувачем.")
+        check_control(d)
+        info_dict = d.get('info_dict') or {}
+        items = {'items_done': info_dict.get('playlist_index'), 'items_total': info_dict.get('n_entries')}
+        if d.get('fragment_index') is not None:
+            items['fragments'] = tuner.current if tuner else concurrent_fragments
+        if tuner:
+            tuner.observe(d)
         if d['status'] == 'downloading':
             total = d.get('total_bytes') or d.get('total_bytes_estimate')
-            if total:
-                fraction = min(1.0, d.get('downloaded_bytes', 0) / total)
-                if abs(fraction - _last_reported_progress) > 0.005:
-                    send_progress(fraction)
-            send_status(f"Завантаження: {d.get('_percent_str', '')} ({d.get('_speed_str', '')})")
+            downloaded = d.get('downloaded_bytes', 0)
+            reporter.progress(min(1.0, downloaded / total) if total else None, stage=STAGE_DOWNLOAD,
+                              bytes_done=downloaded, bytes_total=total, speed=d.get('speed'), eta=d.get('eta'), **items)
         elif d['status'] == 'finished':
-            send_progress(1.0)
-            send_status(f"Завершено: {os.path.basename(d.get('filename', ''))}")
+            reporter.progress(1.0, stage=STAGE_DOWNLOAD, bytes_done=d.get('downloaded_bytes') or d.get('total_bytes'), **items)
+            send_status(f"Завершено: {os.path.basename(d.get('filename', ''))}", force=True)
 
     try:
         ydl_opts = _get_default_ydl_opts()
@@ -124,6 +496,8 @@ def download_youtube_media(kwargs, comm_queue):
             'addmetadata': True,
             'embedchapters': True
         })
+        if kwargs.get('quiet'):
+            ydl_opts.update({'quiet': True, 'verbose': False, 'noprogress': True})
 
         if download_mode == 'default':
             ydl_opts['outtmpl'] = os.path.join(output_dir, '%(channel,uploader)s', '%(title)s.%(ext)s')
@@ -137,18 +511,17 @@ def download_youtube_media(kwargs, comm_queue):
 
         is_audio_only = download_mode == 'music'
         
-        ydl_opts.setdefault('postprocessors', [])
+        # Важкі постпроцесори виконуються окремим етапом (див. scripts.postprocess_stage),
+        # щоб наступний запис завантажувався, поки ffmpeg обробляє попередній.
+        deferred_pps = []
 
         if is_audio_only:
-            ydl_opts['postprocessors'].append({
+            deferred_pps.append({
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
                 'preferredquality': str(audio_quality)
             })
         
-        if embed_thumbnail:
-            ydl_opts['postprocessors'].append({'key': 'EmbedThumbnail'})
-        
         if manual_format:
             ydl_opts['format'] = manual_format
         elif is_audio_only:
@@ -162,14 +535,18 @@ def download_youtube_media(kwargs, comm_queue):
             sorters = []
             if max_resolution and max_resolution != "best": sorters.append(f"res:{max_resolution}")
             sorters.append("fps")
-            if prefer_h264: sorters.append("vcodec:h264")
+            if force_mp4:
+                # Спершу пари потоків, які зливаються в MP4 без перекодування (h264/avc1 + m4a).
+                sorters.extend(mp4_format_sort(prefer_h264))
+            elif prefer_h264:
+                sorters.append("vcodec:h264")
 
             base_format = f"bestvideo*{filter_str}+bestaudio/best{filter_str}"
             ydl_opts['format'] = base_format
-            if sorters: ydl_opts['format_sorter'] = sorters
+            if sorters: ydl_opts['format_sort'] = sorters
             
             if force_mp4:
-                ydl_opts['postprocessors'].append({'key': 'FFmpegVideoConvertor', 'preferedformat': 'mp4'})
+                deferred_pps.append({'key': mp4_postprocessor, 'reporter': reporter})
             else:
                 ydl_opts['merge_output_format'] = 'mp4'
 
@@ -182,10 +559,20 @@ def download_youtube_media(kwargs, comm_queue):
         if use_sponsorblock and not is_audio_only:
              ydl_opts['sponsorblock_remove'] = sponsorblock_cats
 
-        if concurrent_fragments > 1:
+        if adaptive_fragments:
+            tuner = FragmentTuner(get_tuning_store(), concurrent_fragments)
+            ydl_opts['concurrent_fragment_downloads'] = tuner.current
+        elif concurrent_fragments > 1:
             ydl_opts['concurrent_fragment_downloads'] = concurrent_fragments
+        # Єдиний архів для всіх тек і режимів; старий текстовий архів теки імпортується в нього.
+        try:
+            archive = get_download_archive()
+            archive.import_legacy(os.path.join(output_dir, LEGACY_ARCHIVE_FILENAME))
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Архів завантажень недоступний: {e}")
+            archive = None
         if skip_downloaded:
-            ydl_opts['download_archive'] = os.path.join(output_dir, '.yt-dlp-archive.txt')
+            ydl_opts['download_archive'] = archive if archive is not None else os.path.join(output_dir, LEGACY_ARCHIVE_FILENAME)
         if time_start or time_end:
             ydl_opts['download_ranges'] = download_range_func(None, [(time_start or "00:00:00", time_end)])
         if download_subs and not is_audio_only:
@@ -195,15 +582,79 @@ def download_youtube_media(kwargs, comm_queue):
                 'subtitleslangs': [lang.strip() for lang in (sub_langs or 'uk,en').split(',')]
             })
             if embed_subs:
-                ydl_opts['embedsubtitles'] = True
+                deferred_pps.append({'key': 'FFmpegEmbedSubtitle'})
+        if embed_thumbnail:
+            ydl_opts['writethumbnail'] = True
+            deferred_pps.append({'key': 'EmbedThumbnail'})
+
+        if deferred_pps:
+            # Файл потрапляє в архів лише після успішної постобробки, зі шляхом і розміром кінцевого файлу.
+            # yt-dlp вважає файл готовим, щойно етап поставив його в чергу, тож архів для нього - лише для
+            # перевірки: інакше невдала, відкинута чи перервана обробка лишила б в архіві сирий файл.
+            recorder = archive
+            if recorder is None and skip_downloaded:
+                recorder = TextArchive(os.path.join(output_dir, LEGACY_ARCHIVE_FILENAME))
+            if skip_downloaded:
+                ydl_opts['download_archive'] = ReadOnlyArchive(recorder)
+            stage = PostprocessStage(yt_dlp, ydl_opts, deferred_pps, kwargs.get('postprocess_workers'), reporter,
+                                     _archive_recorder(recorder) if recorder is not None else None)
 
         logger.info(f"Запуск yt-dlp з параметрами: {ydl_opts}")
-        send_status(f"Запуск yt-dlp для {url}...")
+        send_status(f"Запуск yt-dlp для {url}...", force=True)
+        cached_info = None if kwargs.get('no_info_cache') else get_info_cache().get(url)
+        downloader = _EntryDownloader(yt_dlp, ydl_opts, playlist_workers, reporter, control, make_control_check,
+                                      DownloadCancelled, archive, tuner, stage, source=normalize_url(url),
+                                      retry_attempts=int(kwargs.get('retry_attempts', DEFAULT_RETRY_ATTEMPTS)),
+                                      retry_base_delay=float(kwargs.get('retry_base_delay', DEFAULT_RETRY_BASE_DELAY)))
+        # Плейлисти завантажуються по записах, щоб кожну помилку можна було записати і повторити;
+        # окремі відео йдуть напряму без зайвого плаского вилучення. Для інших сайтів це видно лише
+        # після вилучення - тоді його результат використовується для завантаження (downloader.single_info).
+        single_video = (cached_info and not is_playlist_info(cached_info)) or (cached_info is None and normalize_url(url).startswith("youtube:"))
+        summary = None
+        if kwargs.get('retry_failed'):
+            summary = _retry_failed(downloader, url)
+        elif kwargs.get('sync'):
+            summary = _sync_playlist(downloader, url)
+        elif download_mode != 'single_flat' and not single_video:
+            summary = _download_playlist(downloader, url)
+        if summary is not None:
+            summary['postprocess_failed'] = stage.wait() if stage and not control.cancelled else []
+            _finish_playlist(summary, reporter, ignore_errors)
+            return
+        if downloader.single_info:
+            cached_info = downloader.single_info
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-        send_done("Завантаження YouTube завершено.")
+            if archive is not None and not stage:
+                attach_archive_recorder(ydl, archive)
+            if tuner:
+                attach_fragment_tuner(ydl, tuner)
+            if stage:
+                stage.attach(ydl)
+            if cached_info and not is_playlist_info(cached_info):
+                # Інформацію вже отримано під час перегляду URL або плаского вилучення - повторне вилучення зайве.
+                logger.info(f"Використання вже отриманої інформації для {url}.")
+                _download_from_info(ydl, cached_info, url)
+            else:
+                ydl.download([url])
+        failures = stage.wait() if stage else []
+        if failures:
+            details = "\n".join(f"{title}: {error}" for title, error in failures)
+            if not ignore_errors:
+                send_error(f"Постобробка не вдалася для {len(failures)} файлів.", details)
+                return
+            logger.warning(f"Файли з помилками постобробки:\n{details}")
+        send_done("Завантаження YouTube завершено." + (f" Помилок постобробки: {len(failures)}." if failures else ""))
+    except DownloadCancelled as e:
+        logger.info(f"Завантаження {url} перервано: {e}")
+        if stage and not control.cancelled:
+            # Акуратна зупинка: уже завантажені файли обробляються до кінця.
+            stage.wait()
+        reporter.cancelled(str(e).replace('ERROR: ', ''))
     except Exception as e:
         import traceback
         error_msg = f"Критична помилка yt-dlp: {e}\n{traceback.format_exc()}"
         logger.critical(error_msg)
         send_error(error_msg)
+    finally:
+        if stage:
+            stage.close(wait=False)
@@ -0,0 +1,320 @@
+import collections
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+
+from scripts.task_channel import TaskControl, CONTROL_CANCEL
+from scripts.task_supervisor import (enter_own_process_group, signal_process_group, collect_usage, MSG_USAGE,
+                                     TERMINAL_MESSAGES, DEFAULT_KILL_GRACE)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 3
+DEFAULT_MAX_JOBS_PER_WORKER = 50
+DEFAULT_MAX_RSS_MB = 1024
+
+# Службові повідомлення між пулом і воркером (поряд зі звичайними подіями завдань).
+MSG_JOB_FINISHED = "job_finished"
+MSG_WORKER_READY = "worker_ready"
+
+
+def _current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss - пікове значення (КБ у Linux), але краще, ніж нічого.
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _job_usage(before):
+    # Воркер виконує багато завдань: CPU-час рахується від початку завдання, а пікова RSS - воркера
+    # з дочірніми процесами (ffmpeg) за весь час його життя, бо поділити її між завданнями не можна.
+    after = collect_usage()
+    if not after:
+        return {}
+    return {"cpu_user": round(after["cpu_user"] - before.get("cpu_user", 0), 2),
+            "cpu_system": round(after["cpu_system"] - before.get("cpu_system", 0), 2),
+            "peak_rss_mb": after["peak_rss_mb"]}
+
+
+class _TaggedChannel:
+    """Канал завдання всередині воркера: додає task_id до кожної події і має власний TaskControl.
+
+    Завершальна подія отримує поле "usage", як у завдань під TaskSupervisor.
+    """
+
+    def __init__(self, conn, task_id, lock):
+        self._conn = conn
+        self._task_id = task_id
+        self._lock = lock
+        self.control = TaskControl()
+        self.finished = False
+        self._usage_before = collect_usage()
+
+    def put(self, message):
+        if message.get("type") in TERMINAL_MESSAGES and not self.finished:
+            self.finished = True
+            message = {**message, "usage": _job_usage(self._usage_before)}
+        with self._lock:
+            self._conn.send({**message, "task_id": self._task_id})
+
+    def send_usage(self):
+        """Надсилає використання ресурсів, якщо завдання завершилося без завершальної події."""
+        if not self.finished:
+            self.put({"type": MSG_USAGE, "usage": _job_usage(self._usage_before)})
+
+
+def _worker_main(job_conn, event_conn, max_jobs, max_rss_mb):
+    # ffmpeg, який yt-dlp запускає для злиття і постобробки, потрапляє в групу воркера.
+    enter_own_process_group()
+    # Імпорт yt-dlp і таблиці екстракторів виконується один раз на весь час життя воркера.
+    import yt_dlp
+    from yt_dlp.extractor import gen_extractor_classes
+    from scripts import youtube
+    gen_extractor_classes()
+
+    send_lock = threading.Lock()
+    jobs = queue.Queue()
+    current = {"task_id": None, "channel": None}
+    # Пул вважає завдання запущеним, щойно надіслав його воркеру, тож команди керування можуть
+    # прийти, поки завдання ще чекає в `jobs`; вони зберігаються і застосовуються при його запуску.
+    control_lock = threading.Lock()
+    queued_controls = {}
+
+    def read_commands():
+        while True:
+            try:
+                command = job_conn.recv()
+            except (EOFError, OSError):
+                jobs.put(None)
+                return
+            if command.get("cmd") == "job":
+                with control_lock:
+                    queued_controls[command["task_id"]] = []
+                jobs.put(command)
+            elif command.get("cmd") == "control":
+                with control_lock:
+                    task_id = command.get("task_id")
+                    if task_id == current["task_id"] and current["channel"] is not None:
+                        current["channel"].control.apply(command.get("command"))
+                    elif task_id in queued_controls:
+                        queued_controls[task_id].append(command.get("command"))
+            elif command.get("cmd") == "shutdown":
+                jobs.put(None)
+                return
+
+    threading.Thread(target=read_commands, daemon=True).start()
+    with send_lock:
+        event_conn.send({"type": MSG_WORKER_READY, "yt_dlp_version": yt_dlp.version.__version__})
+
+    jobs_done = 0
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        task_id = job["task_id"]
+        channel = _TaggedChannel(event_conn, task_id, send_lock)
+        with control_lock:
+            current["channel"], current["task_id"] = channel, task_id
+            for command in queued_controls.pop(task_id, []):
+                channel.control.apply(command)
+        try:
+            youtube.download_youtube_media(job["kwargs"], channel)
+        except Exception as e:
+            logger.exception(f"Worker job {task_id} failed: {e}")
+            channel.put({"type": "error", "value": f"Помилка воркера yt-dlp: {e}"})
+        finally:
+            with control_lock:
+                current["task_id"], current["channel"] = None, None
+            jobs_done += 1
+            channel.send_usage()
+
+        retire = jobs_done >= max_jobs or _current_rss_mb() > max_rss_mb
+        with send_lock:
+            event_conn.send({"type": MSG_JOB_FINISHED, "task_id": task_id, "retire": retire})
+        if retire:
+            break
+
+
+class PoolWorker:
+    def __init__(self, worker_id, process, job_conn, event_conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.job_conn = job_conn
+        self.event_conn = event_conn
+        self.task_id = None
+        self.retiring = False
+
+    @property
+    def busy(self):
+        return self.task_id is not None
+
+    def fileno(self):
+        return self.event_conn.fileno()
+
+    @property
+    def sentinel(self):
+        return self.process.sentinel
+
+
+class YouTubeWorkerPool:
+    """Пул довгоживучих процесів, які один раз імпортують yt-dlp і виконують багато завантажень.
+
+    Пул не залежить від GTK: власник отримує `on_worker_started(worker)` /
+    `on_worker_stopped(worker)`, стежить за `worker.fileno()` і `worker.sentinel`
+    і викликає `drain(worker)` та `worker_exited(worker)`, коли на них є події.
+    Воркер перезапускається після `max_jobs` завдань або при перевищенні `max_rss_mb`.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_jobs=DEFAULT_MAX_JOBS_PER_WORKER, max_rss_mb=DEFAULT_MAX_RSS_MB,
+                 on_worker_started=None, on_worker_stopped=None):
+        self.size = max(1, int(size))
+        self.max_jobs = max(1, int(max_jobs))
+        self.max_rss_mb = float(max_rss_mb)
+        self.on_worker_started = on_worker_started
+        self.on_worker_stopped = on_worker_stopped
+        self.workers = []
+        self._backlog = collections.deque()
+        self._ids = itertools.count(1)
+        self._closed = False
+
+    def start(self):
+        """Запускає (прогріває) воркери до розміру пулу."""
+        while not self._closed and len([w for w in self.workers if not w.retiring]) < self.size:
+            self._spawn_worker()
+
+    def submit(self, task_id, kwargs):
+        self.start()
+        self._backlog.append((task_id, kwargs))
+        self._assign_jobs()
+
+    def control(self, task_id, command):
+        """Передає команду керування (scripts.task_channel.CONTROL_*) завданню у воркері.
+
+        Завдання, що ще чекає в черзі пулу, при скасуванні просто прибирається з неї;
+        тоді повертається "dequeued".
+        """
+        for item in list(self._backlog):
+            if item[0] == task_id:
+                if command != CONTROL_CANCEL:
+                    return False
+                self._backlog.remove(item)
+                return "dequeued"
+        for worker in self.workers:
+            if worker.task_id == task_id:
+                self._send(worker, {"cmd": "control", "task_id": task_id, "command": command})
+                return True
+        return False
+
+    def terminate_task(self, task_id, grace=DEFAULT_KILL_GRACE):
+        """Примусово зупиняє завдання, яке не відреагувало на скасування.
+
+        Воркер - лідер власної групи процесів, тож SIGTERM групі зачіпає і ffmpeg,
+        який yt-dlp запустив для злиття чи конвертації; через `grace` секунд уцілілі
+        отримують SIGKILL. Воркер гине разом із завданням, і пул запускає новий
+        (`worker_exited` повертає task_id цього завдання). Повертає False, якщо
+        завдання вже не виконується.
+        """
+        worker = next((w for w in self.workers if w.task_id == task_id), None)
+        if worker is None or not worker.process.is_alive():
+            return False
+        worker.retiring = True
+        logger.warning(f"Terminating yt-dlp worker {worker.worker_id} (pid {worker.process.pid}) running task {task_id}.")
+        signal_process_group(worker.process.pid, signal.SIGTERM)
+        if hasattr(signal, "SIGCONT"):
+            signal_process_group(worker.process.pid, signal.SIGCONT)  # призупинені процеси не обробляють SIGTERM
+        threading.Thread(target=self._kill_after, args=(worker, grace), daemon=True).start()
+        return True
+
+    @staticmethod
+    def _kill_after(worker, grace):
+        worker.process.join(grace)
+        # Навіть якщо воркер уже завершився, у його групі можуть лишатися нащадки.
+        if hasattr(signal, "SIGKILL"):
+            signal_process_group(worker.process.pid, signal.SIGKILL)
+        elif worker.process.is_alive():
+            worker.process.terminate()
+
+    def drain(self, worker):
+        """Зчитує події воркера. Повертає список (task_id, message) для власника."""
+        events = []
+        try:
+            while worker.event_conn.poll():
+                message = worker.event_conn.recv()
+                msg_type = message.get("type")
+                if msg_type == MSG_WORKER_READY:
+                    logger.info(f"yt-dlp worker {worker.worker_id} ready (yt-dlp {message.get('yt_dlp_version')}).")
+                    continue
+                task_id = message.pop("task_id", None)
+                if msg_type == MSG_JOB_FINISHED:
+                    worker.task_id = None
+                    worker.retiring = worker.retiring or message.get("retire", False)
+                events.append((task_id, message))
+        except (EOFError, OSError):
+            pass
+        self.start()
+        self._assign_jobs()
+        return events
+
+    def worker_exited(self, worker):
+        """Обробляє завершення процесу воркера. Повертає task_id завдання, яке він не завершив."""
+        worker.process.join(timeout=0)
+        if worker in self.workers:
+            self.workers.remove(worker)
+        orphan = worker.task_id
+        if worker.retiring:
+            logger.info(f"yt-dlp worker {worker.worker_id} recycled.")
+        else:
+            logger.warning(f"yt-dlp worker {worker.worker_id} exited unexpectedly (code {worker.process.exitcode}).")
+        worker.event_conn.close()
+        worker.job_conn.close()
+        if self.on_worker_stopped:
+            self.on_worker_stopped(worker)
+        self.start()
+        self._assign_jobs()
+        return orphan
+
+    def shutdown(self):
+        self._closed = True
+        self._backlog.clear()
+        for worker in list(self.workers):
+            self._send(worker, {"cmd": "shutdown"})
+            if worker.process.is_alive():
+                signal_process_group(worker.process.pid, signal.SIGTERM)
+
+    def _spawn_worker(self):
+        job_reader, job_writer = multiprocessing.Pipe(duplex=False)
+        event_reader, event_writer = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_worker_main, args=(job_reader, event_writer, self.max_jobs, self.max_rss_mb),
+                                          daemon=True, name="downys-ytdlp-worker")
+        process.start()
+        job_reader.close()
+        event_writer.close()
+        worker = PoolWorker(next(self._ids), process, job_writer, event_reader)
+        self.workers.append(worker)
+        logger.debug(f"Spawned yt-dlp worker {worker.worker_id} (pid {process.pid}).")
+        if self.on_worker_started:
+            self.on_worker_started(worker)
+        return worker
+
+    def _assign_jobs(self):
+        for worker in self.workers:
+            if not self._backlog:
+                return
+            if worker.busy or worker.retiring or not worker.process.is_alive():
+                continue
+            task_id, kwargs = self._backlog.popleft()
+            worker.task_id = task_id
+            self._send(worker, {"cmd": "job", "task_id": task_id, "kwargs": kwargs})
+
+    def _send(self, worker, command):
+        try:
+            worker.job_conn.send(command)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to send '{command.get('cmd')}' to yt-dlp worker {worker.worker_id}: {e}")
@@ -3,14 +3,31 @@ import json
 import logging
 from pathlib import Path
 
+APP_NAME = "DownYS"
+
+
+def get_config_dir(app_name=APP_NAME):
+    if os.name == 'nt':
+        config_dir = Path(os.environ.get('APPDATA', Path.home())) / app_name
+    else:
+        config_dir = Path.home() / '.config' / app_name
+    config_dir.mkdir(parents=True, exist_ok=True)
+    return config_dir
+
+
+def get_cache_dir(app_name=APP_NAME):
+    """Директорія для даних, які можна безпечно видалити (кеш метаданих, мініатюр тощо)."""
+    if os.name == 'nt':
+        cache_dir = Path(os.environ.get('LOCALAPPDATA', Path.home())) / app_name / 'Cache'
+    else:
+        cache_dir = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / app_name
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
 class SettingsManager:
-    def __init__(self, app_name="DownYS"):
-        if os.name == 'nt':
-            config_dir = Path(os.environ.get('APPDATA', Path.home())) / app_name
-        else:
-            config_dir = Path.home() / '.config' / app_name
-            
-        config_dir.mkdir(parents=True, exist_ok=True)
+    def __init__(self, app_name=APP_NAME):
+        config_dir = get_config_dir(app_name)
         self.settings_path = config_dir / 'settings.json'
         self.settings = self._load_settings()
 
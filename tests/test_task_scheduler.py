@@ -0,0 +1,75 @@
+import unittest
+
+from scripts.task_scheduler import TaskScheduler, STATE_FAILED, STATE_QUEUED, STATE_RUNNING
+
+
+def job():
+    pass
+
+
+class TaskSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.launched = []
+        self.states = []
+        self.launch_result = True
+
+    def launcher(self, task):
+        self.launched.append(task.task_id)
+        if isinstance(self.launch_result, Exception):
+            raise self.launch_result
+        return self.launch_result
+
+    def make_scheduler(self, limit=1):
+        return TaskScheduler(self.launcher, limits={"job": limit},
+                             on_state_changed=lambda task: self.states.append((task.task_id, task.state, task.error)))
+
+    def test_limit_queues_extra_tasks(self):
+        scheduler = self.make_scheduler(limit=1)
+        scheduler.submit("a", job, "A")
+        scheduler.submit("b", job, "B")
+        self.assertEqual(self.launched, ["a"])
+        self.assertEqual(scheduler.get("b").state, STATE_QUEUED)
+        scheduler.task_finished("a")
+        self.assertEqual(self.launched, ["a", "b"])
+        self.assertEqual(scheduler.get("b").state, STATE_RUNNING)
+
+    def test_launcher_exception_reports_failed_state(self):
+        scheduler = self.make_scheduler()
+        self.launch_result = RuntimeError("spawn failed")
+        scheduler.submit("a", job, "A")
+        task_id, state, error = self.states[-1]
+        self.assertEqual((task_id, state), ("a", STATE_FAILED))
+        self.assertIn("spawn failed", error)
+        self.assertIsNone(scheduler.get("a"))
+        self.assertEqual(scheduler.running_count(), 0)
+
+    def test_launcher_false_reports_failed_state_and_frees_slot(self):
+        scheduler = self.make_scheduler()
+        self.launch_result = False
+        scheduler.submit("a", job, "A")
+        self.assertEqual(self.states[-1][:2], ("a", STATE_FAILED))
+        self.launch_result = True
+        scheduler.submit("b", job, "B")
+        self.assertEqual(self.states[-1][:2], ("b", STATE_RUNNING))
+
+    def test_finishing_queued_task_removes_it_from_queue(self):
+        scheduler = self.make_scheduler(limit=1)
+        scheduler.submit("a", job, "A")
+        scheduler.submit("b", job, "B")
+        scheduler.task_finished("b")
+        self.assertIsNone(scheduler.get("b"))
+        self.assertEqual(scheduler.pending_count("job"), 0)
+        scheduler.task_finished("a")
+        self.assertEqual(self.launched, ["a"])
+
+    def test_priority_before_fifo(self):
+        scheduler = self.make_scheduler(limit=1)
+        scheduler.submit("a", job, "A")
+        scheduler.submit("low", job, "Low")
+        scheduler.submit("high", job, "High", priority=5)
+        scheduler.task_finished("a")
+        self.assertEqual(self.launched, ["a", "high"])
+
+
+if __name__ == "__main__":
+    unittest.main()
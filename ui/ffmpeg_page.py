@@ -1,10 +1,13 @@
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GLib
+from gi.repository import Gtk, GLib, Pango
 import os
 
 from ui.base_page import BasePage
-from scripts.ffmpeg_tasks import run_ffmpeg_task
+from scripts.ffmpeg_tasks import run_ffmpeg_task, run_ffmpeg_segmented, run_ffmpeg_batch, plan_batch, batch_workers, SEGMENTABLE_TASKS
+from scripts.media_probe import get_media_probe, format_media_facts
+from scripts.progress_reporter import format_eta
+from scripts.ffmpeg_merge import run_ffmpeg_merge, MergePlan
 
 _ = lambda s: s
 
@@ -29,6 +32,17 @@ class FFmpegPage(BasePage):
         self.input_entry = None
         self.output_entry = None
         self.execute_button = None
+        self.batch_check = None
+        self.recursive_check = None
+        self.segments_check = None
+        self.media_info_label = None
+        self.merge_store = None
+        self.merge_view = None
+        self.merge_output_entry = None
+        self.merge_summary_label = None
+        self.merge_media = {}  # шлях -> опис від MediaProbe
+        self.input_label = None
+        self.output_label = None
 
     def build_ui(self):
         self.page_widget = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10, border_width=10)
@@ -47,7 +61,6 @@ class FFmpegPage(BasePage):
         hbox_op.pack_start(self.convert_radio, False, False, 0)
 
         self.merge_radio = Gtk.RadioButton.new_with_label_from_widget(self.convert_radio, _("Об'єднати файли"))
-        self.merge_radio.set_sensitive(False)
         self.merge_radio.connect("toggled", self._on_operation_toggled)
         hbox_op.pack_start(self.merge_radio, False, False, 0)
 
@@ -55,6 +68,7 @@ class FFmpegPage(BasePage):
         main_grid.attach(self.stack, 0, 1, 4, 1)
 
         self.stack.add_titled(self._build_convert_ui(), "convert_section", "Convert Options")
+        self.stack.add_titled(self._build_merge_ui(), "merge_section", "Merge Options")
 
         self.execute_button = Gtk.Button(label=_("Виконати"))
         self.execute_button.connect("clicked", self._on_execute_clicked)
@@ -68,34 +82,164 @@ class FFmpegPage(BasePage):
     def _build_convert_ui(self):
         grid = Gtk.Grid(column_spacing=10, row_spacing=8)
 
-        grid.attach(Gtk.Label(label=_("Вхідний файл:"), halign=Gtk.Align.END), 0, 0, 1, 1)
+        hbox_batch = Gtk.Box(spacing=10)
+        self.batch_check = Gtk.CheckButton(label=_("Пакетна обробка (папка або шаблон, напр. ~/Video/*.mkv)")); self.batch_check.connect("toggled", self._on_batch_toggled)
+        self.recursive_check = Gtk.CheckButton(label=_("Включно з підпапками"), sensitive=False)
+        hbox_batch.pack_start(self.batch_check, False, False, 0); hbox_batch.pack_start(self.recursive_check, False, False, 0)
+        grid.attach(hbox_batch, 1, 0, 3, 1)
+
+        self.input_label = Gtk.Label(label=_("Вхідний файл:"), halign=Gtk.Align.END)
+        grid.attach(self.input_label, 0, 1, 1, 1)
         self.input_entry = Gtk.Entry(hexpand=True)
         self.input_entry.connect("changed", self._update_output_suggestion)
-        grid.attach(self.input_entry, 1, 0, 2, 1)
-        btn_in = Gtk.Button(label="..."); btn_in.connect("clicked", lambda w: self._select_file_dialog(self.input_entry, _("Оберіть вхідний файл")))
-        grid.attach(btn_in, 3, 0, 1, 1)
+        grid.attach(self.input_entry, 1, 1, 2, 1)
+        btn_in = Gtk.Button(label="..."); btn_in.connect("clicked", self._on_select_input_clicked)
+        grid.attach(btn_in, 3, 1, 1, 1)
 
-        grid.attach(Gtk.Label(label=_("Вихідний файл:"), halign=Gtk.Align.END), 0, 1, 1, 1)
+        self.output_label = Gtk.Label(label=_("Вихідний файл:"), halign=Gtk.Align.END)
+        grid.attach(self.output_label, 0, 2, 1, 1)
         self.output_entry = Gtk.Entry(hexpand=True)
-        grid.attach(self.output_entry, 1, 1, 2, 1)
-        btn_out = Gtk.Button(label="..."); btn_out.connect("clicked", lambda w: self._select_file_dialog(self.output_entry, _("Оберіть вихідний файл"), save_mode=True))
-        grid.attach(btn_out, 3, 1, 1, 1)
+        grid.attach(self.output_entry, 1, 2, 2, 1)
+        btn_out = Gtk.Button(label="..."); btn_out.connect("clicked", self._on_select_output_clicked)
+        grid.attach(btn_out, 3, 2, 1, 1)
+
+        self.media_info_label = Gtk.Label(label="", xalign=0, selectable=True)
+        grid.attach(self.media_info_label, 1, 3, 3, 1)
 
-        grid.attach(Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL, margin_top=5, margin_bottom=5), 0, 2, 4, 1)
+        grid.attach(Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL, margin_top=5, margin_bottom=5), 0, 4, 4, 1)
 
-        grid.attach(Gtk.Label(label=_("Завдання:"), halign=Gtk.Align.END), 0, 3, 1, 1)
+        grid.attach(Gtk.Label(label=_("Завдання:"), halign=Gtk.Align.END), 0, 5, 1, 1)
         self.task_combo = Gtk.ComboBoxText()
         for label in FFMPEG_TASKS.keys():
             self.task_combo.append_text(label)
         self.task_combo.set_active(0)
         self.task_combo.connect("changed", self._on_task_changed)
-        grid.attach(self.task_combo, 1, 3, 3, 1)
+        grid.attach(self.task_combo, 1, 5, 3, 1)
 
         self.params_box = Gtk.Grid(column_spacing=10, row_spacing=8)
-        grid.attach(self.params_box, 0, 4, 4, 1)
+        grid.attach(self.params_box, 0, 6, 4, 1)
+
+        self.segments_check = Gtk.CheckButton(label=_("Кодувати частинами паралельно (для довгих файлів)"))
+        self.segments_check.set_tooltip_text(_("Файл розрізається за ключовими кадрами, частини кодуються на всіх ядрах і склеюються без перекодування."))
+        grid.attach(self.segments_check, 1, 7, 3, 1)
+
+        return grid
+
+    def _update_segments_sensitivity(self):
+        if not self.segments_check: return
+        task_info = FFMPEG_TASKS.get(self.task_combo.get_active_text() or "", {})
+        self.segments_check.set_sensitive(task_info.get("type") in SEGMENTABLE_TASKS and not self._is_batch())
+
+    def _is_batch(self):
+        return bool(self.batch_check and self.batch_check.get_active())
+
+    def _on_batch_toggled(self, check):
+        batch = check.get_active()
+        self.recursive_check.set_sensitive(batch)
+        self.input_label.set_text(_("Вхідна папка або шаблон:") if batch else _("Вхідний файл:"))
+        self.output_label.set_text(_("Вихідна папка:") if batch else _("Вихідний файл:"))
+        self.output_entry.set_text("")
+        self.output_entry.set_placeholder_text(_("поруч із вхідними файлами") if batch else "")
+        self._update_segments_sensitivity()
+        self._update_output_suggestion()
+
+    def _on_select_input_clicked(self, widget):
+        if self._is_batch(): self._select_folder_dialog(self.input_entry, _("Оберіть папку з файлами"))
+        else: self._select_file_dialog(self.input_entry, _("Оберіть вхідний файл"))
+
+    def _on_select_output_clicked(self, widget):
+        if self._is_batch(): self._select_folder_dialog(self.output_entry, _("Оберіть вихідну папку"))
+        else: self._select_file_dialog(self.output_entry, _("Оберіть вихідний файл"), save_mode=True)
+
+    def _build_merge_ui(self):
+        grid = Gtk.Grid(column_spacing=10, row_spacing=8)
+
+        grid.attach(Gtk.Label(label=_("Файли (у порядку склеювання):"), halign=Gtk.Align.START), 0, 0, 4, 1)
+        # Стовпці: ім'я, параметри потоків, повний шлях (прихований).
+        self.merge_store = Gtk.ListStore(str, str, str)
+        self.merge_view = Gtk.TreeView(model=self.merge_store, reorderable=True); self.merge_view.get_selection().set_mode(Gtk.SelectionMode.MULTIPLE)
+        for i, title in ((0, _("Файл")), (1, _("Параметри"))): self.merge_view.append_column(Gtk.TreeViewColumn(title, Gtk.CellRendererText(ellipsize=Pango.EllipsizeMode.END), text=i))
+        self.merge_store.connect("row-deleted", lambda *a: self._update_merge_summary())
+        scrolled = Gtk.ScrolledWindow(shadow_type=Gtk.ShadowType.IN, hexpand=True, min_content_height=180); scrolled.add(self.merge_view)
+        grid.attach(scrolled, 0, 1, 4, 1)
+
+        buttons = Gtk.Box(spacing=6)
+        for label, handler in ((_("Додати..."), self._on_merge_add_clicked), (_("Вгору"), lambda w: self._move_merge_rows(-1)),
+                               (_("Вниз"), lambda w: self._move_merge_rows(1)), (_("Видалити"), self._on_merge_remove_clicked),
+                               (_("За ім'ям"), self._on_merge_sort_clicked), (_("Очистити"), lambda w: self.merge_store.clear())):
+            button = Gtk.Button(label=label); button.connect("clicked", handler); buttons.pack_start(button, False, False, 0)
+        grid.attach(buttons, 0, 2, 4, 1)
+
+        self.merge_summary_label = Gtk.Label(label="", xalign=0, wrap=True)
+        grid.attach(self.merge_summary_label, 0, 3, 4, 1)
+
+        grid.attach(Gtk.Label(label=_("Вихідний файл:"), halign=Gtk.Align.END), 0, 4, 1, 1)
+        self.merge_output_entry = Gtk.Entry(hexpand=True)
+        grid.attach(self.merge_output_entry, 1, 4, 2, 1)
+        btn_out = Gtk.Button(label="..."); btn_out.connect("clicked", lambda w: self._select_file_dialog(self.merge_output_entry, _("Оберіть вихідний файл"), save_mode=True))
+        grid.attach(btn_out, 3, 4, 1, 1)
 
         return grid
 
+    def _merge_paths(self):
+        return [row[2] for row in self.merge_store]
+
+    def _on_merge_add_clicked(self, widget):
+        dialog = Gtk.FileChooserDialog(title=_("Оберіть файли для об'єднання"), transient_for=self.app, action=Gtk.FileChooserAction.OPEN, select_multiple=True)
+        dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, Gtk.STOCK_OPEN, Gtk.ResponseType.OK)
+        paths = sorted(dialog.get_filenames()) if dialog.run() == Gtk.ResponseType.OK else []
+        dialog.destroy()
+        self._add_merge_files(paths)
+
+    def _add_merge_files(self, paths):
+        paths = [path for path in paths if os.path.isfile(path)]
+        if not paths: return
+        for path in paths: self.merge_store.append([os.path.basename(path), _("аналіз..."), path])
+        if not self.merge_output_entry.get_text().strip():
+            base, ext = os.path.splitext(paths[0])
+            self.merge_output_entry.set_text(f"{base}_merged{ext}")
+        get_media_probe().probe_many(paths, lambda path, data: GLib.idle_add(self._on_merge_file_probed, path, data))
+
+    def _on_merge_file_probed(self, path, data):
+        self.merge_media[path] = data
+        for row in self.merge_store:
+            if row[2] == path: row[1] = format_media_facts(data) or _("не медіафайл")
+        self._update_merge_summary()
+        return False
+
+    def _move_merge_rows(self, step):
+        model, paths = self.merge_view.get_selection().get_selected_rows()
+        selected = {path.get_indices()[0] for path in paths}
+        order = list(range(len(model)))
+        # Рядки, що впираються в край списку або в інший вибраний рядок, лишаються на місці.
+        for index in sorted(selected, reverse=step > 0):
+            target = index + step
+            if 0 <= target < len(order) and target not in selected:
+                order[index], order[target] = order[target], order[index]
+                selected.discard(index); selected.add(target)
+        if order != sorted(order): self.merge_store.reorder(order)
+
+    def _on_merge_remove_clicked(self, widget):
+        model, paths = self.merge_view.get_selection().get_selected_rows()
+        for path in reversed(paths): model.remove(model.get_iter(path))
+
+    def _on_merge_sort_clicked(self, widget):
+        names = [row[0].lower() for row in self.merge_store]
+        self.merge_store.reorder(sorted(range(len(names)), key=names.__getitem__))
+
+    def _update_merge_summary(self):
+        if not self.merge_summary_label: return
+        paths = self._merge_paths()
+        if len(paths) < 2: self.merge_summary_label.set_text(_("Додайте щонайменше два файли.")); return
+        if any(path not in self.merge_media for path in paths): self.merge_summary_label.set_text(_("Аналіз файлів...")); return
+        plan = MergePlan(paths, [self.merge_media[path] for path in paths])
+        total = format_eta(plan.total_duration)
+        if plan.unreadable: text = _(f"Не вдалося прочитати: {', '.join(os.path.basename(path) for path in plan.unreadable)}")
+        elif plan.missing_video: text = _(f"Файли без відео не можна об'єднати з відеофайлами: {', '.join(os.path.basename(path) for path in plan.missing_video)}")
+        elif plan.stream_copy_only: text = _(f"{len(paths)} файлів · {total} · параметри збігаються: склеювання без перекодування.")
+        else: text = _(f"{len(paths)} файлів · {total} · буде нормалізовано {len(plan.mismatched)}: ") + ", ".join(os.path.basename(paths[i]) for i in plan.mismatched[:5]) + ("..." if len(plan.mismatched) > 5 else "")
+        self.merge_summary_label.set_text(text)
+
     def _on_operation_toggled(self, radio_button):
         if not radio_button.get_active():
             return
@@ -137,14 +281,16 @@ class FFmpegPage(BasePage):
             col += 1
 
         self.params_box.show_all()
+        self._update_segments_sensitivity()
         self._update_output_suggestion()
 
     def _update_output_suggestion(self, *args):
         if not all([self.input_entry, self.output_entry, self.task_combo]): return
 
         input_path = self.input_entry.get_text().strip()
+        self._show_media_info(input_path)
         active_task_label = self.task_combo.get_active_text()
-        if not active_task_label: return
+        if not active_task_label or self._is_batch(): return
 
         task_info = FFMPEG_TASKS.get(active_task_label, {})
         output_ext = task_info.get("output_ext", ".out")
@@ -154,19 +300,33 @@ class FFmpegPage(BasePage):
             suggested_path = os.path.join(input_dir, f"{base}_converted{output_ext}")
             self.output_entry.set_text(suggested_path)
 
+    def _show_media_info(self, input_path):
+        if not self.media_info_label: return
+        if self._is_batch() or not os.path.isfile(input_path): self.media_info_label.set_text(""); return
+        self.media_info_label.set_text(_("Аналіз файлу..."))
+        get_media_probe().probe_many([input_path], lambda path, data: GLib.idle_add(self._on_media_probed, path, data))
+
+    def _on_media_probed(self, path, data):
+        # Відповідь могла прийти вже для іншого файлу, якщо користувач змінив шлях.
+        if self.input_entry.get_text().strip() == path:
+            self.media_info_label.set_text(format_media_facts(data) or _("Не вдалося прочитати медіафайл."))
+        return False
+
     def _on_execute_clicked(self, widget):
         try:
-            if self.convert_radio.get_active():
+            if self.convert_radio.get_active() and self._is_batch():
+                self._execute_batch_task()
+            elif self.convert_radio.get_active():
                 self._execute_convert_task()
             else:
-                self.app.show_warning_dialog("Ця функція ще не реалізована.")
+                self._execute_merge_task()
 
         except (ValueError, RuntimeError, FileNotFoundError) as e:
             self.app.show_warning_dialog(str(e))
         except Exception as e:
             self.app.show_detailed_error_dialog(_("Неочікувана помилка FFmpeg"), str(e))
 
-    def _execute_convert_task(self):
+    def _selected_task(self):
         active_task_label = self.task_combo.get_active_text()
         if not active_task_label: raise ValueError(_("Оберіть завдання FFmpeg."))
 
@@ -174,6 +334,30 @@ class FFmpegPage(BasePage):
         if not task_info: raise ValueError(_("Обрано невідоме завдання FFmpeg."))
 
         task_options = {spec["name"]: self.param_entries[spec["name"]].get_text().strip() for spec in task_info.get("params", [])}
+        return task_info, task_options
+
+    def _execute_batch_task(self):
+        task_info, task_options = self._selected_task()
+        source = self.input_entry.get_text().strip()
+        output_dir = self.output_entry.get_text().strip() or None
+        if not source: raise ValueError(_("Вкажіть вхідну папку або шаблон файлів."))
+
+        recursive = self.recursive_check.get_active()
+        # План будується одразу, щоб порожня папка чи вже оброблені файли не ставили завдання в чергу.
+        jobs, skipped = plan_batch(source, task_info["output_ext"], output_dir, recursive=recursive)
+        if not jobs:
+            self.show_info_dialog(_("FFmpeg"), _(f"Усі файли ({len(skipped)}) вже оброблені."))
+            return
+
+        workers, threads = batch_workers(task_info["type"])
+        task_name = f"FFmpeg: {len(jobs)} файлів ({os.path.basename(source.rstrip(os.sep)) or source})"
+        all_kwargs = {'task_type': task_info["type"], 'task_options': task_options, 'output_ext': task_info["output_ext"],
+                      'output_dir': output_dir, 'recursive': recursive, 'threads_per_job': threads}
+        self.app.start_task(run_ffmpeg_batch, task_name, args=(source,), kwargs=all_kwargs)
+        self.app._update_status(_(f"Заплановано {len(jobs)} файлів ({len(skipped)} актуальні пропущено): {workers} процесів × {threads} потоків."))
+
+    def _execute_convert_task(self):
+        task_info, task_options = self._selected_task()
 
         input_path = self.input_entry.get_text().strip()
         output_path = self.output_entry.get_text().strip()
@@ -191,5 +375,19 @@ class FFmpegPage(BasePage):
 
         task_name = f"FFmpeg: {os.path.basename(input_path)}"
         all_kwargs = {'task_type': task_info["type"], 'task_options': task_options}
+        # Кодування частинами займає всі ядра, тому планується у власній групі слотів.
+        segmented = self.segments_check.get_sensitive() and self.segments_check.get_active()
+        task_func = run_ffmpeg_segmented if segmented else run_ffmpeg_task
+
+        self.app.start_task(task_func, task_name, args=(input_path, output_path), kwargs=all_kwargs)
+
+    def _execute_merge_task(self):
+        inputs = self._merge_paths()
+        output_path = self.merge_output_entry.get_text().strip()
+        if len(inputs) < 2: raise ValueError(_("Додайте щонайменше два файли для об'єднання."))
+        if not output_path: raise ValueError(_("Вкажіть вихідний файл."))
+        if os.path.abspath(output_path) in {os.path.abspath(path) for path in inputs}:
+            raise ValueError(_("Вихідний файл не може бути одним із вхідних."))
 
-        self.app.start_task(run_ffmpeg_task, task_name, args=(input_path, output_path), kwargs=all_kwargs)
+        task_name = f"FFmpeg: об'єднання {len(inputs)} файлів"
+        self.app.start_task(run_ffmpeg_merge, task_name, args=(output_path,), kwargs={'inputs': inputs})
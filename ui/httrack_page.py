@@ -273,7 +273,6 @@ class HTTrackPage(BasePage):
          if self.archive_radio.get_active(): self._suggest_archive_filename(entry.get_text().strip())
 
     def _on_execute_clicked(self, widget):
-        if self.app.active_tasks: self.show_warning_dialog(_("Завдання вже виконується.")); return
         try:
             if self.mirror_create_radio.get_active() or self.mirror_update_radio.get_active(): self._execute_mirror()
             else: self._execute_archive()
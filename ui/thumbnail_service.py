@@ -0,0 +1,180 @@
+import gi
+gi.require_version('GdkPixbuf', '2.0')
+from gi.repository import GLib, GdkPixbuf
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISK_CACHE_MB = 100
+DEFAULT_MEMORY_ENTRIES = 32
+HTTP_TIMEOUT = 5
+
+
+def pick_thumbnail_url(info, width):
+    """Обирає найменшу мініатюру не вужчу за `width`, надаючи перевагу JPEG/PNG перед WebP
+    (завантажувач WebP для GdkPixbuf встановлено не всюди)."""
+    candidates = [t for t in info.get('thumbnails') or [] if t.get('url') and t.get('width')]
+    if candidates:
+        def score(thumb):
+            is_webp = 'webp' in thumb['url'].split('?')[0].lower()
+            too_small = thumb['width'] < width
+            return (is_webp, too_small, thumb['width'] if not too_small else -thumb['width'])
+        return min(candidates, key=score)['url']
+    return info.get('thumbnail')
+
+
+class ThumbnailService:
+    """Завантаження мініатюр для GUI.
+
+    HTTP-запити йдуть через спільну requests.Session з пулом з'єднань, сирі
+    зображення зберігаються в дисковому кеші з LRU-витісненням за розміром,
+    а декодування і масштабування одразу до потрібної ширини виконуються у
+    фоновому потоці. Колбек отримує готовий GdkPixbuf у головному циклі GTK.
+    """
+
+    def __init__(self, cache_dir, max_disk_bytes=DEFAULT_DISK_CACHE_MB * 1024 * 1024,
+                 max_memory_entries=DEFAULT_MEMORY_ENTRIES, workers=2):
+        self.cache_dir = os.path.join(cache_dir, "thumbnails")
+        self.max_disk_bytes = int(max_disk_bytes)
+        self.max_memory_entries = max(1, int(max_memory_entries))
+        self._memory = OrderedDict()  # (url, width) -> GdkPixbuf
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._lock = threading.Lock()
+        self._session = None
+        self._disk_usage = None
+
+    def request(self, url, width, callback):
+        """Викликає `callback(url, pixbuf_or_None)` у головному потоці.
+
+        Якщо мініатюра вже декодована в пам'яті, колбек викликається одразу.
+        """
+        if not url:
+            callback(url, None)
+            return
+        with self._lock:
+            pixbuf = self._memory.get((url, width))
+            if pixbuf is not None:
+                self._memory.move_to_end((url, width))
+        if pixbuf is not None:
+            callback(url, pixbuf)
+            return
+        self._executor.submit(self._load, url, width, callback)
+
+    def _load(self, url, width, callback):
+        pixbuf = None
+        try:
+            data = self._read_cached(url)
+            if data is None:
+                data = self._download(url)
+                self._store(url, data)
+            pixbuf = self._decode(data, width)
+            with self._lock:
+                self._memory[(url, width)] = pixbuf
+                while len(self._memory) > self.max_memory_entries:
+                    self._memory.popitem(last=False)
+        except Exception as e:
+            logger.warning(f"Failed to load thumbnail {url}: {e}")
+        GLib.idle_add(self._deliver, callback, url, pixbuf)
+
+    @staticmethod
+    def _deliver(callback, url, pixbuf):
+        callback(url, pixbuf)
+        return False
+
+    def _get_session(self):
+        if self._session is None:
+            import requests  # важкий модуль, потрібен лише для мініатюр
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    def _download(self, url):
+        response = self._get_session().get(url, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+
+    @staticmethod
+    def _decode(data, width):
+        loader = GdkPixbuf.PixbufLoader()  # тип (JPEG, PNG, WebP...) визначається за вмістом
+
+        def on_size_prepared(loader, src_width, src_height):
+            # Декодер одразу масштабує до потрібного розміру, без проміжного повнорозмірного зображення.
+            if src_width > width:
+                loader.set_size(width, max(1, round(src_height * width / src_width)))
+
+        loader.connect("size-prepared", on_size_prepared)
+        try:
+            loader.write(data)
+        finally:
+            loader.close()
+        return loader.get_pixbuf()
+
+    def _path_for(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def _read_cached(self, url):
+        path = self._path_for(url)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # час доступу для LRU
+            return data
+        except FileNotFoundError:
+            return None
+
+    def _store(self, url, data):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path_for(url)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                if self._disk_usage is None:
+                    self._disk_usage = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+                else:
+                    self._disk_usage += len(data)
+                over_limit = self._disk_usage > self.max_disk_bytes
+            if over_limit:
+                self._evict()
+        except OSError as e:
+            logger.warning(f"Failed to cache thumbnail {url}: {e}")
+
+    def _evict(self):
+        entries = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                         for entry in os.scandir(self.cache_dir) if entry.is_file())
+        total = sum(size for _mtime, size, _path in entries)
+        # Витісняємо до 90% ліміту, щоб не чистити кеш після кожного нового файлу.
+        target = self.max_disk_bytes * 0.9
+        for _mtime, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_usage = total
+
+
+_service = None
+
+
+def get_thumbnail_service(settings=None):
+    global _service
+    if _service is None:
+        from settings_manager import get_cache_dir
+        cache_mb = settings.get('thumbnail_cache_mb', DEFAULT_DISK_CACHE_MB) if settings else DEFAULT_DISK_CACHE_MB
+        _service = ThumbnailService(str(get_cache_dir()), max_disk_bytes=cache_mb * 1024 * 1024)
+    return _service
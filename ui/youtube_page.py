@@ -1,20 +1,32 @@
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GLib, Pango, GdkPixbuf
+from gi.repository import Gtk, Gdk, Gio, GLib, Pango
 import os
 import sys
 import subprocess
 import logging
 import threading
-import requests # Потрібно для завантаження мініатюр
-from io import BytesIO
 
 from ui.base_page import BasePage
-from scripts.youtube import download_youtube_media, get_youtube_info, stop_download
+from ui.thumbnail_service import get_thumbnail_service, pick_thumbnail_url
+from scripts.youtube import download_youtube_media, get_youtube_info, stream_playlist
+from scripts.info_cache import normalize_url, is_playlist_info
+from scripts.playlist_entries import format_playlist_items
+from scripts.task_channel import CONTROL_STOP
+from scripts.url_batch import UrlBatch, AppendOnlyReader
+from scripts.download_archive import get_download_archive, LEGACY_ARCHIVE_FILENAME
+from scripts.progress_reporter import format_rate
+from scripts.media_probe import get_media_probe, format_media_facts, is_media_file
 
 _ = lambda s: s
 logger = logging.getLogger(__name__)
 
+THUMBNAIL_WIDTH = 240
+# Скільки сторінок записів плейлиста завантажувати одразу; решта - коли список прокручено до кінця.
+PLAYLIST_PRELOAD_PAGES = 2
+# Скільки чекати на прокрутку, тримаючи відкритим YoutubeDL потокового перегляду плейлиста.
+PLAYLIST_IDLE_TIMEOUT = 300
+
 class YouTubePage(BasePage):
     def __init__(self, app_window, url_handler):
         super().__init__(app_window, url_handler)
@@ -39,15 +51,26 @@ class YouTubePage(BasePage):
         self.info_revealer, self.info_spinner, self.info_grid = None, None, None
         self.info_title_label, self.info_uploader_label, self.info_duration_label = None, None, None
         self.video_info = None
+        self.task_ids = []
         self.mode_default_radio, self.mode_music_radio, self.mode_playlist_flat_radio, self.mode_single_flat_radio = None, None, None, None
         self.playlist_items_entry = None; self.manual_format_entry = None
         self.download_subs_check, self.sub_langs_entry, self.embed_subs_check = None, None, None
         self.file_list_store, self.file_tree_view = None, None
+        self.file_browser_rows = {}  # повний шлях медіафайлу -> рядок file_list_store
         self.video_quality_combo, self.audio_quality_combo, self.playlist_start_spin, self.playlist_end_spin = None, None, None, None
         self.concurrent_fragments_spin, self.skip_downloaded_check, self.time_start_entry, self.time_end_entry = None, None, None, None
+        self.playlist_workers_spin = None
         self.ignore_errors_check = None
         self.avoid_av1_check, self.prefer_h264_check, self.force_mp4_check, self.max_bitrate_spin = None, None, None, None
         self.url_change_timeout = None
+        # Пакетне завантаження
+        self.url_batch, self.batch_dir, self.batch_reader, self.batch_monitor = None, None, None, None
+        self.batch_in_flight, self.batch_done, self.batch_failed = {}, 0, 0
+        self.batch_label = None
+        # Перегляд плейлиста: компактні записи (PlaylistEntry) і рядки ListStore з їхніми номерами
+        self.playlist_entries, self.playlist_store, self.playlist_view, self.playlist_frame = [], None, None, None
+        self.playlist_generation, self.playlist_more = 0, threading.Event()
+        self.playlist_hidden = False
 
     def build_ui(self):
         page_scroller = Gtk.ScrolledWindow(hexpand=True, vexpand=True); page_scroller.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
@@ -70,9 +93,15 @@ class YouTubePage(BasePage):
         btn_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=8, margin_top=6)
         self.download_button = Gtk.Button(label=_("Завантажити")); self.download_button.connect("clicked", self._on_download_clicked); btn_box.pack_start(self.download_button, False, False, 0)
         self.stop_button = Gtk.Button(label=_("Стоп")); self.stop_button.connect("clicked", self._on_stop_clicked); btn_box.pack_start(self.stop_button, False, False, 0)
+        retry_button = Gtk.Button(label=_("Повторити невдалі")); retry_button.set_tooltip_text(_("Завантажити лише записи цього плейлиста, що завершилися помилкою,\nбез повторного перегляду плейлиста.")); retry_button.connect("clicked", self._on_retry_failed_clicked); btn_box.pack_start(retry_button, False, False, 0)
         self.page_widget.pack_start(btn_box, False, False, 0)
 
+        self._build_batch_panel()
         self._build_file_browser(); self._suggest_default_output_dir(); GLib.idle_add(self._populate_file_browser)
+        # Воркери yt-dlp прогріваються у фоні, щойно користувач відкрив сторінку YouTube.
+        GLib.idle_add(self.app.prewarm_youtube_workers)
+        page_scroller.connect("map", lambda w: setattr(self, 'playlist_hidden', False))
+        page_scroller.connect("unmap", self._on_page_unmapped)
 
         return page_scroller
 
@@ -119,6 +148,60 @@ class YouTubePage(BasePage):
         scrolled_desc = Gtk.ScrolledWindow(shadow_type=Gtk.ShadowType.IN, min_content_height=100); desc_frame.add(scrolled_desc)
         self.info_description_view = Gtk.TextView(wrap_mode=Gtk.WrapMode.WORD_CHAR, editable=False, cursor_visible=False)
         self.info_description_buffer = self.info_description_view.get_buffer(); scrolled_desc.add(self.info_description_view)
+        self._build_playlist_preview(info_text_vbox)
+
+    def _build_playlist_preview(self, parent_box):
+        self.playlist_frame = Gtk.Frame(label=_("Записи плейлиста (позначені потрапляють у 'Елементи плейлиста')")); parent_box.pack_start(self.playlist_frame, True, True, 0); self.playlist_frame.set_no_show_all(True)
+        scrolled = Gtk.ScrolledWindow(shadow_type=Gtk.ShadowType.IN, min_content_height=220); self.playlist_frame.add(scrolled); scrolled.get_vadjustment().connect("value-changed", self._on_playlist_scrolled)
+        # Рядок зберігає лише позначку і номер у self.playlist_entries; текст береться із запису під час малювання.
+        self.playlist_store = Gtk.ListStore(bool, int); self.playlist_view = Gtk.TreeView(model=self.playlist_store, headers_clickable=True); scrolled.add(self.playlist_view)
+        toggle = Gtk.CellRendererToggle(); toggle.connect("toggled", self._on_playlist_entry_toggled); column = Gtk.TreeViewColumn("", toggle, active=0); column.set_clickable(True); column.connect("clicked", self._on_playlist_toggle_all); self.playlist_view.append_column(column)
+        for title, attr, width, expand in (("#", "index", 50, False), (_("Назва"), "title", 300, True), (_("Тривалість"), "duration", 80, False), (_("Доступність"), "availability", 100, False)):
+            renderer = Gtk.CellRendererText(ellipsize=Pango.EllipsizeMode.END); column = Gtk.TreeViewColumn(title, renderer); column.set_sizing(Gtk.TreeViewColumnSizing.FIXED); column.set_fixed_width(width); column.set_expand(expand)
+            column.set_cell_data_func(renderer, self._render_playlist_cell, attr); self.playlist_view.append_column(column)
+        for column in self.playlist_view.get_columns(): column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+        self.playlist_view.set_fixed_height_mode(True)  # GTK малює лише видимі рядки без вимірювання всіх
+
+    def _render_playlist_cell(self, column, renderer, model, tree_iter, attr):
+        entry = self.playlist_entries[model[tree_iter][1]]; value = getattr(entry, attr)
+        if attr == "duration": value = self._format_duration(value) if value else ""
+        renderer.set_property("text", "" if value is None else str(value))
+
+    def _reset_playlist_preview(self):
+        # Потік попереднього URL чекає на власну подію: будимо його, щоб він завершився.
+        self.playlist_generation += 1; self.playlist_more.set(); self.playlist_more = threading.Event()
+        self.playlist_entries = []; self.playlist_store.clear(); self.playlist_frame.hide()
+
+    def _on_playlist_entry_toggled(self, renderer, path):
+        self.playlist_store[path][0] = not self.playlist_store[path][0]; self._update_playlist_items()
+
+    def _on_playlist_toggle_all(self, column):
+        select = not all(row[0] for row in self.playlist_store)
+        for row in self.playlist_store: row[0] = select
+        self._update_playlist_items()
+
+    def _update_playlist_items(self):
+        self.playlist_items_entry.set_text(format_playlist_items(self.playlist_entries[row[1]].index for row in self.playlist_store if row[0]))
+
+    def _on_playlist_scrolled(self, adjustment):
+        if adjustment.get_value() + adjustment.get_page_size() >= adjustment.get_upper() - adjustment.get_page_size(): self.playlist_more.set()
+
+    def _on_page_unmapped(self, widget):
+        # Прихована сторінка не гортається: потік перегляду прокидається і закриває YoutubeDL.
+        self.playlist_hidden = True; self.playlist_more.set()
+
+    def _on_playlist_stream_stopped(self, generation):
+        if generation != self.playlist_generation: return False
+        self.playlist_frame.set_label(_(f"Записи плейлиста: {len(self.playlist_entries)} (перегляд зупинено - проаналізуйте URL ще раз, щоб побачити решту)"))
+        return False
+
+    def _append_playlist_page(self, generation, page):
+        if generation != self.playlist_generation: return False
+        for entry in page:
+            self.playlist_store.append([False, len(self.playlist_entries)]); self.playlist_entries.append(entry)
+        total = (self.video_info or {}).get('playlist_count')
+        self.playlist_frame.set_label(_(f"Записи плейлиста: {len(self.playlist_entries)}") + (f" / {total}" if total else "") + _(" (позначені потрапляють у 'Елементи плейлиста')"))
+        return False
 
     def _build_advanced_options(self, parent_grid):
         expander = Gtk.Expander(label=_("Додаткові опції"), margin_top=10); parent_grid.attach(expander, 0, 4, 4, 1)
@@ -132,58 +215,195 @@ class YouTubePage(BasePage):
         time_frame = Gtk.Frame(label=_("Плейлист та Час")); adv_vbox.pack_start(time_frame, False, False, 5); time_grid = Gtk.Grid(column_spacing=10, row_spacing=8, border_width=5); time_frame.add(time_grid); time_grid.attach(Gtk.Label(label=_("Діапазон плейлиста:"), halign=Gtk.Align.END), 0, 0, 1, 1); playlist_box = Gtk.Box(spacing=5); self.playlist_start_spin = Gtk.SpinButton.new_with_range(0, 10000, 1); self.playlist_end_spin = Gtk.SpinButton.new_with_range(0, 10000, 1); playlist_box.pack_start(self.playlist_start_spin, True, True, 0); playlist_box.pack_start(Gtk.Label(label="–"), False, False, 0); playlist_box.pack_start(self.playlist_end_spin, True, True, 0); time_grid.attach(playlist_box, 1, 0, 1, 1); time_grid.attach(Gtk.Label(label=_("Конкретні елементи:"), halign=Gtk.Align.END), 2, 0, 1, 1); self.playlist_items_entry = Gtk.Entry(placeholder_text=_("Напр., 1,5,10-12,-1")); self.playlist_items_entry.set_tooltip_text(_("Завантажити конкретні відео. Перевизначає діапазон.\n-1 означає останнє відео.")); time_grid.attach(self.playlist_items_entry, 3, 0, 1, 1); time_grid.attach(Gtk.Label(label=_("Часовий відрізок:"), halign=Gtk.Align.END), 0, 1, 1, 1); time_box = Gtk.Box(spacing=5); self.time_start_entry = Gtk.Entry(placeholder_text="hh:mm:ss"); self.time_end_entry = Gtk.Entry(placeholder_text="hh:mm:ss"); time_box.pack_start(self.time_start_entry, True, True, 0); time_box.pack_start(Gtk.Label(label="–"), False, False, 0); time_box.pack_start(self.time_end_entry, True, True, 0); time_grid.attach(time_box, 1, 1, 3, 1)
         post_frame = Gtk.Frame(label=_("Постобробка та контент")); adv_vbox.pack_start(post_frame, False, False, 5); post_grid = Gtk.Grid(column_spacing=10, row_spacing=8, border_width=5); post_frame.add(post_grid); self.embed_thumbnail_check = Gtk.CheckButton(label=_("Вбудувати мініатюру в аудіофайл")); post_grid.attach(self.embed_thumbnail_check, 0, 0, 4, 1); sponsor_box = Gtk.Box(spacing=6); self.sponsorblock_check = Gtk.CheckButton(label=_("Вирізати з відео сегменти (SponsorBlock):")); self.sponsorblock_combo = Gtk.ComboBoxText(); sb_cats = {"all": "Усі (реклама, вступи...)", "sponsor": "Тільки рекламу", "selfpromo": "Тільки саморекламу"}; [self.sponsorblock_combo.append(k, v) for k, v in sb_cats.items()]; self.sponsorblock_combo.set_active_id("all"); sponsor_box.pack_start(self.sponsorblock_check, False, False, 0); sponsor_box.pack_start(self.sponsorblock_combo, True, True, 0); post_grid.attach(sponsor_box, 0, 1, 4, 1)
         subs_frame = Gtk.Frame(label=_("Субтитри")); adv_vbox.pack_start(subs_frame, False, False, 5); subs_box = Gtk.Box(spacing=6, border_width=5); subs_frame.add(subs_box); self.download_subs_check = Gtk.CheckButton(label=_("Завантажити (мови):")); self.sub_langs_entry = Gtk.Entry(text="uk,en"); self.embed_subs_check = Gtk.CheckButton(label=_("Вбудувати субтитри")); subs_box.pack_start(self.download_subs_check, False, False, 0); subs_box.pack_start(self.sub_langs_entry, True, True, 0); subs_box.pack_start(self.embed_subs_check, False, False, 0)
-        other_frame = Gtk.Frame(label=_("Інші налаштування")); adv_vbox.pack_start(other_frame, False, False, 5); other_grid = Gtk.Grid(column_spacing=10, row_spacing=8, border_width=5); other_frame.add(other_grid); other_grid.attach(Gtk.Label(label=_("Паралельних фрагментів:"), halign=Gtk.Align.END), 0, 0, 1, 1); self.concurrent_fragments_spin = Gtk.SpinButton.new_with_range(1, 16, 1); self.concurrent_fragments_spin.set_value(4); other_grid.attach(self.concurrent_fragments_spin, 1, 0, 1, 1); self.skip_downloaded_check = Gtk.CheckButton(label=_("Пропускати вже завантажені")); self.skip_downloaded_check.set_tooltip_text(_("Веде запис завантажених відео у файл .yt-dlp-archive.txt\nі пропускає їх при повторному запуску. Ідеально для оновлення каналів.")); other_grid.attach(self.skip_downloaded_check, 0, 1, 2, 1); self.ignore_errors_check = Gtk.CheckButton(label=_("Ігнорувати помилки в плейлистах"), active=True); other_grid.attach(self.ignore_errors_check, 2, 1, 2, 1)
+        other_frame = Gtk.Frame(label=_("Інші налаштування")); adv_vbox.pack_start(other_frame, False, False, 5); other_grid = Gtk.Grid(column_spacing=10, row_spacing=8, border_width=5); other_frame.add(other_grid); other_grid.attach(Gtk.Label(label=_("Паралельних фрагментів:"), halign=Gtk.Align.END), 0, 0, 1, 1); self.concurrent_fragments_spin = Gtk.SpinButton.new_with_range(1, 16, 1); self.concurrent_fragments_spin.set_value(4); other_grid.attach(self.concurrent_fragments_spin, 1, 0, 1, 1); other_grid.attach(Gtk.Label(label=_("Паралельних відео плейлиста:"), halign=Gtk.Align.END), 2, 0, 1, 1); self.playlist_workers_spin = Gtk.SpinButton.new_with_range(1, 8, 1); self.playlist_workers_spin.set_value(1); self.playlist_workers_spin.set_tooltip_text(_("Скільки записів плейлиста завантажувати одночасно.\n1 - послідовно, як раніше.")); other_grid.attach(self.playlist_workers_spin, 3, 0, 1, 1); self.skip_downloaded_check = Gtk.CheckButton(label=_("Пропускати вже завантажені")); self.skip_downloaded_check.set_tooltip_text(_("Пропускає відео, які вже є в спільному архіві завантажень\n(незалежно від теки і режиму). Ідеально для оновлення каналів.")); other_grid.attach(self.skip_downloaded_check, 0, 1, 2, 1); self.ignore_errors_check = Gtk.CheckButton(label=_("Ігнорувати помилки в плейлистах"), active=True); other_grid.attach(self.ignore_errors_check, 2, 1, 2, 1); self.adaptive_fragments_check = Gtk.CheckButton(label=_("Адаптивна кількість фрагментів")); self.adaptive_fragments_check.set_tooltip_text(_("Підбирає кількість паралельних фрагментів за виміряною швидкістю,\nпочинаючи зі значення вище, і запам'ятовує найкраще для кожного сайту.")); other_grid.attach(self.adaptive_fragments_check, 0, 2, 2, 1); self.sync_check = Gtk.CheckButton(label=_("Синхронізація: лише нові записи")); self.sync_check.set_tooltip_text(_("Для каналів і плейлистів переглядає лише найновіші сторінки\nдо вже відомих записів і завантажує тільки нові.")); other_grid.attach(self.sync_check, 2, 2, 1, 1); subscribe_button = Gtk.Button(label=_("Додати до підписок")); subscribe_button.set_tooltip_text(_("Зберегти URL і поточні налаштування для періодичної синхронізації\n(інтервал - sync_interval_minutes у налаштуваннях).")); subscribe_button.connect("clicked", self._on_subscribe_clicked); other_grid.attach(subscribe_button, 3, 2, 1, 1)
+
+    def _build_batch_panel(self):
+        batch_frame = Gtk.Frame(label=_("Пакетне завантаження")); self.page_widget.pack_start(batch_frame, False, False, 0)
+        batch_vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6, border_width=5); batch_frame.add(batch_vbox)
+        batch_btn_box = Gtk.Box(spacing=6); batch_vbox.pack_start(batch_btn_box, False, False, 0)
+        btn_file = Gtk.Button(label=_("З файлу...")); btn_file.set_tooltip_text(_("Текстовий файл з URL. Рядки, дописані у файл пізніше, додаються автоматично.")); btn_file.connect("clicked", self._on_batch_file_clicked); batch_btn_box.pack_start(btn_file, False, False, 0)
+        btn_clip = Gtk.Button(label=_("З буфера обміну")); btn_clip.connect("clicked", self._on_batch_clipboard_clicked); batch_btn_box.pack_start(btn_clip, False, False, 0)
+        btn_stop = Gtk.Button(label=_("Очистити чергу пакета")); btn_stop.connect("clicked", self._on_batch_clear_clicked); batch_btn_box.pack_end(btn_stop, False, False, 0)
+        self.batch_label = Gtk.Label(label=_("Закладки можна додати кнопкою на сторінці закладок."), xalign=0.0, ellipsize=Pango.EllipsizeMode.END); batch_vbox.pack_start(self.batch_label, False, False, 0)
+
+    def add_batch_text(self, text):
+        batch = self._ensure_batch()
+        if batch is None: return None
+        accepted = batch.add_text(text); self._batch_pump(); return accepted
+
+    def add_batch_urls(self, urls):
+        batch = self._ensure_batch()
+        if batch is None: return None
+        accepted = batch.add_urls(urls); self._batch_pump(); return accepted
+
+    def _ensure_batch(self):
+        base_dir = self.base_output_dir_entry.get_text().strip()
+        if not base_dir: self.show_warning_dialog(_("Оберіть головну папку для збереження.")); return None
+        if self.url_batch is None or self.batch_dir != base_dir:
+            os.makedirs(base_dir, exist_ok=True)
+            archive = None
+            try:
+                archive = get_download_archive(); archive.import_legacy(os.path.join(base_dir, LEGACY_ARCHIVE_FILENAME))
+            except Exception as e: logger.warning(f"Download archive unavailable for batch filtering: {e}")
+            self.url_batch = UrlBatch(archive)
+            self.batch_dir, self.batch_done, self.batch_failed = base_dir, 0, 0
+        return self.url_batch
+
+    def _batch_pump(self):
+        if self.url_batch is None: return False
+        # У планувальнику тримається лише невелика кількість завдань пакета, решта чекає в черзі пакета.
+        max_in_flight = 2 * self.app.scheduler.limit_for(download_youtube_media.__name__)
+        while len(self.batch_in_flight) < max_in_flight:
+            url = self.url_batch.next_url()
+            if url is None: break
+            task_id = self.app.start_task(download_youtube_media, f"YouTube ({_('пакет')}): {url}", kwargs=self._collect_task_kwargs(url, self.batch_dir),
+                                          message_callback=self._on_batch_message, finished_callback=self._on_batch_task_finished, error_dialog=False)
+            if not task_id: self.url_batch.clear_pending(); break
+            self.batch_in_flight[task_id] = None; self.task_ids.append(task_id)
+        self._update_batch_label()
+        return False
+
+    def _on_batch_message(self, task_id, message):
+        if message.get("type") == "progress": self.batch_in_flight[task_id] = message.get("speed")
+        elif message.get("type") == "error": self.batch_failed += 1
+        self._update_batch_label()
+
+    def _on_batch_task_finished(self, task_id):
+        if task_id not in self.batch_in_flight: return
+        del self.batch_in_flight[task_id]; self.batch_done += 1
+        if not self.batch_in_flight and not self.url_batch.pending: GLib.idle_add(self._populate_file_browser)
+        GLib.idle_add(self._batch_pump)
+
+    def _update_batch_label(self):
+        batch = self.url_batch
+        if batch is None or not self.batch_label: return
+        parts = [f"{_('Пакет')}: {self.batch_done}/{batch.accepted}"]
+        speed = sum(speed or 0 for speed in self.batch_in_flight.values())
+        if speed: parts.append(format_rate(speed))
+        if self.batch_failed: parts.append(f"{_('помилок')}: {self.batch_failed}")
+        if batch.duplicates: parts.append(f"{_('дублікатів')}: {batch.duplicates}")
+        if batch.archived: parts.append(f"{_('вже в архіві')}: {batch.archived}")
+        self.batch_label.set_text(" · ".join(parts))
+
+    def _on_batch_file_clicked(self, widget):
+        dialog = Gtk.FileChooserDialog(title=_("Файл зі списком URL"), transient_for=self.app, action=Gtk.FileChooserAction.OPEN)
+        dialog.add_buttons(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, Gtk.STOCK_OPEN, Gtk.ResponseType.OK)
+        path = dialog.get_filename() if dialog.run() == Gtk.ResponseType.OK else None
+        dialog.destroy()
+        if not path: return
+        self.batch_reader = AppendOnlyReader(path)
+        if self.add_batch_text(self.batch_reader.read_new_text(final=True)) is None: return
+        if self.batch_monitor: self.batch_monitor.cancel()
+        self.batch_monitor = Gio.File.new_for_path(path).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self.batch_monitor.connect("changed", self._on_batch_file_changed)
+
+    def _on_batch_file_changed(self, monitor, file, other_file, event_type):
+        if event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED) and self.batch_reader:
+            text = self.batch_reader.read_new_text()
+            if text: self.add_batch_text(text)
+
+    def _on_batch_clipboard_clicked(self, widget):
+        Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD).request_text(lambda clipboard, text, data: text and self.add_batch_text(text), None)
+
+    def _on_batch_clear_clicked(self, widget):
+        if self.url_batch: self.url_batch.clear_pending()
+        if self.batch_monitor: self.batch_monitor.cancel(); self.batch_monitor = None
+        self._update_batch_label()
+
+    def _collect_task_kwargs(self, url, base_dir):
+        download_mode = 'default'
+        if self.mode_music_radio.get_active(): download_mode = 'music'
+        elif self.mode_playlist_flat_radio.get_active(): download_mode = 'flat_playlist'
+        elif self.mode_single_flat_radio.get_active(): download_mode = 'single_flat'
+        return {
+            'url': url, 'output_dir': base_dir, 'download_mode': download_mode, 'manual_format': self.manual_format_entry.get_text().strip(),
+            'playlist_items': self.playlist_items_entry.get_text().strip(), 'max_resolution': self.video_quality_combo.get_active_id(),
+            'audio_quality': int(self.audio_quality_combo.get_active_id() or 5), 'playlist_start': self.playlist_start_spin.get_value_as_int(),
+            'playlist_end': self.playlist_end_spin.get_value_as_int(), 'concurrent_fragments': self.concurrent_fragments_spin.get_value_as_int(),
+            'adaptive_fragments': self.adaptive_fragments_check.get_active(),
+            'playlist_workers': self.playlist_workers_spin.get_value_as_int(),
+            'skip_downloaded': self.skip_downloaded_check.get_active(), 'time_start': self.time_start_entry.get_text().strip(),
+            'time_end': self.time_end_entry.get_text().strip(), 'ignore_errors': self.ignore_errors_check.get_active(),
+            'download_subs': self.download_subs_check.get_active(), 'sub_langs': self.sub_langs_entry.get_text().strip(),
+            'embed_subs': self.embed_subs_check.get_active(), 'force_mp4': self.force_mp4_check.get_active(),
+            'avoid_av1': self.avoid_av1_check.get_active(), 'prefer_h264': self.prefer_h264_check.get_active(),
+            'max_bitrate': self.max_bitrate_spin.get_value_as_int(), 'embed_thumbnail': self.embed_thumbnail_check.get_active(),
+            'use_sponsorblock': self.sponsorblock_check.get_active(), 'sponsorblock_cats': self.sponsorblock_combo.get_active_id(),
+            'sync': self.sync_check.get_active(),
+        }
+
+    def _on_subscribe_clicked(self, widget):
+        url, base_dir = self.url_entry.get_text().strip(), self.base_output_dir_entry.get_text().strip()
+        if not url or not base_dir: self.show_warning_dialog(_("Вкажіть URL і головну папку.")); return
+        # Діапазони записів і часу стосуються одного запуску, а не підписки.
+        subscription = {key: value for key, value in self._collect_task_kwargs(url, base_dir).items()
+                        if key not in ('playlist_items', 'playlist_start', 'playlist_end', 'time_start', 'time_end', 'sync')}
+        subscriptions = [sub for sub in self.app.settings.get('sync_subscriptions') or [] if sub.get('url') != url]
+        self.app.settings.set('sync_subscriptions', subscriptions + [subscription])
+        self.show_info_dialog(_("Підписки"), _(f"Додано до підписок ({len(subscriptions) + 1}): {url}"))
 
     def _on_download_clicked(self, widget):
-        if self.app.active_tasks: self.show_warning_dialog(_("Завдання вже виконується.")); return
         try:
             url, base_dir = self.url_entry.get_text().strip(), self.base_output_dir_entry.get_text().strip()
             if not url: raise ValueError(_("URL не може бути порожнім."))
             if not base_dir: raise ValueError(_("Оберіть головну папку для збереження."))
             if not self.video_info: self.show_warning_dialog(_("Спочатку проаналізуйте URL.")); return
-            info = self.video_info; download_mode = 'default'
-            if self.mode_music_radio.get_active(): download_mode = 'music'
-            elif self.mode_playlist_flat_radio.get_active(): download_mode = 'flat_playlist'
-            elif self.mode_single_flat_radio.get_active(): download_mode = 'single_flat'
+            info = self.video_info
             os.makedirs(base_dir, exist_ok=True)
-            task_kwargs = {
-                'url': url, 'output_dir': base_dir, 'download_mode': download_mode, 'manual_format': self.manual_format_entry.get_text().strip(),
-                'playlist_items': self.playlist_items_entry.get_text().strip(), 'max_resolution': self.video_quality_combo.get_active_id(),
-                'audio_quality': int(self.audio_quality_combo.get_active_id() or 5), 'playlist_start': self.playlist_start_spin.get_value_as_int(),
-                'playlist_end': self.playlist_end_spin.get_value_as_int(), 'concurrent_fragments': self.concurrent_fragments_spin.get_value_as_int(),
-                'skip_downloaded': self.skip_downloaded_check.get_active(), 'time_start': self.time_start_entry.get_text().strip(),
-                'time_end': self.time_end_entry.get_text().strip(), 'ignore_errors': self.ignore_errors_check.get_active(),
-                'download_subs': self.download_subs_check.get_active(), 'sub_langs': self.sub_langs_entry.get_text().strip(),
-                'embed_subs': self.embed_subs_check.get_active(), 'force_mp4': self.force_mp4_check.get_active(),
-                'avoid_av1': self.avoid_av1_check.get_active(), 'prefer_h264': self.prefer_h264_check.get_active(),
-                'max_bitrate': self.max_bitrate_spin.get_value_as_int(), 'embed_thumbnail': self.embed_thumbnail_check.get_active(),
-                'use_sponsorblock': self.sponsorblock_check.get_active(), 'sponsorblock_cats': self.sponsorblock_combo.get_active_id(),
-            }
+            task_kwargs = self._collect_task_kwargs(url, base_dir)
             task_name = f"YouTube: {info.get('title', url)}"
-            self.app.start_task(download_youtube_media, task_name, kwargs=task_kwargs, success_callback=self._populate_file_browser)
+            task_id = self.app.start_task(download_youtube_media, task_name, kwargs=task_kwargs, success_callback=self._populate_file_browser)
+            if task_id: self.task_ids.append(task_id)
         except (ValueError, RuntimeError) as e: self.show_warning_dialog(str(e))
         except Exception as e: self.app.show_detailed_error_dialog(_("Неочікувана помилка"), str(e))
 
+    def _on_retry_failed_clicked(self, widget):
+        url, base_dir = self.url_entry.get_text().strip(), self.base_output_dir_entry.get_text().strip()
+        if not url or not base_dir: self.show_warning_dialog(_("Вкажіть URL і головну папку.")); return
+        task_kwargs = dict(self._collect_task_kwargs(url, base_dir), retry_failed=True)
+        task_id = self.app.start_task(download_youtube_media, f"YouTube ({_('невдалі')}): {url}", kwargs=task_kwargs, success_callback=self._populate_file_browser)
+        if task_id: self.task_ids.append(task_id)
+
     def _on_url_changed(self, widget, event=None):
         url = self.url_entry.get_text().strip()
         if not url or (self.video_info and self.video_info.get('webpage_url') == url): return
-        self.video_info = None; self.info_revealer.set_reveal_child(True)
+        self.video_info = None; self.info_revealer.set_reveal_child(True); self._reset_playlist_preview()
         self.info_grid.hide(); self.info_description_view.get_parent().get_parent().hide()
         self.info_image.clear(); self.info_spinner.start(); self.download_button.set_sensitive(False)
-        threading.Thread(target=self._fetch_info_thread, args=(url,), daemon=True).start()
-
-    def _fetch_info_thread(self, url):
-        info = get_youtube_info(url)
-        thumbnail_data = None
-        if info and not info.get('_type', 'video') in ['playlist', 'multi_video']:
-            thumb_url = info.get('thumbnail')
-            if thumb_url:
-                try:
-                    response = requests.get(thumb_url, timeout=5); response.raise_for_status(); thumbnail_data = response.content
-                except Exception as e: logger.warning(f"Failed to download thumbnail: {e}")
-        GLib.idle_add(self._update_info_ui, info, thumbnail_data)
-
-    def _update_info_ui(self, info, thumbnail_data):
+        threading.Thread(target=self._fetch_info_thread, args=(url, self.playlist_generation, self.playlist_more), daemon=True).start()
+
+    def _fetch_info_thread(self, url, generation, more_event):
+        if normalize_url(url).startswith("youtube:"):
+            GLib.idle_add(self._update_info_ui, get_youtube_info(url)); return
+        # Плейлисти й канали переглядаються потоково: записи не тримаються в пам'яті як словники yt-dlp.
+        # Для окремого відео генератор одразу віддає його повну інформацію.
+        try:
+            stream = stream_playlist(url)
+            try:
+                header = next(stream)
+                GLib.idle_add(self._update_info_ui, header)
+                if not header or not is_playlist_info(header): return
+                for page_number, page in enumerate(stream, 1):
+                    GLib.idle_add(self._append_playlist_page, generation, page)
+                    if page_number >= PLAYLIST_PRELOAD_PAGES:
+                        if not more_event.wait(PLAYLIST_IDLE_TIMEOUT) or self.playlist_hidden:
+                            if generation == self.playlist_generation: GLib.idle_add(self._on_playlist_stream_stopped, generation)
+                            break
+                        more_event.clear()
+                    if generation != self.playlist_generation: break
+            finally:
+                stream.close()
+        except Exception as e:
+            logger.warning(f"Failed to list playlist {url}: {e}")
+            if generation == self.playlist_generation and self.video_info is None: GLib.idle_add(self._update_info_ui, None)
+
+    def _on_thumbnail_ready(self, thumb_url, pixbuf):
+        # Поки мініатюра вантажилася, користувач міг перейти до іншого URL.
+        if not self.video_info or pick_thumbnail_url(self.video_info, THUMBNAIL_WIDTH) != thumb_url: return
+        if pixbuf: self.info_image.set_from_pixbuf(pixbuf)
+        else: self.info_image.clear()
+
+    def _update_info_ui(self, info):
         self.info_spinner.stop(); self.download_button.set_sensitive(True)
 
         # --- ЗМІНЕНО: Логіка відображення технічних деталей ---
@@ -194,10 +414,9 @@ class YouTubePage(BasePage):
             self.info_title_label.set_text(info.get('title', '...')); self.info_uploader_label.set_text(info.get('uploader', '...'))
             
             if is_playlist:
-                self.info_uploader_label.set_text(f"{info.get('uploader', '...')} ({info.get('playlist_count')} відео)")
+                self.info_uploader_label.set_text(f"{info.get('uploader', '...')} ({info.get('playlist_count') or '?'} відео)")
                 self.info_duration_label.set_text("Плейлист"); self.info_views_label.set_text("-"); self.info_likes_label.set_text("-"); self.info_upload_date_label.set_text("-")
-                self.info_description_buffer.set_text(_("Опис недоступний для плейлистів."), -1)
-                self.info_image.clear(); self.info_description_view.get_parent().get_parent().show()
+                self.info_image.clear(); self.playlist_frame.show_all()
             else:
                 self.info_views_label.set_text(f"{info.get('view_count', 0):,}".replace(',', ' ')); self.info_likes_label.set_text(f"{info.get('like_count', 0):,}".replace(',', ' '))
                 date_str = info.get('upload_date'); self.info_upload_date_label.set_text(f"{date_str[6:8]}.{date_str[4:6]}.{date_str[0:4]}" if date_str else "-")
@@ -214,13 +433,8 @@ class YouTubePage(BasePage):
                 filesize = chosen_format.get('filesize') or chosen_format.get('filesize_approx'); self.info_size_label.set_text(self._format_size(filesize) if filesize else "N/A")
                 for label in self.info_tech_labels: label.set_visible(True)
 
-                if thumbnail_data:
-                    try:
-                        loader = GdkPixbuf.PixbufLoader.new_with_type('jpeg'); loader.write(thumbnail_data); loader.close(); pixbuf = loader.get_pixbuf()
-                        h, w = pixbuf.get_height(), pixbuf.get_width()
-                        if w > 240: pixbuf = pixbuf.scale_simple(240, int(h * (240 / w)), GdkPixbuf.InterpType.BILINEAR)
-                        self.info_image.set_from_pixbuf(pixbuf)
-                    except GLib.Error as e: logger.error(f"Failed to load pixbuf from thumbnail data: {e}"); self.info_image.clear()
+                thumb_url = pick_thumbnail_url(info, THUMBNAIL_WIDTH)
+                if thumb_url: get_thumbnail_service(self.app.settings).request(thumb_url, THUMBNAIL_WIDTH, self._on_thumbnail_ready)
         else:
             self.info_title_label.set_text("Не вдалося отримати інформацію про URL.")
             self.info_uploader_label.set_text("..."); self.info_duration_label.set_text("..."); self.info_views_label.set_text("..."); self.info_likes_label.set_text("..."); self.info_upload_date_label.set_text("...")
@@ -229,7 +443,7 @@ class YouTubePage(BasePage):
         self.info_grid.show_all(); return False
 
     def _on_paste_url_clicked(self, widget):
-        clipboard = Gtk.Clipboard.get(Gdk.gdk.SELECTION_CLIPBOARD); clipboard.request_text(self._on_paste_url_received, None)
+        clipboard = Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD); clipboard.request_text(self._on_paste_url_received, None)
     def _on_paste_url_received(self, clipboard, text, userdata):
         if text: self.url_entry.set_text(text)
     def _on_url_text_changed(self, widget):
@@ -238,16 +452,18 @@ class YouTubePage(BasePage):
     def _trigger_url_fetch(self):
         self.url_change_timeout = None; self._on_url_changed(self.url_entry); return False
     def _on_stop_clicked(self, widget):
-        if self.app.active_tasks: stop_download()
-        else: self.show_warning_dialog(_("Немає активного завдання для зупинки."))
+        self.task_ids = [task_id for task_id in self.task_ids if task_id in self.app.active_tasks]
+        stopped = [task_id for task_id in self.task_ids if self.app.send_task_control(task_id, CONTROL_STOP)]
+        if not stopped: self.show_warning_dialog(_("Немає активного завдання для зупинки."))
     def _format_duration(self, seconds):
         if not seconds: return "N/A"
         h, m, s = int(seconds // 3600), int((seconds % 3600) // 60), int(seconds % 60)
         return f"{h:02d}:{m:02d}:{s:02d}" if h > 0 else f"{m:02d}:{s:02d}"
     def _build_file_browser(self):
         self.page_widget.pack_start(Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL, margin_top=10, margin_bottom=5), False, False, 0); self.page_widget.pack_start(Gtk.Label(label=f"<b>{_('Перегляд головної папки:')}</b>", use_markup=True, xalign=0.0, margin_bottom=5), False, False, 0)
-        self.file_list_store = Gtk.ListStore(str, str, str, str); self.file_tree_view = Gtk.TreeView(model=self.file_list_store); self.file_tree_view.connect("row-activated", self._on_file_tree_view_row_activated)
-        for i, title in enumerate([_("Ім'я файлу/Папки"), _("Тип"), _("Розмір")]): self.file_tree_view.append_column(Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i))
+        # Стовпці: ім'я, тип, розмір, повний шлях (прихований), факти ffprobe (заповнюються у фоні).
+        self.file_list_store = Gtk.ListStore(str, str, str, str, str); self.file_tree_view = Gtk.TreeView(model=self.file_list_store); self.file_tree_view.connect("row-activated", self._on_file_tree_view_row_activated)
+        for i, title in ((0, _("Ім'я файлу/Папки")), (1, _("Тип")), (2, _("Розмір")), (4, _("Медіа"))): self.file_tree_view.append_column(Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i))
         scrolled_window_files = Gtk.ScrolledWindow(shadow_type=Gtk.ShadowType.IN, hexpand=True, vexpand=True, min_content_height=150); scrolled_window_files.add(self.file_tree_view); self.page_widget.pack_start(scrolled_window_files, True, True, 0)
         browser_buttons_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6, margin_top=5); self.page_widget.pack_start(browser_buttons_box, False, False, 0)
         btn_refresh_files = Gtk.Button(label=_("Оновити список")); btn_refresh_files.connect("clicked", self._populate_file_browser); browser_buttons_box.pack_start(btn_refresh_files, False, False, 0)
@@ -269,14 +485,23 @@ class YouTubePage(BasePage):
         else: self.show_warning_dialog(_("Вкажіть головну директорію збереження."))
     def _populate_file_browser(self, widget=None, event=None):
         if not self.file_list_store: return
-        self.file_list_store.clear(); directory_path = self.base_output_dir_entry.get_text().strip()
-        if not directory_path or not os.path.isdir(directory_path): self.file_list_store.append([f"'{os.path.basename(directory_path)}'", _("Директорія не знайдена"), "", ""]); return
+        self.file_list_store.clear(); self.file_browser_rows = {}; directory_path = self.base_output_dir_entry.get_text().strip()
+        if not directory_path or not os.path.isdir(directory_path): self.file_list_store.append([f"'{os.path.basename(directory_path)}'", _("Директорія не знайдена"), "", "", ""]); return
         try:
             items = sorted(os.listdir(directory_path), key=str.lower)
-            if not items: self.file_list_store.append([_("(Папка порожня)"), "", "", ""])
+            if not items: self.file_list_store.append([_("(Папка порожня)"), "", "", "", ""])
             else:
                 for item_name in items:
                     full_path = os.path.join(directory_path, item_name)
-                    try: is_dir = os.path.isdir(full_path); item_type = _("Папка") if is_dir else _("Файл"); size_str = "" if is_dir else self._format_size(os.path.getsize(full_path)); self.file_list_store.append([item_name, item_type, size_str, full_path])
-                    except OSError: self.file_list_store.append([item_name, _("Недоступно"), "", full_path])
-        except OSError as e: self.file_list_store.append([f"{_('Помилка доступу')} '{os.path.basename(directory_path)}'", str(e), "", directory_path])
+                    try:
+                        is_dir = os.path.isdir(full_path); item_type = _("Папка") if is_dir else _("Файл"); size_str = "" if is_dir else self._format_size(os.path.getsize(full_path))
+                        row = self.file_list_store.append([item_name, item_type, size_str, full_path, ""])
+                        if not is_dir and is_media_file(item_name): self.file_browser_rows[full_path] = row
+                    except OSError: self.file_list_store.append([item_name, _("Недоступно"), "", full_path, ""])
+        except OSError as e: self.file_list_store.append([f"{_('Помилка доступу')} '{os.path.basename(directory_path)}'", str(e), "", directory_path, ""])
+        # Закешовані факти з'являються одразу, решта файлів перевіряється паралельно у фоні.
+        if self.file_browser_rows: get_media_probe().probe_many(list(self.file_browser_rows), lambda path, data: GLib.idle_add(self._on_file_media_probed, path, data))
+    def _on_file_media_probed(self, path, data):
+        row = self.file_browser_rows.get(path)
+        if row is not None and data: self.file_list_store.set_value(row, 4, format_media_facts(data))
+        return False